@@ -1,4 +1,6 @@
 from .sentechdll import SentechDLL
 from .system import SentechSystem
+from .group import SentechCameraGroup
+from .simulator import SimulatedDLL
 
 __version__ = "0.1"
\ No newline at end of file
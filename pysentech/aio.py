@@ -0,0 +1,211 @@
+"""
+aio.py
+
+asyncio interface for Sentech cameras.  A single worker thread per camera
+    performs the blocking transfers and hands frames back to the event loop
+    through futures, so many cameras can be served from one loop without a
+    thread per request.
+
+Requires python 3.5+.
+"""
+import asyncio
+import threading
+import queue
+from collections import deque
+
+from .frame import _FramePool
+
+
+class AsyncCapture(object):
+    """
+    Serves frame requests from asyncio code with one capture worker thread.
+
+    Frames come from a buffer pool of the worker's own, so each frame stays
+        valid until it is released and the camera's grab_frame buffers are
+        left alone.  The pool is reallocated when the camera's frame layout
+        changes.
+
+    args:
+        camera (SentechCamera): camera to grab from
+        max_pending (Optional[int]): maximum number of grab_frame requests in
+            flight at once.  Further requests wait for a free slot.
+    """
+    def __init__(self, camera, max_pending=2):
+        self.camera = camera
+        self.max_pending = max_pending
+        self.pool = None
+        self._layout = None
+        self._requests = queue.Queue()
+        self._slots = None
+        self._slots_loop = None
+        self._thread = None
+        self._closed = False
+
+    def _acquire(self, timeout):
+        """ Takes a frame from the worker's pool, first reallocating the pool
+                if the camera's frame layout changed since it was made.
+        """
+        layout = self.camera._frame_layout()
+        if self.pool is None or layout != self._layout:
+            self.pool = _FramePool(self.max_pending + 2, **layout)
+            self._layout = layout
+        return self.pool.acquire(timeout=timeout)
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            loop, future, timeout_ms = request
+            if future.cancelled():
+                continue
+            frame, exc = None, None
+            try:
+                frame = self._acquire(timeout_ms / 1000.0)
+                try:
+                    if not self.camera._snapshot(timeout_ms, frame):
+                        raise self.camera._transfer_error()
+                    self.camera._hand_out(frame)
+                except Exception:
+                    frame.release()
+                    raise
+            except Exception as e:
+                frame, exc = None, e
+            try:
+                loop.call_soon_threadsafe(self._resolve, future, frame, exc)
+            except RuntimeError:
+                # loop is closed, nobody is waiting for this frame
+                if frame is not None:
+                    frame.release()
+
+    @staticmethod
+    def _resolve(future, frame, exc):
+        if future.cancelled():
+            if frame is not None:
+                frame.release()
+        elif exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(frame)
+
+    def _submit(self, timeout_ms):
+        """ Queues a transfer for the worker thread and returns its future. """
+        if self._closed:
+            raise RuntimeError("Async capture is closed.")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name="SentechAsyncCapture")
+            self._thread.daemon = True
+            self._thread.start()
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._requests.put((loop, future, timeout_ms))
+        return future
+
+    async def grab_frame(self, timeout_ms=1000):
+        """ Grabs a frame without blocking the event loop.
+
+        args:
+            timeout_ms (Optional[int]): timeout for buffer transfer in
+                milliseconds
+
+        returns:
+            _SentechFrame: a pooled frame.  Release it when you are done.
+        """
+        loop = asyncio.get_event_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            # a semaphore belongs to the loop it was first used in
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._slots_loop = loop
+        async with self._slots:
+            return await self._submit(timeout_ms)
+
+    def stream(self, prefetch=2, timeout_ms=1000):
+        """ Returns an async iterator over frames.  See _FrameStream. """
+        return _FrameStream(self, prefetch, timeout_ms)
+
+    def close(self):
+        """ Stops the worker thread, waiting for the current transfer to
+                finish.  Requests that haven't started are never resolved, so
+                cancel them first or use aclose.
+        """
+        self._closed = True
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread.join()
+            self._thread = None
+
+    async def aclose(self, release_camera=False):
+        """ Cancels queued requests and stops the worker thread without
+                blocking the event loop.  Once this returns the camera can be
+                closed safely.
+
+        args:
+            release_camera (Optional[bool]): also release the camera, which
+                calls StCam_Close
+        """
+        self._closed = True
+        while True:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request[1].cancel()
+        if self._thread is not None:
+            loop = asyncio.get_event_loop()
+            self._requests.put(None)
+            await loop.run_in_executor(None, self._thread.join)
+            self._thread = None
+        if release_camera:
+            self.camera.release()
+
+
+class _FrameStream(object):
+    """
+    Async iterator over frames from an AsyncCapture.  Keeps up to `prefetch`
+        transfers queued ahead of the consumer, and releases each frame when
+        the next one is requested, so the consumer doesn't have to.
+
+    Use it as `async for frame in camera.stream(): ...`.  Call aclose (or use
+        `async with`) to stop early and cancel the prefetched transfers.
+    """
+    def __init__(self, capture, prefetch, timeout_ms):
+        if prefetch < 1:
+            raise ValueError("Prefetch must be at least 1.")
+        self.capture = capture
+        self.prefetch = prefetch
+        self.timeout_ms = timeout_ms
+        self._pending = deque()
+        self._frame = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._frame is not None:
+            self._frame.release()
+            self._frame = None
+        while len(self._pending) < self.prefetch:
+            try:
+                self._pending.append(self.capture._submit(self.timeout_ms))
+            except RuntimeError:
+                if not self._pending:
+                    raise StopAsyncIteration
+                break
+        self._frame = await self._pending.popleft()
+        return self._frame
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """ Cancels prefetched transfers and releases the current frame. """
+        while self._pending:
+            self._pending.popleft().cancel()
+        if self._frame is not None:
+            self._frame.release()
+            self._frame = None
@@ -0,0 +1,186 @@
+"""
+archive.py
+
+A simple on-disk format for raw Sentech frames: a fixed 64 byte header followed
+    by frame buffers stored back to back, exactly as they were transferred
+    (including any row padding).
+
+Header layout (little endian):
+
+    magic         8s   b"PYSTRAW1"
+    version       H
+    header_size   H    offset of the first frame
+    width         I
+    height        I
+    pixel_format  16s  name from PIXEL_FORMATS, null padded
+    bpp           I    bytes per pixel
+    bpi           I    bytes per frame
+    stride        I    bytes per row
+
+ArchiveWriter appends frames with large sequential writes.  ArchiveReader
+    memory-maps the file and returns zero-copy numpy views of frames.
+"""
+import mmap
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .frame import BPP, image_layout
+
+MAGIC = b"PYSTRAW1"
+VERSION = 1
+HEADER = struct.Struct("<8sHHII16sIII")
+HEADER_SIZE = 64
+
+
+class ArchiveWriter(object):
+    """
+    Writes frames to a raw archive.
+
+    args:
+        path (str): archive path
+        width (int): image width
+        height (int): image height
+        pixel_format (str): pixel format name, one of BPP
+        bpi (int): bytes per frame
+        stride (Optional[int]): bytes per row.  Defaults to width * bpp.
+        buffer_size (Optional[int]): write buffer size, so small frames are
+            written in large sequential blocks
+    """
+    def __init__(self, path, width, height, pixel_format, bpi, stride=None,
+                 buffer_size=2**24):
+        bpp = BPP[pixel_format]
+        self.path = path
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.bpi = bpi
+        self.stride = stride or width * bpp
+        self.frame_count = 0
+        self._file = open(path, "wb", buffering=buffer_size)
+        header = HEADER.pack(MAGIC, VERSION, HEADER_SIZE, width, height,
+                             pixel_format.encode(), bpp, bpi, self.stride)
+        self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    @classmethod
+    def for_frame(cls, path, frame, **kwargs):
+        """ Creates a writer with the buffer layout of a _SentechFrame. """
+        return cls(path, frame.width, frame.height, frame.pixel_format,
+                   frame.bpi, frame.stride, **kwargs)
+
+    def write(self, frame):
+        """ Appends a frame.
+
+        args:
+            frame (_SentechFrame): frame with the archive's buffer layout
+
+        returns:
+            int: index of the frame in the archive
+        """
+        return self.write_buffer(frame.as_array())
+
+    def write_buffer(self, data):
+        """ Appends one frame's raw bytes from any buffer-protocol object.
+
+        returns:
+            int: index of the frame in the archive
+        """
+        if memoryview(data).nbytes != self.bpi:
+            raise ValueError("Frame is {} bytes, archive expects {}".format(
+                memoryview(data).nbytes, self.bpi))
+        self._file.write(data)
+        self.frame_count += 1
+        return self.frame_count - 1
+
+    def offset(self, index):
+        """ Byte offset of frame `index` in the file. """
+        return HEADER_SIZE + index * self.bpi
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArchiveReader(object):
+    """
+    Random access to the frames of a raw archive.  The file is memory-mapped,
+        so frames are only read from disk when they are used.
+
+    args:
+        path (str): archive path
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size or header[:8] != MAGIC:
+                raise IOError("Not a raw frame archive: {}".format(path))
+            (_, self.version, self.header_size, self.width, self.height,
+             pixel_format, self.bpp, self.bpi,
+             self.stride) = HEADER.unpack(header)
+            self.pixel_format = pixel_format.rstrip(b"\0").decode()
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        payload = len(self._mmap) - self.header_size
+        self.frame_count = max(payload, 0) // self.bpi
+        self._frames = None
+
+    def __len__(self):
+        return self.frame_count
+
+    @property
+    def frames(self):
+        """ All frames as one read-only numpy array of shape
+                (frames, height, width[, channels]), a view of the file.
+        """
+        if self._frames is None:
+            shape, strides = image_layout(self.width, self.height, self.bpp,
+                                          self.stride)
+            self._frames = np.ndarray(buffer=self._mmap,
+                                      dtype=np.uint8,
+                                      offset=self.header_size,
+                                      shape=(self.frame_count,) + shape,
+                                      strides=(self.bpi,) + strides)
+        return self._frames
+
+    def __getitem__(self, index):
+        """ Gets a zero-copy view of frame `index`, or a stack of frames for a
+                slice.
+        """
+        return self.frames[index]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def raw(self, index):
+        """ Gets the raw bytes of a frame as a memoryview, padding included. """
+        if not 0 <= index < self.frame_count:
+            raise IndexError(index)
+        start = self.header_size + index * self.bpi
+        return memoryview(self._mmap)[start:start + self.bpi]
+
+    def close(self):
+        """ Unmaps the file.  Views returned earlier must not be used
+                afterwards.
+        """
+        self._frames = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # views are still alive, the map is closed when they go
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,187 @@
+"""
+autoexposure.py
+
+Closed-loop auto exposure and gain.  Enable it with
+    cam.enable_auto_exposure(); every frame the camera hands out is then
+    measured and the exposure adjusted for the next ones:
+
+    >>> ae = cam.enable_auto_exposure(target=0.4, max_exposure=0.02)
+    >>> frame = cam.grab_frame()
+    >>> ae.stats
+    {'mean': 0.41, 'p99': 0.83, 'saturated': 0.0}
+
+Brightness comes from a histogram of every nth pixel in each direction, so a
+    frame costs a strided view and one bincount, not a full pass.  Exposure
+    is raised to its limit before gain is.  Changes are damped and wait for
+    the new exposure to reach the frames, and nothing is written while the
+    image is within tolerance of the target.
+
+The controller works in exposure clock units and keeps track of the clock and
+    gain it sets, so an update is at most one StCam_SetExposureClock and one
+    StCam_SetGain call.  Seconds come from the camera's exposure table.  Call
+    sync() after changing exposure or gain yourself.
+"""
+import math
+from ctypes import c_ulong, c_ushort
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class AutoExposure(object):
+    """
+    Auto exposure and gain controller for one camera.
+
+    args:
+        camera (SentechCamera): camera to control
+        target (Optional[float]): mean brightness to aim for, as a fraction of
+            full scale
+        tolerance (Optional[float]): relative brightness error that is left
+            alone
+        damping (Optional[float]): fraction of the correction applied per
+            update, 0-1.  Lower is slower and steadier.
+        max_step (Optional[float]): largest factor exposure changes by in one
+            update
+        decimation (Optional[int]): sample every nth pixel in each direction.
+            Odd values sample every color of a Bayer pattern.
+        saturation (Optional[int]): pixel value counted as saturated
+        max_saturated (Optional[float]): fraction of saturated pixels above
+            which exposure is brought down even if the mean is on target
+        max_exposure (Optional[float]): longest exposure in seconds, e.g. to
+            keep the frame rate.  Defaults to the camera's maximum.
+        max_gain (Optional[int]): highest gain to use.  Defaults to the
+            camera's maximum, 0 disables auto gain.
+        gain_step_db (Optional[float]): dB per gain step
+        settle_frames (Optional[int]): frames to skip after a change, while
+            frames exposed with the old settings are still arriving
+    """
+    def __init__(self, camera, target=0.45, tolerance=0.05, damping=0.5,
+                 max_step=4.0, decimation=7, saturation=250,
+                 max_saturated=0.02, max_exposure=None, max_gain=None,
+                 gain_step_db=0.1, settle_frames=2):
+        if np is None:
+            raise ImportError("numpy is required for auto exposure.")
+        self.camera = camera
+        self.target = target
+        self.tolerance = tolerance
+        self.damping = damping
+        self.max_step = max_step
+        self.decimation = decimation
+        self.saturation = saturation
+        self.max_saturated = max_saturated
+        self.max_exposure = max_exposure
+        self.max_gain = max_gain
+        self.gain_step_db = gain_step_db
+        self.settle_frames = settle_frames
+        self.stats = {}
+        self.updates = 0
+        self._levels = np.arange(256)
+        self._table = None
+        self.sync()
+
+    def sync(self):
+        """ Reads the camera's current exposure clock and gain. """
+        cam = self.camera
+        cclock, cgain = c_ulong(), c_ushort()
+        cam.StCam_GetExposureClock(cclock)
+        cam.StCam_GetGain(cgain)
+        self.clock = cclock.value
+        self.gain = cgain.value
+        if self.max_gain is None:
+            self.max_gain = cam.max_gain
+        self._settle = 0
+        self._last_frame_number = None
+        self._calibrate()
+
+    def _calibrate(self):
+        """ Gets the clock limit from the camera's exposure table.  The clock
+                is tied to the line time, so this is redone whenever the table
+                is rebuilt.
+        """
+        table = self.camera.exposure_table
+        if table is self._table:
+            return
+        self.max_clock = table.max_clock
+        if self.max_exposure is not None:
+            self.max_clock = min(self.max_clock,
+                                 max(1, table.to_clock(self.max_exposure)))
+        self._table = table
+
+    @property
+    def exposure(self):
+        """ Current exposure in seconds. """
+        return self.camera.exposure_table.to_seconds(self.clock)
+
+    def measure(self, image):
+        """ Gets brightness statistics from decimated pixels.
+
+        args:
+            image (ndarray): uint8 image (h, w) or (h, w, channels).  Only the
+                green channel of color images is used.
+
+        returns:
+            dict: mean, p99 and saturated fraction, as fractions of full
+                scale and of the pixels
+        """
+        if image.ndim == 3:
+            image = image[..., 1]
+        step = self.decimation
+        sample = image[step // 2::step, step // 2::step]
+        hist = np.bincount(sample.ravel(), minlength=256)
+        n = float(hist.sum())
+        cumulative = np.cumsum(hist)
+        return {"mean": float(np.dot(hist, self._levels)) / n / 255.0,
+                "p99": float(np.searchsorted(cumulative, 0.99 * n)) / 255.0,
+                "saturated": float(hist[self.saturation:].sum()) / n}
+
+    def update(self, frame):
+        """ Measures a frame and adjusts exposure and gain for the next ones.
+
+        returns:
+            bool: whether the camera settings were changed
+        """
+        if frame.frame_number == self._last_frame_number:
+            return False  # the transfer failed, the frame is stale
+        self._last_frame_number = frame.frame_number
+        if self._settle:
+            self._settle -= 1
+            return False
+        self.stats = stats = self.measure(frame.as_numpy())
+
+        ratio = self.target / max(stats["mean"], 1.0 / 255)
+        if stats["saturated"] > self.max_saturated:
+            ratio = min(ratio, 1.0 - self.tolerance * 2)
+        self._calibrate()
+        if (abs(ratio - 1.0) <= self.tolerance and
+                self.clock <= self.max_clock):
+            return False
+        ratio = min(max(ratio ** self.damping, 1.0 / self.max_step),
+                    self.max_step)
+        return self._apply(self._total() * ratio)
+
+    def _total(self):
+        """ Current exposure in clocks, times the linear gain. """
+        return self.clock * 10 ** (self.gain * self.gain_step_db / 20.0)
+
+    def _apply(self, total):
+        """ Splits a total exposure into clock and gain, and writes them. """
+        self._calibrate()
+        clock = int(round(min(max(total, 1), self.max_clock)))
+        gain = 0
+        if total > self.max_clock and self.max_gain:
+            db = 20.0 * math.log10(total / self.max_clock)
+            gain = min(int(round(db / self.gain_step_db)), self.max_gain)
+        if (clock, gain) == (self.clock, self.gain):
+            return False
+        cam = self.camera
+        if clock != self.clock:
+            cam.StCam_SetExposureClock(clock)
+            self.clock = clock
+        if gain != self.gain:
+            cam.StCam_SetGain(gain)
+            self.gain = gain
+        self.updates += 1
+        self._settle = self.settle_frames
+        return True
@@ -0,0 +1,389 @@
+"""
+bench.py
+
+Acquisition throughput and latency benchmarks.  Measures grab_frame,
+    streaming, as_numpy, as_pil and to_file for every pixel format in
+    PIXEL_FORMATS over a range of resolutions, against the simulated backend
+    by default or a replayed recording.
+
+Run it with:
+
+    python -m pysentech.bench --frames 500 --json results.json
+
+or, for the per-call cost of the low-level camera methods:
+
+    python -m pysentech.bench --methods
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from ctypes import byref, c_ulong, c_ushort
+
+from . import __version__
+from .camera import PIXEL_FORMATS, POINTER_ARGS, make_method
+from .error import SentechError
+from .system import SentechSystem
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import PIL
+except ImportError:
+    PIL = None
+
+DEFAULT_RESOLUTIONS = [(320, 240), (640, 480), (1280, 1024)]
+
+
+def percentile(samples, q):
+    """ Gets the q-th percentile (0-100) of a list of samples. """
+    ordered = sorted(samples)
+    index = int(round(q / 100.0 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def time_calls(func, n):
+    """ Times n calls of func.
+
+    returns:
+        list: seconds taken by each call
+    """
+    clock = time.perf_counter
+    samples = []
+    for _ in range(n):
+        t0 = clock()
+        func()
+        samples.append(clock() - t0)
+    return samples
+
+
+def measure_allocations(func, n):
+    """ Traces memory allocations over n calls of func.
+
+    Peaks need tracemalloc.reset_peak (python 3.9+).  On older versions the
+        bytes a call leaves allocated are reported instead.
+
+    returns:
+        tuple: (mean peak bytes allocated during a call, blocks still
+            allocated per call afterwards)
+    """
+    func()  # warm up caches first
+    reset_peak = getattr(tracemalloc, "reset_peak", None)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        peaks = []
+        for _ in range(n):
+            current, _ = tracemalloc.get_traced_memory()
+            if reset_peak is not None:
+                reset_peak()
+            func()
+            traced, peak = tracemalloc.get_traced_memory()
+            if reset_peak is None:
+                peak = max(traced, current)
+            peaks.append(peak - current)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = sum(s.count_diff for s in after.compare_to(before, "lineno"))
+    return sum(peaks) / float(n), retained / float(n)
+
+
+class _TimedFunction(object):
+    """ Wraps a DLL function and accumulates the time spent inside it. """
+    def __init__(self, function):
+        self.function = function
+        self.elapsed = 0.0
+
+    def __call__(self, *args):
+        t0 = time.perf_counter()
+        try:
+            return self.function(*args)
+        finally:
+            self.elapsed += time.perf_counter() - t0
+
+
+def _record(op, samples, **extra):
+    record = {"op": op,
+              "calls": len(samples),
+              "fps": len(samples) / sum(samples) if sum(samples) else None,
+              "mean_us": 1e6 * sum(samples) / len(samples),
+              "p50_us": 1e6 * percentile(samples, 50),
+              "p99_us": 1e6 * percentile(samples, 99)}
+    record.update(extra)
+    return record
+
+
+def bench_camera(cam, frames, alloc_frames=20, file_frames=10, folder=None):
+    """ Benchmarks frame operations on a camera at its current settings.
+
+    args:
+        cam (SentechCamera): camera to benchmark
+        frames (int): number of frames per measurement
+        alloc_frames (Optional[int]): calls traced for allocations
+        file_frames (Optional[int]): calls to to_file, which is much slower
+        folder (Optional[str]): where to_file writes.  Skipped if None.
+
+    returns:
+        list: one result dict per operation
+    """
+    results = []
+    frame = cam.grab_frame()
+
+    # grab_frame, separating time inside the DLL from python overhead
+    snapshot = _TimedFunction(cam.dll.StCam_TakeRawSnapShot)
+    cam.dll.StCam_TakeRawSnapShot = snapshot
+    try:
+        samples = time_calls(cam.grab_frame, frames)
+    finally:
+        del cam.dll.StCam_TakeRawSnapShot
+    overhead = (sum(samples) - snapshot.elapsed) / len(samples)
+    alloc, retained = measure_allocations(cam.grab_frame, alloc_frames)
+    results.append(_record("grab_frame", samples,
+                           overhead_us=1e6 * overhead,
+                           alloc_bytes=alloc,
+                           retained_blocks=retained))
+
+    # continuous transfer, timed as frames come out of the queue
+    def next_streamed():
+        streamed = cam.get_frame(timeout=1.0)
+        if streamed is None:
+            raise RuntimeError("Streaming timed out.")
+        streamed.release()
+    cam.start_streaming(queue_size=8)
+    try:
+        samples = time_calls(next_streamed, frames)
+        dropped = cam.capture_stats["dropped"]
+    finally:
+        cam.stop_streaming()
+    results.append(_record("stream", samples, dropped=dropped))
+
+    ops = []
+    if numpy is not None:
+        ops.append(("as_numpy", frame.as_numpy, frames))
+    if PIL is not None:
+        ops.append(("as_pil", frame.as_pil, frames))
+    if folder is not None:
+        path = os.path.join(folder, "bench.png")
+        ops.append(("to_file", lambda: frame.to_file(path), file_frames))
+    for name, func, n in ops:
+        samples = time_calls(func, n)
+        alloc, retained = measure_allocations(func, min(n, alloc_frames))
+        results.append(_record(name, samples,
+                               alloc_bytes=alloc,
+                               retained_blocks=retained))
+    return results
+
+
+def _generic_method(cam, function, arg_types, ret_type, dll):
+    """
+    make_method as it was before its bindings were specialized.  Kept as the
+        baseline for bench_methods.
+    """
+    method_arg_types = arg_types[1:]
+    def method(*args, **kwargs):
+        args = [a if method_arg_types[i] not in POINTER_ARGS else byref(a) for i,
+                a in enumerate(args) ]
+        result = function(cam.handle, *args, **kwargs)
+        if ret_type == "BOOL":
+            if not result:
+                raise SentechError(cam.handle, dll)
+        return result
+    return method
+
+
+# (function name, args) for bench_methods
+METHOD_CASES = [
+    ("StCam_GetExposureClock", lambda: (c_ulong(),)),
+    ("StCam_SetGain", lambda: (10,)),
+    ("StCam_GetGain", lambda: (c_ushort(),)),
+    ("StCam_GetImageSize", lambda: (c_ulong(), c_ushort(), c_ulong(),
+                                    c_ulong(), c_ulong(), c_ulong())),
+]
+
+
+def bench_methods(cam, calls=100000, repeat=3):
+    """ Measures the per-call cost of low-level camera methods, comparing the
+            generic binding with make_method's specialized one.  "dll_ns" is
+            the cost of calling the DLL function directly with prepared
+            arguments, so the difference from it is python overhead.
+
+    args:
+        cam (SentechCamera): camera to call
+        calls (Optional[int]): calls per measurement
+        repeat (Optional[int]): measurements per binding, the best is kept
+
+    returns:
+        list: one result dict per function
+    """
+    def best_ns(func, args):
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in range(calls):
+                func(*args)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        return 1e9 * best / calls
+
+    results = []
+    for name, make_args in METHOD_CASES:
+        v = cam.dll.functions[name]
+        function = cam.dll.get_function(name)
+        spec = (cam, function, v['arg_types'], v['ret_type'], cam.dll)
+        args = make_args()
+        direct_args = [byref(a) if t in POINTER_ARGS else a
+                       for a, t in zip(args, v['arg_types'][1:])]
+        dll_ns = best_ns(function, [cam.handle] + direct_args)
+        generic_ns = best_ns(_generic_method(*spec), args)
+        specialized_ns = best_ns(make_method(*spec), args)
+        results.append({"op": name,
+                        "calls": calls,
+                        "dll_ns": dll_ns,
+                        "generic_ns": generic_ns,
+                        "specialized_ns": specialized_ns,
+                        "overhead_saved_ns": generic_ns - specialized_ns})
+    return results
+
+
+def run(backend="sim", formats=None, resolutions=None, frames=200,
+        **backend_kwargs):
+    """ Runs the benchmark over pixel formats and resolutions.
+
+    args:
+        backend (Optional[str]): SentechSystem backend
+        formats (Optional[list]): pixel format names.  Defaults to all of
+            PIXEL_FORMATS.
+        resolutions (Optional[list]): (width, height) tuples
+        frames (Optional[int]): frames per measurement
+        **backend_kwargs: passed to SentechSystem
+
+    returns:
+        list: one result dict per operation, pixel format and resolution
+    """
+    if backend == "replay":
+        # a recording can only be replayed at its own settings
+        formats, resolutions = [None], [None]
+    formats = formats or list(PIXEL_FORMATS.values())
+    resolutions = resolutions or DEFAULT_RESOLUTIONS
+    if backend == "sim":
+        backend_kwargs.setdefault("width", max(w for w, h in resolutions))
+        backend_kwargs.setdefault("height", max(h for w, h in resolutions))
+        backend_kwargs.setdefault("fps", 0)
+    system = SentechSystem(backend=backend, **backend_kwargs)
+    cam = system.get_camera(0)
+    folder = tempfile.mkdtemp(prefix="pysentech_bench")
+    results = []
+    try:
+        for pixel_format in formats:
+            if pixel_format is not None:
+                cam.pixel_format = pixel_format
+            for shape in resolutions:
+                if shape is not None:
+                    cam.image_shape = shape
+                for record in bench_camera(cam, frames, folder=folder):
+                    record.update(backend=backend,
+                                  pixel_format=cam.pixel_format,
+                                  width=cam.image_width,
+                                  height=cam.image_height)
+                    results.append(record)
+    finally:
+        cam.release()
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def _print_table(results, out=sys.stdout):
+    if "generic_ns" in results[0]:
+        columns = ["op", "dll_ns", "generic_ns", "specialized_ns",
+                   "overhead_saved_ns"]
+    else:
+        columns = ["pixel_format", "width", "height", "op", "fps", "p50_us",
+                   "p99_us", "overhead_us", "alloc_bytes"]
+    rows = [columns]
+    for r in results:
+        cells = []
+        for c in columns:
+            v = r.get(c)
+            if isinstance(v, float):
+                v = "{:.1f}".format(v)
+            cells.append("-" if v is None else str(v))
+        rows.append(cells)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        out.write("  ".join(cell.rjust(w) for cell, w in zip(row, widths)) +
+                  "\n")
+
+
+def _resolution(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pysentech.bench",
+                                     description=__doc__.split("\n\n")[1])
+    parser.add_argument("--backend", default="sim",
+                        help="SentechSystem backend (default: sim)")
+    parser.add_argument("--recording", metavar="PATH",
+                        help="recording to replay with --backend replay")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="replay speed, 0 for as fast as possible "
+                             "(default: 0)")
+    parser.add_argument("--frames", type=int, default=200,
+                        help="frames per measurement (default: 200)")
+    parser.add_argument("--formats", nargs="+", choices=PIXEL_FORMATS.values(),
+                        help="pixel formats (default: all)")
+    parser.add_argument("--resolutions", nargs="+", type=_resolution,
+                        metavar="WxH", help="resolutions (default: {})".format(
+                            " ".join("{}x{}".format(*r)
+                                     for r in DEFAULT_RESOLUTIONS)))
+    parser.add_argument("--fps", type=float, default=0,
+                        help="simulated frame rate, 0 for unpaced (default: 0)")
+    parser.add_argument("--methods", action="store_true",
+                        help="benchmark low-level method bindings instead")
+    parser.add_argument("--json", metavar="PATH",
+                        help="write machine-readable results to PATH ('-' for "
+                             "stdout)")
+    args = parser.parse_args(argv)
+
+    kwargs = {}
+    if args.backend == "sim":
+        kwargs["fps"] = args.fps
+    elif args.backend == "replay":
+        if not args.recording:
+            parser.error("--backend replay needs --recording")
+        kwargs.update(path=args.recording, speed=args.speed, loop=True)
+    if args.methods:
+        cam = SentechSystem(backend=args.backend, **kwargs).get_camera(0)
+        try:
+            results = bench_methods(cam)
+        finally:
+            cam.release()
+    else:
+        results = run(args.backend, args.formats, args.resolutions,
+                      args.frames, **kwargs)
+
+    report = {"version": __version__,
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "results": results}
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        _print_table(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,15 @@ Created on Mon Dec 07 22:04:46 2015
 
 @author: derricw
 """
+import time
+from collections import OrderedDict
 from ctypes import *
+from functools import partial
 
-from .error import SentechError
-from .frame import _SentechFrame
+from .error import SentechError, SentechEndOfRecording, ERROR_HANDLE_EOF
+from .frame import _SentechFrame, _FramePool
+from .capture import FrameQueue, _CaptureThread, _TransferCallback
+from .roi import RegionOfInterest
 
 #Args that will be passed by reference
 POINTER_ARGS = [
@@ -26,24 +31,108 @@ PIXEL_FORMATS = {
     8: "BGR32",
 }
 
+# Sensor color filter arrays
+COLOR_ARRAYS = {
+    1: "Mono",
+    2: "RGGB",
+    3: "GRBG",
+    4: "GBRG",
+    5: "BGGR",
+}
+
+# Scan modes, from StCamD.h.  "roi" (variable partial scan) and "binning_roi"
+#   take any window, the others read out a fixed part of the sensor.  Binning
+#   modes sum 2x2 pixels, so their windows are in binned pixels.
+SCAN_MODES = OrderedDict([
+    ("normal", 0x0000),
+    ("partial_2", 0x0001),
+    ("partial_4", 0x0002),
+    ("partial_1", 0x0004),
+    ("roi", 0x0008),
+    ("binning", 0x0010),
+    ("binning_partial_1", 0x0020),
+    ("binning_partial_2", 0x0040),
+    ("binning_partial_4", 0x0080),
+    ("binning_roi", 0x0100),
+])
+
+# Scan modes that take an arbitrary window
+WINDOW_SCAN_MODES = ("roi", "binning_roi")
+
+# Trigger modes for set_trigger
+TRIGGER_MODES = ("free_run", "software", "hardware")
+
+# Gamma correction modes and the luminance target, from StCamD.h
+GAMMA_MODES = OrderedDict([
+    ("off", 0),
+    ("on", 1),
+    ("reverse", 2),
+    ("table", 3),
+])
+GAMMA_TARGET_Y = 0
 
-def make_method(cam, function, arg_types, ret_type, dll):
+# Pixel clock modes, from StCamD.h
+CLOCK_MODES = OrderedDict([
+    ("normal", 0),
+    ("div_2", 1),
+    ("div_4", 2),
+])
+
+
+def make_method(cam, function, arg_types, ret_type, dll, stats=None):
     """
     Makes a SentechCamera method out of a DLL function.  Automatically passes
-        pointer arguments by reference.
+        pointer arguments by reference, and raises SentechError when a
+        function that returns BOOL fails.
 
-    TODO: automatically handle exception raising if return type is BOOL        
-        
+    The method is specialized here, once: pointer argument positions and the
+        error check are resolved up front and the camera handle is bound
+        directly, so calls don't inspect argument types.
+
+    With stats (pysentech.stats.AcquisitionStats), the method also records
+        its python overhead.
     """
+    if stats is not None:
+        return stats.instrument(function, lambda f: make_method(
+            cam, f, arg_types, ret_type, dll))
+    handle = cam.handle
     method_arg_types = arg_types[1:]
-    def method(*args, **kwargs):
-        args = [a if method_arg_types[i] not in POINTER_ARGS else byref(a) for i,
-                a in enumerate(args) ]
-        result = function(cam.handle, *args, **kwargs)
-        if ret_type == "BOOL":
+    pointers = tuple(i for i, t in enumerate(method_arg_types)
+                     if t in POINTER_ARGS)
+    check = ret_type == "BOOL"
+
+    if not pointers:
+        if not check:
+            return partial(function, handle)
+
+        def method(*args):
+            result = function(handle, *args)
             if not result:
-                raise SentechError(cam.handle, dll)
-        return result
+                raise SentechError(handle, dll)
+            return result
+
+    elif len(pointers) == len(method_arg_types):
+        # every argument is passed by reference
+        if not check:
+            def method(*args):
+                return function(handle, *map(byref, args))
+        else:
+            def method(*args):
+                result = function(handle, *map(byref, args))
+                if not result:
+                    raise SentechError(handle, dll)
+                return result
+
+    else:
+        def method(*args):
+            args = list(args)
+            for i in pointers:
+                args[i] = byref(args[i])
+            result = function(handle, *args)
+            if check and not result:
+                raise SentechError(handle, dll)
+            return result
+
     return method
 
 
@@ -54,57 +143,208 @@ class SentechCamera(object):
     args:
         index (int): camera index
         dll (pysentech.sentechdll.SentechDLL): SentechDLL instance
+        buffer_count (Optional[int]): number of frame buffers for grab_frame
+            to fill in turn.  See allocate_buffers.
     """
-    def __init__(self, index, dll):
+    def __init__(self, index, dll, buffer_count=0):
         self.dll = dll
+        self.index = index
+        self.stats = None
+        self.auto_exposure = None
         self.handle = self.dll.StCam_Open(index)
         
-        self._setup_low_level()
-        
         self._cbytesxferred = c_ulong()
         self._cframeno = c_ulong()
+        self._pbytesxferred = byref(self._cbytesxferred)
+        self._pframeno = byref(self._cframeno)
         
+        self._last_frame_number = None
+        self.frames_skipped = 0
+
+        self._settings = {}
+        self._pool = None
+        self._rois = OrderedDict()
+        self._roi = None
+        self._capture = None
+        self._queue = None
+        self._aio = None
         self._setup_frame()
+        if buffer_count:
+            self.allocate_buffers(buffer_count)
         
-    def _setup_low_level(self):
+    def __getattr__(self, name):
         """
-        Takes all dll functions with the camera handle as their first argument
-            and makes them into methods of SentechCamera.  This way we still
-            retain all low-level functionality.
+        Makes dll functions with the camera handle as their first argument into
+            methods of SentechCamera the first time they are used.  This way we
+            still retain all low-level functionality.
         """
+        dll = self.__dict__.get("dll")
+        v = dll.functions.get(name) if dll is not None else None
+        if v is None or v["arg_names"][:1] != ["hCamera"]:
+            raise AttributeError(name)
+        method = make_method(self, dll.get_function(name), v['arg_types'],
+                             v['ret_type'], dll, self.__dict__.get("stats"))
+        setattr(self, name, method)
+        return method
 
-        for k, v in self.dll.functions.items():
-            args = v["arg_names"]
-            if (len(args) > 0) and (args[0] == "hCamera"):
-                method_name = k
-                method = make_method(self, v['function'], v['arg_types'],
-                                     v['ret_type'], self.dll)
-                setattr(self, method_name, method)     
+    def __dir__(self):
+        names = set(dir(type(self))) | set(self.__dict__)
+        names.update(k for k, v in self.dll.functions.items()
+                     if v["arg_names"][:1] == ["hCamera"])
+        return sorted(names)
                 
+    def enable_stats(self, **kwargs):
+        """
+        Starts collecting acquisition telemetry: time spent in each stage,
+            rolling FPS, timeouts and errors.  Collecting costs a little time
+            on every call, so it is off by default.
+
+            >>> stats = cam.enable_stats()
+            >>> stats.snapshot()["stages"]["snapshot"]["p99"]
+            >>> print(stats.to_prometheus())
+
+        args:
+            **kwargs: passed to pysentech.stats.AcquisitionStats.  Labels
+                default to the camera index.
+
+        returns:
+            AcquisitionStats: the collector, also available as cam.stats
+        """
+        from .stats import AcquisitionStats
+        kwargs.setdefault("labels", {"camera": self.index})
+        self.stats = AcquisitionStats(**kwargs)
+        self._unbind_methods()
+        return self.stats
+
+    def disable_stats(self):
+        """ Stops collecting acquisition telemetry. """
+        self.stats = None
+        self._unbind_methods()
+
+    def enable_auto_exposure(self, **kwargs):
+        """
+        Starts adjusting exposure and gain from every frame handed out by
+            grab_frame and get_frame, to keep the image at a target
+            brightness.
+
+        args:
+            **kwargs: passed to pysentech.autoexposure.AutoExposure
+
+        returns:
+            AutoExposure: the controller, also available as cam.auto_exposure
+        """
+        from .autoexposure import AutoExposure
+        self.auto_exposure = AutoExposure(self, **kwargs)
+        return self.auto_exposure
+
+    def disable_auto_exposure(self):
+        """ Stops adjusting exposure and gain. """
+        self.auto_exposure = None
+
+    def _unbind_methods(self):
+        """
+        Drops the low-level methods made so far so that they are made again,
+            with or without instrumentation, on next use.
+        """
+        for name in list(self.__dict__):
+            if name.startswith("StCam_"):
+                delattr(self, name)
+
+    def _frame_layout(self):
+        """
+        Gets the current buffer layout as keyword arguments for _SentechFrame.
+        """
+        width, height = self.image_shape
+        return dict(width=width,
+                    height=height,
+                    bpi=self.image_size,
+                    camera=self,
+                    pixel_format=self.pixel_format)
+
     def _setup_frame(self):
         """
         Sets up the SentechFrame.  This needs to be run any time the image
             shape or pixel format changes.
         """
+        layout = self._frame_layout()
+        self.frame = _SentechFrame(**layout)
+        if self._pool is not None:
+            self._pool = _FramePool(len(self._pool), **layout)
+
+    def _update_frame(self):
+        """
+        Sets up the SentechFrame again if the buffer layout changed.
+        """
+        frame = self.frame
         width, height = self.image_shape
-        self.frame = _SentechFrame(width=width,
-                                  height=height,
-                                  bpi=self.image_size,
-                                  camera=self,
-                                  pixel_format=self.pixel_format)
+        if (frame.width, frame.height, frame.bpi, frame.pixel_format) != (
+                width, height, self.image_size, self.pixel_format):
+            self._setup_frame()
+
+    def allocate_buffers(self, count):
+        """
+        Preallocates a pool of frame buffers.  Once allocated, grab_frame fills
+            them in turn and each returned frame stays valid until it is
+            released with frame.release(), so several frames can be held
+            without copying.  The pool is reallocated with the same count
+            whenever the image shape or pixel format changes.
+
+        args:
+            count (int): number of frame buffers.  0 goes back to a single
+                frame buffer that is overwritten by every grab.
+        """
+        if count:
+            self._pool = _FramePool(count, **self._frame_layout())
+        else:
+            self._pool = None
+
+    @property
+    def buffer_count(self):
+        """ Number of pooled frame buffers, 0 if there is no pool. """
+        return len(self._pool) if self._pool is not None else 0
+
+    def release_frame(self, frame):
+        """ Returns a frame from grab_frame to the buffer pool. """
+        frame.release()
         
-    @property        
-    def image_size(self):
+    def _cached(self, key, query):
+        """
+        Gets a setting from the settings cache, calling query() to read it
+            from the camera on a miss.
+        """
+        try:
+            return self._settings[key]
+        except KeyError:
+            value = self._settings[key] = query()
+            return value
+
+    def refresh_settings(self):
+        """
+        Clears the settings cache so that image geometry and format are read
+            from the camera again on next access.  The camera's own setters do
+            this automatically; call it after changing those settings through
+            the low-level StCam_* methods.
+        """
+        self._settings.clear()
+
+    def _query_image_size(self):
         size = c_ulong()
         self.StCam_GetRawDataSize(size)
         return size.value
 
-    @property
-    def pixel_format(self):        
+    @property        
+    def image_size(self):
+        return self._cached("image_size", self._query_image_size)
+
+    def _query_pixel_format(self):
         cpixformat = c_ulong()
         self.StCam_GetPreviewPixelFormat(cpixformat)
         return PIXEL_FORMATS[cpixformat.value]
 
+    @property
+    def pixel_format(self):        
+        return self._cached("pixel_format", self._query_pixel_format)
+
     @pixel_format.setter
     def pixel_format(self, value):
         if value not in PIXEL_FORMATS.values():
@@ -112,13 +352,10 @@ class SentechCamera(object):
         for k, v in PIXEL_FORMATS.items():
             if v == value:
                 self.StCam_SetPreviewPixelFormat(k)
+                self.refresh_settings()
                 self._setup_frame()  #new payload size
-        
-    @property
-    def image_shape(self):
-        """
-        Gets the current image shape.
-        """
+
+    def _query_geometry(self):
         cwidth, cheight = c_ulong(), c_ulong()
         creserved = c_ulong()
         cscanmode = c_ushort()
@@ -126,7 +363,123 @@ class SentechCamera(object):
         
         self.StCam_GetImageSize(creserved, cscanmode, coffsetx, coffsety,
                                 cwidth, cheight)
-        return cwidth.value, cheight.value
+        return (cscanmode.value, coffsetx.value, coffsety.value,
+                cwidth.value, cheight.value)
+
+    @property
+    def _geometry(self):
+        """
+        Gets the current (scan mode, offset x, offset y, width, height).
+        """
+        return self._cached("geometry", self._query_geometry)
+        
+    def _set_geometry(self, scan_mode, offsetx, offsety, width, height):
+        """
+        Applies a scan mode and window in one driver call.  The frame buffers
+            are only reallocated if the frame layout changed.
+        """
+        self.StCam_SetImageSize(0, scan_mode, offsetx, offsety, width, height)
+        self.refresh_settings()
+        self._roi = None
+        self._update_frame()
+
+    def _window_scan_mode(self):
+        """
+        Gets the scan mode to use for a new window: the current mode if it
+            takes arbitrary windows, otherwise "roi".
+        """
+        mode = self.scan_mode
+        if mode not in WINDOW_SCAN_MODES:
+            mode = "roi"
+        return SCAN_MODES[mode]
+
+    @property
+    def scan_mode(self):
+        """
+        Gets the current scan mode, one of SCAN_MODES.  Modes the table doesn't
+            know are returned as numbers.
+        """
+        value = self._geometry[0]
+        for name, mode in SCAN_MODES.items():
+            if mode == value:
+                return name
+        return value
+
+    @scan_mode.setter
+    def scan_mode(self, value):
+        """
+        Sets the scan mode, keeping the current window.  Modes with a fixed
+            size ignore the window.
+        """
+        width, height = self.image_shape
+        offsetx, offsety = self.image_offsets
+        self.set_roi(width, height, offsetx, offsety, value)
+
+    @property
+    def available_scan_modes(self):
+        """
+        Gets the scan modes this camera supports.
+        """
+        cmodes = c_ushort()
+        self.StCam_GetAvailableScanMode(cmodes)
+        return [name for name, mode in SCAN_MODES.items()
+                if mode == 0 or cmodes.value & mode]
+
+    @property
+    def output_fps(self):
+        """
+        Gets the frame rate the camera can deliver with the current window,
+            scan mode and exposure.
+        """
+        cfps = c_float()
+        self.StCam_GetOutputFPS(cfps)
+        return cfps.value
+
+    def configure(self, **settings):
+        """
+        Collects settings changes to apply together, with the fewest driver
+            calls and at most one buffer reallocation:
+
+            >>> with cam.configure() as cfg:
+            ...     cfg.image_shape = (640, 480)
+            ...     cfg.pixel_format = "BGR24"
+            ...     cfg.exposure = 0.005
+
+            or cam.configure(gain=20, exposure=0.005).apply()
+
+        Args:
+            **settings: initial changes, see CameraConfiguration.SETTINGS
+
+        Returns:
+            CameraConfiguration: the pending changes
+        """
+        from .config import CameraConfiguration
+        return CameraConfiguration(self).update(**settings)
+
+    def set_roi(self, width, height, offset_x=0, offset_y=0, scan_mode="roi"):
+        """
+        Sets the readout window and scan mode with a single driver call.
+
+        Args:
+            width (int): window width in pixels, binned pixels for binning modes
+            height (int): window height in pixels
+            offset_x (Optional[int]): window offset
+            offset_y (Optional[int]): window offset
+            scan_mode (Optional[str]): one of SCAN_MODES, e.g. "binning_roi"
+                for a binned window
+        """
+        if scan_mode not in SCAN_MODES:
+            raise KeyError("Invalid scan mode, try: {}".format(
+                list(SCAN_MODES)))
+        self._set_geometry(SCAN_MODES[scan_mode], offset_x, offset_y, width,
+                           height)
+
+    @property
+    def image_shape(self):
+        """
+        Gets the current image shape.
+        """
+        return self._geometry[3:]
 
     @image_shape.setter
     def image_shape(self, value):
@@ -138,22 +491,15 @@ class SentechCamera(object):
         """
         width, height = value
         offsetx, offsety = self.image_offsets
-        self.StCam_SetImageSize(0, 8, offsetx, offsety, width, height)
-        self._setup_frame()  #new payload size
+        self._set_geometry(self._window_scan_mode(), offsetx, offsety, width,
+                           height)
         
     @property
     def image_offsets(self):
         """
         Gets the current image offsets.
         """
-        cwidth, cheight = c_ulong(), c_ulong()
-        creserved = c_ulong()
-        cscanmode = c_ushort()
-        coffsetx, coffsety = c_ulong(), c_ulong()
-        
-        self.StCam_GetImageSize(creserved, cscanmode, coffsetx, coffsety,
-                                cwidth, cheight)
-        return coffsetx.value, coffsety.value
+        return self._geometry[1:3]
 
     @image_offsets.setter
     def image_offsets(self, value):
@@ -164,7 +510,8 @@ class SentechCamera(object):
         """
         offsetx, offsety = value
         width, height = self.image_shape
-        self.StCam_SetImageSize(0, 8, offsetx, offsety, width, height)
+        self._set_geometry(self._window_scan_mode(), offsetx, offsety, width,
+                           height)
 
     @property
     def image_height(self):
@@ -204,41 +551,75 @@ class SentechCamera(object):
         self.StCam_GetMaxGain(cgain)
         return cgain.value
 
+    def _build_exposure_table(self):
+        from .exposure import ExposureTable
+        return ExposureTable.from_camera(self)
+
+    @property
+    def exposure_table(self):
+        """ Gets the exposure clock <-> seconds table for the current
+                settings.  It is built on first use and dropped by
+                refresh_settings(), which the clock_mode setter calls.  Call it
+                after changing the clock mode through the low-level StCam_*
+                methods.
+        """
+        return self._cached("exposure_table", self._build_exposure_table)
+
     @property
     def exposure(self):
         """ Have to first get exposure clock value then convert
-            to seconds using GetExposureTimeFromClock.
+            to seconds, using the cached exposure table.
         """
         c_exposure = c_ulong()
         self.StCam_GetExposureClock(c_exposure)
-        clock_val = c_exposure.value
-        exp_sec = c_float()
-        self.StCam_GetExposureTimeFromClock(clock_val, exp_sec)
-        return exp_sec.value
+        return self.exposure_table.to_seconds(c_exposure.value)
 
     @exposure.setter
     def exposure(self, value):
         """ Set exposure time.
-         Convert seconds to clock value using GetExposureClockFromTime
+         Convert seconds to clock value using the cached exposure table
             first.
         """
-        c_exposure = c_ulong()
-        self.StCam_GetExposureClockFromTime(value, c_exposure)
-        clock_val = c_exposure.value
-        self.StCam_SetExposureClock(clock_val)
+        self.StCam_SetExposureClock(self.exposure_table.to_clock(value))
 
     @property
     def max_exposure(self):
-        c_exposure = c_ulong()
-        self.StCam_GetMaxLongExposureClock(c_exposure)
-        clock_val = c_exposure.value
-        exp_sec = c_float()
-        self.StCam_GetExposureTimeFromClock(clock_val, exp_sec)
-        return exp_sec.value
+        return self.exposure_table.max_seconds
+
+    @property
+    def clock_mode(self):
+        """ Gets the pixel clock mode, one of CLOCK_MODES.  Modes this module
+                doesn't know come back as their raw value.
+        """
+        cmode, cclock = c_ulong(), c_ulong()
+        self.StCam_GetClock(cmode, cclock)
+        names = dict((v, k) for k, v in CLOCK_MODES.items())
+        return names.get(cmode.value, cmode.value)
+
+    @clock_mode.setter
+    def clock_mode(self, value):
+        """ Sets the pixel clock mode by name, or by raw value.  The exposure
+                clock length changes with it, so the exposure table is
+                rebuilt on next use, for every named ROI too.
+        """
+        if value in CLOCK_MODES:
+            value = CLOCK_MODES[value]
+        elif not isinstance(value, int):
+            raise KeyError("Invalid clock mode, try: {}".format(
+                list(CLOCK_MODES)))
+        cmode, cclock = c_ulong(), c_ulong()
+        self.StCam_GetClock(cmode, cclock)
+        try:
+            self.StCam_SetClock(value, cclock.value)
+        finally:
+            self.refresh_settings()
+            for roi in self._rois.values():
+                roi.exposure_table = None
 
     @property
     def gamma(self):
-        """ Doesn't work yet.  Have to set gamma mode first.
+        """ Gets the camera gamma value.  It only takes effect with a
+                gamma_mode other than "off".
         """
         c_gamma = c_ushort()
         self.StCam_GetCameraGammaValue(c_gamma)
@@ -246,10 +627,59 @@ class SentechCamera(object):
 
     @gamma.setter
     def gamma(self, value):
-        """ Doesn't work yet. have to set gamma mode first.
+        """ Sets the camera gamma value.  Set gamma_mode first.
         """
         self.StCam_SetCameraGammaValue(value)
 
+    def _query_gamma_mode_ex(self):
+        """ Gets the gamma settings of the luminance target as ctypes
+                objects, ready to be passed back to StCam_SetGammaModeEx:
+                (mode, gamma, brightness, contrast, 256 byte table).
+        """
+        cmode, cgamma = c_byte(), c_ushort()
+        cbrightness, ccontrast = c_short(), c_byte()
+        table = (c_byte * 256)()
+        self.StCam_GetGammaModeEx(GAMMA_TARGET_Y, cmode, cgamma, cbrightness,
+                                  ccontrast, c_byte.from_buffer(table))
+        return cmode, cgamma, cbrightness, ccontrast, table
+
+    @property
+    def gamma_mode(self):
+        """ Gets the gamma correction mode, one of GAMMA_MODES.  Modes this
+                module doesn't know come back as their raw value.
+        """
+        mode = self._query_gamma_mode_ex()[0].value
+        names = dict((v, k) for k, v in GAMMA_MODES.items())
+        return names.get(mode, mode)
+
+    @gamma_mode.setter
+    def gamma_mode(self, value):
+        """ Sets the gamma correction mode by name, or by raw value.  The
+                other gamma settings are kept.
+        """
+        if value in GAMMA_MODES:
+            value = GAMMA_MODES[value]
+        elif not isinstance(value, int):
+            raise KeyError("Invalid gamma mode, try: {}".format(
+                list(GAMMA_MODES)))
+        _, cgamma, cbrightness, ccontrast, table = self._query_gamma_mode_ex()
+        self.StCam_SetGammaModeEx(GAMMA_TARGET_Y, value, cgamma.value,
+                                  cbrightness.value, ccontrast.value,
+                                  c_byte.from_buffer(table))
+
+    def _query_color_array(self):
+        carray = c_ushort()
+        self.StCam_GetColorArray(carray)
+        return COLOR_ARRAYS.get(carray.value, "Mono")
+
+    @property
+    def color_array(self):
+        """ Gets the sensor's color filter array: "Mono" or a Bayer pattern
+                like "RGGB".  Raw "Mono8" frames from a Bayer sensor can be
+                turned into color with frame.demosaic().
+        """
+        return self._cached("color_array", self._query_color_array)
+
     @property    
     def max_image_shape(self):
         cwidth, cheight = c_ulong(), c_ulong()
@@ -290,56 +720,634 @@ class SentechCamera(object):
             
     def reset_settings(self):
         self.StCam_ResetSetting()
+        self.refresh_settings()
+        self._roi = None
+        self._setup_frame()
+
+    def add_roi(self, name, width, height, offset_x=0, offset_y=0,
+                scan_mode="roi"):
+        """
+        Defines a named readout window and preallocates its buffers, so that
+            switching to it with use_roi costs one driver call and allocates
+            nothing.  The window is applied briefly to measure its frame size
+            and frame rate, then the current one is restored.
+
+        Args:
+            name (str): name to switch to it by
+            width, height, offset_x, offset_y, scan_mode: see set_roi
+
+        Returns:
+            RegionOfInterest: the region, with its measured image_size and
+                max_fps
+        """
+        if scan_mode not in SCAN_MODES:
+            raise KeyError("Invalid scan mode, try: {}".format(
+                list(SCAN_MODES)))
+        if self.capturing:
+            raise RuntimeError("Stop capture before changing ROIs.")
+        roi = RegionOfInterest(name, scan_mode, offset_x, offset_y, width,
+                               height)
+        geometry = self._geometry
+        saved = (self.frame, self._pool, self._roi, dict(self._settings))
+        try:
+            self._prepare_roi(roi)
+        finally:
+            self.StCam_SetImageSize(0, *geometry)
+            self.frame, self._pool, self._roi, self._settings = saved
+        self._rois[name] = roi
+        return roi
+
+    def _prepare_roi(self, roi):
+        """
+        Applies a region, measures it and allocates its buffers.
+        """
+        buffer_count = self.buffer_count
+        self.StCam_SetImageSize(0, SCAN_MODES[roi.scan_mode], roi.offset_x,
+                                roi.offset_y, roi.width, roi.height)
+        self.refresh_settings()
+        roi.geometry = self._geometry
+        roi.image_size = self.image_size
+        roi.pixel_format = self.pixel_format
+        roi.max_fps = self.output_fps
+        roi.exposure_table = None
+        layout = self._frame_layout()
+        roi.frame = _SentechFrame(**layout)
+        roi.pool = _FramePool(buffer_count, **layout) if buffer_count else None
+
+    def remove_roi(self, name):
+        """ Forgets a named region and frees its buffers. """
+        del self._rois[name]
+        if self._roi == name:
+            self._roi = None
+
+    @property
+    def rois(self):
+        """ Named regions, by name. """
+        return OrderedDict(self._rois)
+
+    @property
+    def roi(self):
+        """ Name of the region in use, None after any other geometry change. """
+        return self._roi
+
+    def use_roi(self, name):
+        """
+        Switches to a region defined with add_roi.  grab_frame then fills the
+            region's own buffers, so frames grabbed in other regions stay
+            valid.  Its buffers are only reallocated if the pixel format or
+            buffer count changed since it was added.
+        """
+        roi = self._rois[name]
+        if (self._roi == name and self.frame is roi.frame and
+                self._pool is roi.pool):
+            return
+        if self.capturing:
+            raise RuntimeError("Stop capture before switching ROIs.")
+        if (roi.pixel_format != self.pixel_format or
+                roi.buffer_count != self.buffer_count):
+            self._prepare_roi(roi)
+        else:
+            table = self._settings.pop("exposure_table", None)
+            if self._roi is not None and table is not None:
+                self._rois[self._roi].exposure_table = table
+            self.StCam_SetImageSize(0, *roi.geometry)
+            self._settings["geometry"] = roi.geometry
+            self._settings["image_size"] = roi.image_size
+            if roi.exposure_table is not None:
+                self._settings["exposure_table"] = roi.exposure_table
+        self.frame = roi.frame
+        self._pool = roi.pool
+        self._roi = name
+
+    def grab_rois(self, names=None, timeout_ms=1000):
+        """
+        Cycles through named regions, grabbing one frame from each.
+
+        Args:
+            names (Optional[list]): region names in grab order.  Defaults to
+                every region, in the order they were added.
+            timeout_ms (Optional[int]): timeout for each buffer transfer in
+                milliseconds
+
+        Returns:
+            OrderedDict: frame for each region name.  Pooled frames must be
+                released as usual.
+        """
+        if names is None:
+            names = list(self._rois)
+        frames = OrderedDict()
+        for name in names:
+            self.use_roi(name)
+            frames[name] = self.grab_frame(timeout_ms)
+        return frames
     
     def save_settings(self, path):
         """
-        Save camera settings to a specified path.
+        Saves all camera settings to a file with the driver's own
+            StCam_SaveSettingFileA.
 
-        DOESNT WORK YET        
+        Args:
+            path (str): file path
         """
-        #self.StCam_SaveSettingFileA(path)
-        raise NotImplementedError("Doesn't work yet.")
+        self.StCam_SaveSettingFileA(path.encode())
 
     def load_settings(self, path):
         """
-        Load camera settings from path.
-        
-        DOESNT WORK YET        
+        Loads camera settings saved with save_settings, letting the driver
+            apply the whole file at once.
+
+        Args:
+            path (str): file path
         """
-        #self.StCam_LoadSettingFileA(path)
-        raise NotImplementedError("Doesn't work yet.")
+        if self.capturing:
+            raise RuntimeError("Stop capture before loading settings.")
+        try:
+            self.StCam_LoadSettingFileA(path.encode())
+        finally:
+            self.refresh_settings()
+            self._roi = None
+            self._update_frame()
+
+    def get_profile(self):
+        """
+        Reads the camera's settings in one pass: window, pixel format,
+            exposure clock, gain, gamma mode, gamma and trigger mode.  See
+            pysentech.profile.
+
+        Returns:
+            dict: the profile
+        """
+        from .profile import read_profile
+        return read_profile(self)
+
+    def apply_profile(self, profile):
+        """
+        Writes the settings of a profile that differ from the camera's
+            current ones, with the fewest driver calls.
+
+        Returns:
+            dict: the settings that were changed
+        """
+        from .profile import apply_profile
+        return apply_profile(self, profile)
+
+    def save_profile(self, path):
+        """
+        Saves the camera's settings profile as JSON.  Unlike save_settings,
+            the file is readable and can be diffed and applied partially.
+        """
+        from .profile import save_profile
+        save_profile(self.get_profile(), path,
+                     model=self.model.decode(errors="replace"))
+
+    def load_profile(self, path):
+        """
+        Applies a settings profile saved with save_profile.
+
+        Returns:
+            dict: the settings that were changed
+        """
+        from .profile import load_profile
+        return self.apply_profile(load_profile(path))
         
-    def _snapshot(self, timeout_ms):
+    def _transfer(self, buffer, size, timeout_ms):
+        """
+        Transfers the current camera image into a buffer.
+
+        Args:
+            buffer (POINTER(c_byte)): destination
+            size (int): destination size in bytes
+            timeout_ms (int): timeout for buffer transfer in milliseconds
+
+        Returns:
+            tuple: (False if the transfer failed or timed out, host
+                timestamp when it completed)
+        """
+        stats = self.stats
+        if stats is not None:
+            t0 = time.perf_counter()
+        ok = self.dll.StCam_TakeRawSnapShot(self.handle,
+                                            buffer,
+                                            size,
+                                            self._pbytesxferred,
+                                            self._pframeno,
+                                            timeout_ms)
+        timestamp = time.perf_counter()
+        if stats is not None:
+            stats.observe("snapshot", timestamp - t0)
+            if ok:
+                stats.frame(timestamp)
+            else:
+                stats.timeout()
+        return ok, timestamp
+
+    def _snapshot(self, timeout_ms, frame=None):
         """
         Transfers the current camera image to the frame buffer.
         
         Args:
             timeout_ms (int): timeout for buffer transfer in milliseconds
+            frame (Optional[_SentechFrame]): frame to transfer into.  Defaults
+                to the camera's own frame.
+
+        Returns:
+            bool: False if the transfer failed or timed out
+        """
+        if frame is None:
+            frame = self.frame
+        ok, timestamp = self._transfer(frame.buffer, frame.bpi, timeout_ms)
+        if ok:
+            self._stamp(frame, self._cframeno.value, self._cbytesxferred.value,
+                        timestamp)
+        return ok
+
+    def _transfer_error(self):
+        """
+        Gets the error for a failed transfer: SentechEndOfRecording when a
+            replayed recording ran out of frames, SentechError otherwise.
+        """
+        code = self.dll.StCam_GetLastError(self.handle)
+        if code == ERROR_HANDLE_EOF:
+            return SentechEndOfRecording(self.handle, self.dll, code)
+        return SentechError(self.handle, self.dll, code)
+
+    def _stamp(self, frame, frame_number, bytes_transferred, timestamp):
+        """
+        Sets the acquisition metadata of a transferred frame.
+        """
+        frame.frame_number = frame_number
+        frame.timestamp = timestamp
+        frame.bytes_transferred = bytes_transferred
+
+    def _hand_out(self, frame):
+        """
+        Finishes a frame that is about to be handed to the caller: counts the
+            frames skipped before it and runs auto exposure on it.
+        """
+        self._count_skipped(frame)
+        if self.auto_exposure is not None:
+            self.auto_exposure.update(frame)
+
+    def _count_skipped(self, frame):
+        """
+        Sets frame.skipped from the gap between its frame number and that of
+            the previous frame handed out, whether the frames in between were
+            never transferred or dropped from the capture queue.
         """
-        self.dll.StCam_TakeRawSnapShot(self.handle,
-                                       self.frame.buffer,
-                                       self.frame.bpi,
-                                       byref(self._cbytesxferred),
-                                       byref(self._cframeno),
-                                       c_ulong(timeout_ms))
+        frame.skipped = self._frame_gap(frame.frame_number)
+
+    def _frame_gap(self, frame_number):
+        """
+        Gets the number of frames skipped since the previous frame handed out
+            and adds them to frames_skipped.  Frames without a frame number
+            count as no gap.
+        """
+        if frame_number is None:
+            return 0
+        last = self._last_frame_number
+        if last is None or frame_number <= last:
+            skipped = 0  # first frame, or the counter restarted
+        else:
+            skipped = frame_number - last - 1
+        self._last_frame_number = frame_number
+        self.frames_skipped += skipped
+        return skipped
         
-    def grab_frame(self, timeout_ms=1000):
+    def grab_frame(self, timeout_ms=1000, out=None):
         """ Acquires an image from the camera into the frame buffer and
                 returns the SentechFrame object.
+
+            If buffers have been allocated with allocate_buffers, the next free
+                buffer is filled instead, and the caller must release the
+                frame when it is done with it.
+
+            With out, the DLL transfers straight into the caller's memory
+                instead: a numpy array, a shared memory block, an mmap or any
+                other writable buffer of at least image_size bytes.  The
+                returned frame is a view of it, and keeps it exported until
+                the frame is deleted.
                 
         Args:
             timeout_ms (Optional[int]): timeout for buffer transfer in milliseconds
+            out (Optional[object]): writable buffer-protocol object to
+                transfer into
             
         Returns:
             _SentechFrame: the frame object
+
+        Raises:
+            RuntimeError: background capture or streaming is running
+            SentechBufferError: every pooled buffer is still held
+            SentechError: the transfer failed or timed out.  On any error a
+                pooled buffer goes straight back to the pool.
+            SentechEndOfRecording: a replayed recording has no more frames
                 
         """
-        self._snapshot(timeout_ms)
-        return self.frame
+        if self.capturing:
+            raise RuntimeError("Stop capture before grabbing frames directly, "
+                               "or use get_frame.")
+        if out is not None:
+            frame = _SentechFrame(buffer=out, **self._frame_layout())
+        elif self._pool is None:
+            frame = self.frame
+        else:
+            frame = self._pool.acquire(timeout=0)
+        try:
+            if not self._snapshot(timeout_ms, frame):
+                raise self._transfer_error()
+            self._hand_out(frame)
+        except Exception:
+            frame.release()
+            raise
+        return frame
+
+    def grab_frames(self, n, out=None, timeout_ms=1000):
+        """ Acquires n consecutive images straight into one stacked numpy
+                array, one slice per frame, without per-frame frame objects
+                or copies.
+
+            >>> images, frame_numbers = cam.grab_frames(100)
+            >>> mean = images.mean(axis=0)
+
+        Args:
+            n (int): number of frames
+            out (Optional[ndarray]): uint8 array of shape
+                (n, height, width[, channels]) to transfer into, e.g. from a
+                previous call.  Each frame's slice must have the frame
+                buffer's layout, rows padded the same way.  A new array is
+                allocated if None.
+            timeout_ms (Optional[int]): timeout for each buffer transfer in
+                milliseconds
+
+        Returns:
+            tuple: (images, frame numbers), both with n entries
+
+        Raises:
+            RuntimeError: background capture or streaming is running
+            SentechError: a transfer failed or timed out
+            SentechEndOfRecording: a replayed recording has no more frames
+        """
+        if self.capturing:
+            raise RuntimeError("Stop capture before grabbing frames directly, "
+                               "or use get_frame.")
+        import numpy as np
+        from .frame import image_layout
+        frame = self.frame
+        bpi = frame.bpi
+        shape, strides = image_layout(frame.width, frame.height, frame.bpp,
+                                      frame.stride)
+        if out is None:
+            out = np.ndarray(buffer=np.empty(n * bpi, dtype=np.uint8),
+                             dtype=np.uint8,
+                             shape=(n,) + shape,
+                             strides=(bpi,) + strides)
+        elif (out.dtype != np.uint8 or out.shape != (n,) + shape or
+              out.strides[1:] != strides or not out.flags.writeable):
+            raise ValueError("out must be a writable uint8 array of shape {} "
+                             "with frame strides {}".format((n,) + shape,
+                                                            strides))
+        frame_numbers = np.empty(n, dtype=np.int64)
+        step = out.strides[0]
+        base = out.ctypes.data
+        buffers = [cast(base + i * step, POINTER(c_byte)) for i in range(n)]
+        for i, buffer in enumerate(buffers):
+            ok, _ = self._transfer(buffer, bpi, timeout_ms)
+            if not ok:
+                raise self._transfer_error()
+            frame_numbers[i] = self._cframeno.value
+            self._frame_gap(frame_numbers[i])
+        return out, frame_numbers
+
+    def start_capture(self, queue_size=4, policy="drop_oldest",
+                      timeout_ms=1000):
+        """ Starts a background thread that grabs frames continuously into a
+                bounded queue.  Use get_frame to take frames out of it, and
+                release each one when you are done with it.
+
+            The thread fills a pool of its own, large enough to fill the
+                queue, keep one transfer in flight and leave one frame with
+                the consumer.  grab_frame's buffers are left as they are.
+
+        Args:
+            queue_size (Optional[int]): maximum number of queued frames
+            policy (Optional[str]): what to do when the queue is full:
+                "block", "drop_oldest" or "drop_newest"
+            timeout_ms (Optional[int]): timeout for each buffer transfer in
+                milliseconds
+        """
+        if self.capturing:
+            raise RuntimeError("Capture is already running.")
+        queue = FrameQueue(queue_size, policy)
+        pool = _FramePool(queue_size + 2, **self._frame_layout())
+        if self._queue is not None:
+            self._queue.clear()
+        self._queue = queue
+        self._capture = _CaptureThread(self, queue, timeout_ms, pool)
+        self._capture.start()
+
+    def stop_capture(self):
+        """ Stops the background capture thread, or the continuous transfer
+                started by start_streaming.  Frames that are already queued
+                can still be taken with get_frame.
+        """
+        if self._capture is not None:
+            self._capture.stop()
+
+    @property
+    def capturing(self):
+        """ Whether background capture or streaming is running. """
+        return self._capture is not None and self._capture.is_alive()
+
+    def start_streaming(self, queue_size=4, policy="drop_oldest"):
+        """ Starts the camera's continuous transfer.  The driver delivers
+                every frame the sensor produces to a callback, which copies
+                it into the buffer pool and queues it, so there is no
+                per-frame request like grab_frame's.  Use get_frame to take
+                frames out of the queue, and release each one when you are
+                done with it.
+
+            Frames that arrive while every buffer is held or the queue is
+                full are dropped and counted in capture_stats.  Like
+                start_capture, streaming fills a pool of its own.
+
+        Args:
+            queue_size (Optional[int]): maximum number of queued frames
+            policy (Optional[str]): what to do when the queue is full:
+                "drop_oldest" or "drop_newest"
+        """
+        if self.capturing:
+            raise RuntimeError("Capture is already running.")
+        queue = FrameQueue(queue_size, policy)
+        pool = _FramePool(queue_size + 2, **self._frame_layout())
+        stream = _TransferCallback(self, queue, pool)
+        if self._queue is not None:
+            self._queue.clear()
+        self._queue = queue
+        self._capture = stream
+        stream.start()
+
+    def stop_streaming(self):
+        """ Stops the continuous transfer.  Frames that are already queued can
+                still be taken with get_frame.
+        """
+        if self.streaming:
+            self._capture.stop()
+
+    @property
+    def streaming(self):
+        """ Whether the continuous transfer is running. """
+        return isinstance(self._capture, _TransferCallback) and self.capturing
+
+    def set_trigger(self, mode="free_run", pulse_exposure=False):
+        """ Sets how frames are started.
+
+        Args:
+            mode (Optional[str]): "free_run" for a free-running sensor,
+                "software" to expose a frame on every software_trigger()
+                call, or "hardware" to expose on the trigger input
+            pulse_exposure (Optional[bool]): in the trigger modes, expose for
+                as long as the trigger is active instead of for the exposure
+                time
+        """
+        self.StCam_SetTriggerMode(self._trigger_flags(mode, pulse_exposure))
+
+    def _trigger_flags(self, mode, pulse_exposure=False):
+        """ Gets the StCam_SetTriggerMode flags for a trigger mode. """
+        dll = self.dll
+        if mode == "free_run":
+            value = dll.STCAM_TRIGGER_MODE_TYPE_FREE_RUN
+        elif mode == "software":
+            value = (dll.STCAM_TRIGGER_MODE_TYPE_TRIGGER |
+                     dll.STCAM_TRIGGER_MODE_SOURCE_NONE)
+        elif mode == "hardware":
+            value = (dll.STCAM_TRIGGER_MODE_TYPE_TRIGGER |
+                     dll.STCAM_TRIGGER_MODE_SOURCE_HARDWARE)
+        else:
+            raise KeyError("Invalid trigger mode, try: {}".format(TRIGGER_MODES))
+        if pulse_exposure and mode != "free_run":
+            value |= dll.STCAM_TRIGGER_MODE_EXPTIME_PULSE
+        return value
+
+    @property
+    def trigger_mode(self):
+        """ Gets the current trigger mode, one of TRIGGER_MODES. """
+        cmode = c_ulong()
+        self.StCam_GetTriggerMode(cmode)
+        dll = self.dll
+        if (cmode.value & dll.STCAM_TRIGGER_MODE_TYPE_MASK ==
+                dll.STCAM_TRIGGER_MODE_TYPE_FREE_RUN):
+            return "free_run"
+        if (cmode.value & dll.STCAM_TRIGGER_MODE_SOURCE_MASK ==
+                dll.STCAM_TRIGGER_MODE_SOURCE_HARDWARE):
+            return "hardware"
+        return "software"
+
+    def software_trigger(self):
+        """ Triggers one frame in "software" trigger mode. """
+        self.StCam_SoftTrigger()
+
+    def get_frame(self, timeout=None):
+        """ Takes the oldest frame from the background capture queue.
+
+        Args:
+            timeout (Optional[float]): seconds to wait for a frame.  None
+                waits forever.
+
+        Returns:
+            _SentechFrame: the frame, or None if the wait timed out
+        """
+        if self._queue is None:
+            raise RuntimeError("Capture hasn't been started.")
+        frame = self._queue.get(timeout)
+        if frame is not None:
+            self._hand_out(frame)
+        return frame
+
+    @property
+    def capture_stats(self):
+        """ Counters for the background capture thread. """
+        if self._capture is None:
+            return {}
+        return {"captured": self._capture.frames_captured,
+                "dropped": self._queue.dropped,
+                "skipped": self.frames_skipped,
+                "timeouts": self._capture.timeouts,
+                "errors": self._capture.errors,
+                "queued": len(self._queue)}
+
+    def record(self, path, **kwargs):
+        """ Starts recording frames to disk on a writer thread.  Capture
+                never waits for the disk; frames are dropped and counted if
+                the writer falls behind.  Each frame's number, host timestamp
+                and size are logged to a .csv index next to path.
+
+            >>> with cam.record("session.raw") as recorder:
+            ...     time.sleep(60)
+
+        Args:
+            path (str): output path
+            **kwargs: passed to pysentech.recorder.Recorder
+
+        Returns:
+            Recorder: the running recorder.  Call stop() when you are done.
+        """
+        from .recorder import Recorder
+        return Recorder(self, path, **kwargs).start()
+
+    def _async_capture(self):
+        """ Gets the camera's AsyncCapture, creating it on first use. """
+        if self._aio is None:
+            if self.capturing:
+                raise RuntimeError("Stop the capture thread before using the "
+                                   "async API.")
+            from .aio import AsyncCapture  # python 3.5+ only
+            self._aio = AsyncCapture(self)
+        return self._aio
+
+    def grab_frame_async(self, timeout_ms=1000):
+        """ Awaitable version of grab_frame that doesn't block the event
+                loop.  Frames come from the async worker's own buffer pool,
+                so release each one when you are done with it.
+
+        Args:
+            timeout_ms (Optional[int]): timeout for buffer transfer in milliseconds
+
+        Returns:
+            coroutine: resolves to a _SentechFrame
+        """
+        return self._async_capture().grab_frame(timeout_ms)
+
+    def stream(self, prefetch=2, timeout_ms=1000):
+        """ Returns an async iterator over frames:
+
+            >>> async for frame in cam.stream():
+            ...     process(frame.as_numpy())
+
+            Each frame is released automatically when the next one is
+                requested.
+
+        Args:
+            prefetch (Optional[int]): transfers to keep queued ahead of the
+                consumer
+            timeout_ms (Optional[int]): timeout for buffer transfer in milliseconds
+        """
+        return self._async_capture().stream(prefetch, timeout_ms)
+
+    def release_async(self):
+        """ Awaitable version of release.  Cancels pending async requests and
+                waits for the transfer in progress without blocking the event
+                loop, then closes the camera.
+        """
+        return self._async_capture().aclose(release_camera=True)
 
     def release(self):
         """ Releases the camera and frees frame buffer. """
         try:
+            if self._aio is not None:
+                self._aio.close()
+                self._aio = None
+            self.stop_capture()
+            self._pool = None
             del self.frame
             self.StCam_Close()
         except AttributeError:
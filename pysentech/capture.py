@@ -0,0 +1,240 @@
+"""
+capture.py
+
+Background acquisition for Sentech cameras, into a bounded FrameQueue.  Either
+    a capture thread keeps calling StCam_TakeRawSnapShot (ctypes releases the
+    GIL for the duration of the call), or the SDK runs a continuous transfer
+    and hands every frame to a raw data callback.
+"""
+import threading
+import time
+from collections import deque
+from ctypes import c_ulong, memmove
+
+from .error import SentechBufferError
+from .sentechdll import RawCallback
+
+# What to do with a new frame when the queue is full
+POLICIES = (
+    "block",        # wait for the consumer to take a frame
+    "drop_oldest",  # discard the oldest queued frame
+    "drop_newest",  # discard the new frame
+)
+
+
+class FrameQueue(object):
+    """
+    A bounded FIFO of frames with a selectable overflow policy.  Dropped frames
+        are released back to their buffer pool.
+
+    args:
+        maxsize (int): maximum number of queued frames
+        policy (Optional[str]): overflow policy, one of POLICIES
+    """
+    def __init__(self, maxsize, policy="drop_oldest"):
+        if maxsize < 1:
+            raise ValueError("Queue size must be at least 1.")
+        if policy not in POLICIES:
+            raise ValueError("Invalid overflow policy, try: {}".format(POLICIES))
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._frames = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, frame, timeout=None):
+        """ Adds a frame to the queue, applying the overflow policy if it is
+                full.
+
+        args:
+            frame (_SentechFrame): a filled frame
+            timeout (Optional[float]): seconds to wait for space with the
+                "block" policy.  None waits forever.
+
+        returns:
+            bool: True if the frame was queued.  False means it was dropped
+                or, with the "block" policy, that the wait timed out and the
+                frame still belongs to the caller.
+        """
+        with self._cond:
+            if len(self._frames) >= self.maxsize:
+                if self.policy == "drop_newest":
+                    self.dropped += 1
+                    frame.release()
+                    return False
+                elif self.policy == "drop_oldest":
+                    self.dropped += 1
+                    self._frames.popleft().release()
+                elif not self._cond.wait_for(
+                        lambda: len(self._frames) < self.maxsize, timeout):
+                    return False
+            self._frames.append(frame)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """ Takes the oldest frame out of the queue.
+
+        args:
+            timeout (Optional[float]): seconds to wait for a frame.  None waits
+                forever.
+
+        returns:
+            _SentechFrame: the frame, or None if the wait timed out
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames, timeout):
+                return None
+            frame = self._frames.popleft()
+            self._cond.notify_all()
+            return frame
+
+    def drop(self):
+        """ Counts a frame that was dropped before it reached the queue. """
+        with self._cond:
+            self.dropped += 1
+
+    def clear(self):
+        """ Releases every queued frame. """
+        with self._cond:
+            while self._frames:
+                self._frames.popleft().release()
+            self._cond.notify_all()
+
+
+class _CaptureThread(threading.Thread):
+    """
+    Loops on the camera's snapshot transfer, filling frames from a buffer
+        pool and pushing them into a FrameQueue.
+
+    args:
+        camera (SentechCamera): camera to grab from
+        queue (FrameQueue): destination for filled frames
+        timeout_ms (int): timeout for each buffer transfer in milliseconds
+        pool (_FramePool): buffers to fill, owned by the thread
+    """
+    # how often (seconds) blocked waits check whether we've been stopped
+    poll_interval = 0.1
+
+    def __init__(self, camera, queue, timeout_ms, pool):
+        super(_CaptureThread, self).__init__(name="SentechCapture")
+        self.daemon = True
+        self.camera = camera
+        self.queue = queue
+        self.timeout_ms = timeout_ms
+        self.pool = pool
+        self.frames_captured = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                frame = self.pool.acquire(timeout=self.poll_interval)
+            except SentechBufferError:
+                continue  # consumer is holding every buffer
+            try:
+                ok = self.camera._snapshot(self.timeout_ms, frame)
+            except Exception:
+                self.errors += 1
+                frame.release()
+                continue
+            if not ok:
+                self.timeouts += 1
+                frame.release()
+                continue
+            self.frames_captured += 1
+            while not self.queue.put(frame, timeout=self.poll_interval):
+                if self.queue.policy != "block":
+                    break  # dropped
+                if self._stop_event.is_set():
+                    frame.release()
+                    break
+
+    def stop(self):
+        """ Stops the thread and waits for the current transfer to finish. """
+        self._stop_event.set()
+        self.join()
+
+
+class _TransferCallback(object):
+    """
+    Receives the frames of the SDK's continuous transfer through a raw data
+        callback, copying each one into a frame from a buffer pool and
+        pushing it into a FrameQueue.
+
+    The callback runs on the driver's thread, so it never waits: if no buffer
+        is free or the queue is full, the frame is dropped.
+
+    args:
+        camera (SentechCamera): camera to stream from
+        queue (FrameQueue): destination for filled frames.  Its policy can't
+            be "block".
+        pool (_FramePool): buffers to fill, owned by the stream
+    """
+    timeouts = 0  # transfers aren't requested, so they can't time out
+
+    def __init__(self, camera, queue, pool):
+        if queue.policy == "block":
+            raise ValueError("Streaming can't block the driver's thread, use "
+                             "'drop_oldest' or 'drop_newest'.")
+        self.camera = camera
+        self.queue = queue
+        self.pool = pool
+        self.frames_captured = 0
+        self.errors = 0
+        self._callback = RawCallback(self._on_frame)  # must outlive transfer
+        self._callback_no = c_ulong()
+        self._active = False
+
+    def start(self):
+        """ Registers the callback and starts the continuous transfer. """
+        cam = self.camera
+        cam.StCam_AddRawCallback(self._callback, None, self._callback_no)
+        try:
+            cam.StCam_StartTransfer()
+        except Exception:
+            cam.StCam_RemoveRawCallback(self._callback_no.value)
+            raise
+        self._active = True
+
+    def _on_frame(self, data, size, width, height, frame_no, pixel_format,
+                  context, reserved):
+        timestamp = time.perf_counter()
+        try:
+            frame = self.pool.acquire(timeout=0)
+        except SentechBufferError:
+            self.queue.drop()  # consumer is holding every buffer
+            return
+        try:
+            size = min(size, frame.bpi)
+            memmove(frame.buffer, data, size)
+        except Exception:
+            self.errors += 1
+            frame.release()
+            return
+        self.camera._stamp(frame, frame_no, size, timestamp)
+        stats = self.camera.stats
+        if stats is not None:
+            stats.observe("callback", time.perf_counter() - timestamp)
+            stats.frame(timestamp)
+        self.frames_captured += 1
+        self.queue.put(frame)
+
+    def is_alive(self):
+        return self._active
+
+    def stop(self):
+        """ Stops the transfer and unregisters the callback. """
+        if not self._active:
+            return
+        self._active = False
+        cam = self.camera
+        try:
+            cam.StCam_StopTransfer()
+        finally:
+            cam.StCam_RemoveRawCallback(self._callback_no.value)
@@ -0,0 +1,186 @@
+"""
+config.py
+
+Batched settings changes.  Setting camera properties one at a time costs
+    round trips for each, and every geometry or pixel format change rebuilds
+    the frame buffers.  A configuration collects changes and applies them
+    together when its with block exits:
+
+    >>> with cam.configure() as cfg:
+    ...     cfg.pixel_format = "Mono8"
+    ...     cfg.image_shape = (640, 480)
+    ...     cfg.exposure = 0.005
+    ...     cfg.gain = 20
+
+Settings are sent in the order the camera needs them: pixel format, then
+    the window (scan mode, offsets and shape together in one call), then
+    exposure, whose clock depends on the line time of the new window, then
+    gain, gamma mode before the gamma value, and trigger mode.  The pixel
+    format and window are compared with the cached ones and only sent if
+    they differ.  The other settings are written whenever they are set,
+    since reading one back to compare costs as much as writing it.  Buffers
+    are reallocated once at the end, and only if the frame layout changed.
+"""
+from collections import OrderedDict
+from ctypes import c_ulong
+
+from .camera import PIXEL_FORMATS, SCAN_MODES, TRIGGER_MODES, WINDOW_SCAN_MODES
+from .camera import GAMMA_MODES
+
+
+class CameraConfiguration(object):
+    """
+    Settings changes for a camera, applied together by apply() or at the end
+        of a with block.  Reading a setting returns the pending value, or the
+        camera's current one.
+
+    args:
+        camera (SentechCamera): camera to configure
+    """
+    # settings that can be configured, in the order they are applied
+    SETTINGS = ("pixel_format", "scan_mode", "image_offsets", "image_shape",
+                "exposure", "exposure_clock", "gain", "gamma_mode", "gamma",
+                "trigger_mode")
+
+    def __init__(self, camera):
+        object.__setattr__(self, "camera", camera)
+        object.__setattr__(self, "changes", OrderedDict())
+
+    def __setattr__(self, name, value):
+        if name not in self.SETTINGS:
+            raise AttributeError("Can't configure {}, try: {}".format(
+                name, self.SETTINGS))
+        self.changes[name] = value
+
+    def __getattr__(self, name):
+        if name not in self.SETTINGS:
+            raise AttributeError(name)
+        try:
+            return self.changes[name]
+        except KeyError:
+            if name == "exposure_clock":
+                cexposure = c_ulong()
+                self.camera.StCam_GetExposureClock(cexposure)
+                return cexposure.value
+            return getattr(self.camera, name)
+
+    def update(self, **settings):
+        """ Sets several settings at once.  Returns the configuration. """
+        for name, value in settings.items():
+            setattr(self, name, value)
+        return self
+
+    def _validate(self):
+        changes = self.changes
+        if ("pixel_format" in changes and
+                changes["pixel_format"] not in PIXEL_FORMATS.values()):
+            raise KeyError("Invalid pixel format, try: {}".format(
+                PIXEL_FORMATS.values()))
+        if "scan_mode" in changes and changes["scan_mode"] not in SCAN_MODES:
+            raise KeyError("Invalid scan mode, try: {}".format(
+                list(SCAN_MODES)))
+        if "exposure" in changes and "exposure_clock" in changes:
+            raise ValueError("Set either exposure or exposure_clock.")
+        mode = changes.get("gamma_mode")
+        if (mode is not None and not isinstance(mode, int) and
+                mode not in GAMMA_MODES):
+            raise KeyError("Invalid gamma mode, try: {}".format(
+                list(GAMMA_MODES)))
+        mode = changes.get("trigger_mode")
+        if (mode is not None and not isinstance(mode, int) and
+                mode not in TRIGGER_MODES):
+            raise KeyError("Invalid trigger mode, try: {} or StCam_SetTrigger"
+                           "Mode flags".format(TRIGGER_MODES))
+
+    def _geometry(self, current):
+        """ Gets the (scan mode, offset x, offset y, width, height) to apply.
+        """
+        changes = self.changes
+        mode, offsetx, offsety, width, height = current
+        window = (tuple(changes.get("image_offsets", (offsetx, offsety))) +
+                  tuple(changes.get("image_shape", (width, height))))
+        if "scan_mode" in changes:
+            mode = SCAN_MODES[changes["scan_mode"]]
+        elif window != current[1:]:
+            # a new window needs a mode that takes one
+            if mode not in [SCAN_MODES[m] for m in WINDOW_SCAN_MODES]:
+                mode = SCAN_MODES["roi"]
+        return (mode,) + window
+
+    def apply(self):
+        """ Sends the pending changes to the camera.
+
+        Everything is validated before the first call.  If a call fails, the
+            pixel format and window are put back the way they were, and the
+            error is raised.
+
+        raises:
+            KeyError: invalid pixel format, scan mode, gamma mode or trigger
+                mode
+            ValueError: both exposure and exposure_clock were set
+            RuntimeError: the camera is capturing
+            SentechError: the camera rejected a setting
+        """
+        cam = self.camera
+        changes = self.changes
+        if not changes:
+            return
+        if cam.capturing:
+            raise RuntimeError("Stop capture before reconfiguring.")
+        self._validate()
+        codes = dict((v, k) for k, v in PIXEL_FORMATS.items())
+        old_format = cam.pixel_format
+        old_geometry = cam._geometry
+        pixel_format = changes.get("pixel_format", old_format)
+        geometry = self._geometry(old_geometry)
+
+        applied = []
+        try:
+            if pixel_format != old_format:
+                applied.append("pixel_format")
+                cam.StCam_SetPreviewPixelFormat(codes[pixel_format])
+            if geometry != old_geometry:
+                applied.append("geometry")
+                cam.StCam_SetImageSize(0, *geometry)
+            if "exposure" in changes:
+                cexposure = c_ulong()
+                cam.StCam_GetExposureClockFromTime(changes["exposure"],
+                                                   cexposure)
+                cam.StCam_SetExposureClock(cexposure.value)
+            if "exposure_clock" in changes:
+                cam.StCam_SetExposureClock(changes["exposure_clock"])
+            if "gain" in changes:
+                cam.StCam_SetGain(max(changes["gain"], 0))
+            if "gamma_mode" in changes:
+                cam.gamma_mode = changes["gamma_mode"]
+            if "gamma" in changes:
+                cam.StCam_SetCameraGammaValue(changes["gamma"])
+            if "trigger_mode" in changes:
+                mode = changes["trigger_mode"]
+                if mode in TRIGGER_MODES:
+                    mode = cam._trigger_flags(mode)
+                cam.StCam_SetTriggerMode(mode)
+        except Exception:
+            # roll back what we know the old values of
+            try:
+                if "geometry" in applied:
+                    cam.StCam_SetImageSize(0, *old_geometry)
+                if "pixel_format" in applied:
+                    cam.StCam_SetPreviewPixelFormat(codes[old_format])
+            except Exception:
+                pass  # the original error is more useful
+            raise
+        finally:
+            if applied:
+                cam.refresh_settings()
+                if "geometry" in applied:
+                    cam._roi = None
+                cam._update_frame()
+            changes.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.apply()
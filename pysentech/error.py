@@ -7,11 +7,27 @@ Created on Wed Dec 09 00:58:13 2015
 
 #TODO: Get error messages from StCamMsg.dll
 
+# Last error code of a replayed recording that has no more frames
+ERROR_HANDLE_EOF = 38
+
 class SentechError(Exception):
-    def __init__(self, cam_handle, dll):
-        code = dll.StCam_GetLastError(cam_handle)
+    def __init__(self, cam_handle, dll, code=None):
+        if code is None:
+            code = dll.StCam_GetLastError(cam_handle)
+        self.code = code
         message = "error code {}".format(code)
         super(SentechError, self).__init__(message)
 
+class SentechEndOfRecording(SentechError, EOFError):
+    """
+    Raised by grab_frame, grab_frames and grab_frame_async when a replayed
+        recording (backend="replay" with loop=False) has served its last
+        frame.  It is also an EOFError, so it can be caught as either.
+    """
+    pass
+
 class SentechSystemError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class SentechBufferError(Exception):
+    pass
@@ -0,0 +1,84 @@
+"""
+exposure.py
+
+Exposure clock <-> seconds conversion without driver round trips.
+
+The camera sets exposure in clocks whose length depends on the window, scan
+    mode and clock mode.  An ExposureTable samples the driver's conversion once
+    for the current settings and interpolates between the samples afterwards.
+    cam.exposure_table keeps one in the settings cache, so it is rebuilt after
+    anything that calls refresh_settings().
+"""
+from bisect import bisect_left
+from ctypes import c_float, c_ulong
+
+
+class ExposureTable(object):
+    """
+    Piecewise linear map between exposure clocks and seconds.
+
+    args:
+        clocks (list): sampled clocks, increasing
+        seconds (list): exposure time of each clock in seconds
+    """
+    def __init__(self, clocks, seconds):
+        if len(clocks) != len(seconds) or not clocks:
+            raise ValueError("Need the same number of clocks and times.")
+        self.clocks = list(clocks)
+        self.seconds = list(seconds)
+
+    @classmethod
+    def from_camera(cls, camera):
+        """ Samples a camera's conversion at clock 0, every power of two and
+                the maximum clock: dense for short exposures, where the
+                driver's offsets matter most, and about 18 calls in all.
+        """
+        cmax = c_ulong()
+        camera.StCam_GetMaxLongExposureClock(cmax)
+        max_clock = cmax.value
+        clocks = [0]
+        clock = 1
+        while clock < max_clock:
+            clocks.append(clock)
+            clock *= 2
+        if max_clock:
+            clocks.append(max_clock)
+        cseconds = c_float()
+        seconds = []
+        for clock in clocks:
+            camera.StCam_GetExposureTimeFromClock(clock, cseconds)
+            seconds.append(cseconds.value)
+        return cls(clocks, seconds)
+
+    @property
+    def max_clock(self):
+        return self.clocks[-1]
+
+    @property
+    def max_seconds(self):
+        return self.seconds[-1]
+
+    @staticmethod
+    def _interpolate(x, xs, ys):
+        """ Interpolates y at x, clamped to the sampled range. """
+        if x <= xs[0]:
+            return ys[0]
+        if x >= xs[-1]:
+            return ys[-1]
+        i = bisect_left(xs, x)
+        x0, x1 = xs[i - 1], xs[i]
+        y0, y1 = ys[i - 1], ys[i]
+        if x1 == x0:
+            return y1
+        return y0 + (y1 - y0) * (x - x0) / float(x1 - x0)
+
+    def to_seconds(self, clock):
+        """ Gets the exposure time of a clock value in seconds. """
+        return self._interpolate(clock, self.clocks, self.seconds)
+
+    def to_clock(self, seconds):
+        """ Gets the nearest clock value for an exposure time, clamped to the
+                camera's range.
+        """
+        return int(round(self._interpolate(seconds, self.seconds,
+                                           self.clocks)))
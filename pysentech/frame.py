@@ -6,15 +6,12 @@ Created on Mon Jan 11 23:18:42 2016
 """
 
 from ctypes import *
-import ctypes
-import os
+import threading
+import time
+from collections import deque
+from functools import wraps
 
-if 'nt' in os.name:
-    #windows
-    malloc = ctypes.cdll.msvcrt.malloc
-    free = ctypes.cdll.msvcrt.free
-else:
-    raise NotImplementedError("Only Windows supported right now.  Come back later.")
+from .error import SentechBufferError
 
 import warnings
 
@@ -38,15 +35,72 @@ BPP = {
 # PIL Pixel types
 PIL_FORMATS = {
     "Mono8": "L",
-    "BGR24": "RGB",  #TODO: figure out how to fix PIL colors
-    "BGR32": "RGBA",
+    "BGR24": "RGB",
+    "BGR32": "RGB",
 }
 
+# PIL raw decoder modes, which swap the driver's BGR order to RGB
+PIL_RAWMODES = {
+    "Mono8": "L",
+    "BGR24": "BGR",
+    "BGR32": "BGRX",
+}
+
+def image_layout(width, height, bpp, stride):
+    """ Gets the numpy shape and strides of an image buffer.
+
+    args:
+        width (int): image width in pixels
+        height (int): image height in pixels
+        bpp (int): bytes per pixel
+        stride (int): bytes per row, including padding
+
+    returns:
+        tuple: (shape, strides).  Color images have a channel axis.
+    """
+    if bpp == 1:
+        return (height, width), (stride, 1)
+    return (height, width, bpp), (stride, bpp, 1)
+
+
+def _timed(stage):
+    """ Records a frame method's duration as a stage of its camera's stats,
+            when they are enabled.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            stats = self.camera.stats
+            if stats is None:
+                return method(self, *args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                stats.observe(stage, time.perf_counter() - t0)
+        return wrapper
+    return decorator
+
+
 class _SentechFrame(object):
     """
     A frame from a Sentech camera.  Contains an image buffer and methods to
         convert it easily into ndarrays and PIL images, etc.
 
+    Every transfer into the frame sets its acquisition metadata (skipped is
+        set when the frame is handed out):
+
+        frame_number (int): the camera's frame counter
+        timestamp (float): host time.perf_counter() when the transfer
+            completed
+        bytes_transferred (int): size of the transfer
+        skipped (int): frames missed since the previous frame the camera
+            handed out, from the gap in frame numbers.  They were either
+            never transferred or dropped from the capture queue.
+
+    args:
+        buffer (Optional[object]): writable buffer-protocol object of at least
+            bpi bytes to use as the image buffer instead of allocating one
     """
     def __init__(self,
                  width,
@@ -54,52 +108,125 @@ class _SentechFrame(object):
                  bpi,
                  camera,  # annoying that this needs to be here think of a better way
                  pixel_format="Mono8",
+                 pool=None,
+                 buffer=None,
                  ):
         self.width = width
         self.height = height
         self.pixel_format = pixel_format
         self.bpi = bpi
         self.bpp = BPP[self.pixel_format]
+        self.stride = self._row_stride()
         self.camera = camera
-        self._setup_buffer()
+        self.pool = pool
+        self._acquired = False
+        self._ndarray = None
+        # set by each transfer into this frame
+        self.frame_number = None
+        self.timestamp = None
+        self.bytes_transferred = None
+        self.skipped = None
+        self._setup_buffer(buffer)
+
+    def _row_stride(self):
+        """ Bytes per row.  The driver pads rows when the raw data size is
+                larger than width * height * bytes per pixel.  A surplus that
+                doesn't divide evenly into rows is trailing padding, and
+                leaves the rows unpadded.
+        """
+        row = self.width * self.bpp
+        if (self.height and self.bpi > row * self.height and
+                self.bpi % self.height == 0):
+            return self.bpi // self.height
+        return row
+
+    @property
+    def shape(self):
+        """ Shape of the numpy image: (height, width) or
+                (height, width, channels).
+        """
+        return image_layout(self.width, self.height, self.bpp, self.stride)[0]
         
-    def _setup_buffer(self):
-        """ Allocate memory for image """
-        # python 2
-        #self.imgpointer = malloc(self.bpi)
-        #self.buffer = cast(self.imgpointer, POINTER(c_byte))
-
-        # should work in python 2 and 3
-        self.buffer = cast(create_string_buffer(self.bpi), POINTER(c_byte))
+    def _setup_buffer(self, buffer=None):
+        """ Allocate memory for image, or wrap the caller's buffer """
+        # the array owns the memory, so views of it keep it alive
+        if buffer is None:
+            self._array = (c_ubyte * self.bpi)()
+        else:
+            # shares the caller's memory, and holds it until the frame goes
+            size = memoryview(buffer).nbytes
+            if size < self.bpi:
+                raise ValueError("Buffer is {} bytes, the frame needs {}".format(
+                    size, self.bpi))
+            self._array = (c_ubyte * self.bpi).from_buffer(buffer)
+        # cast the address, not the array: casting a ctypes object puts it in
+        #   a reference cycle, and then it is only freed by the garbage
+        #   collector, which also keeps the caller's buffer exported
+        self.buffer = cast(addressof(self._array), POINTER(c_byte))
         
     def _release_buffer(self):
         """ Release memory for image """
-        # python 2
-        # free(self.imgpointer)
-        del self.buffer
+        self.buffer = None  # may not exist if wrapping a buffer failed
+        self._array = None
+        self._ndarray = None
+
+    def release(self):
+        """ Returns the frame to the buffer pool it was acquired from.  Does
+                nothing for frames that don't belong to a pool.
+        """
+        if self.pool is not None:
+            self.pool.release(self)
         
     def as_array(self):
-        """ Returns a ctypes array of the proper shape. """
-        return (c_ubyte * int(self.height*self.bpi) *
-                int(self.width*self.bpi)).from_address(addressof(self.buffer.contents))
+        """ Returns the ctypes byte array holding the raw image. """
+        return self._array
         
+    @_timed("as_numpy")
     def as_numpy(self):
-        """ Returns numpy img. """
-        return np.ndarray(buffer=self.as_array(),
-                          dtype=np.uint8,
-                          shape=(self.height, self.width))
+        """ Returns numpy img.
+
+            The array is a view of the frame buffer, not a copy, so it changes
+                when a new image is transferred into this frame.  It is built
+                once and returned by every call.  Color images have shape
+                (height, width, channels) in BGR(X) order, and padded rows are
+                skipped using strides.
+        """
+        if self._ndarray is None:
+            shape, strides = image_layout(self.width, self.height, self.bpp,
+                                          self.stride)
+            self._ndarray = np.ndarray(buffer=self._array,
+                                       dtype=np.uint8,
+                                       shape=shape,
+                                       strides=strides)
+        return self._ndarray
         
         
+    @_timed("as_pil")
     def as_pil(self):
-        """ Returns PIL img. """
+        """ Returns PIL img.  Color images are RGB. """
         pformat = PIL_FORMATS[self.pixel_format]
+        # raw decoder args are: raw mode, bytes per row, orientation (1 is top
+        #   row first)
         return Image.frombuffer(pformat,
                                 (self.width, self.height), 
-                                self.as_array(),
+                                self._array,
                                 "raw",
-                                pformat,
-                                0, 1)  #TODO: what do these do?
+                                PIL_RAWMODES[self.pixel_format],
+                                self.stride, 1)
 
+    @_timed("demosaic")
+    def demosaic(self, method="bilinear", order="BGR"):
+        """ Returns a color numpy img reconstructed from raw Bayer data.  The
+                camera has to be transferring raw "Mono8" frames from a color
+                sensor.  See pysentech.color.demosaic.
+        """
+        from .color import demosaic
+        pattern = self.camera.color_array
+        if self.pixel_format != "Mono8" or pattern == "Mono":
+            raise ValueError("Frame isn't raw Bayer data.")
+        return demosaic(self.as_numpy(), pattern, method, order)
+
+    @_timed("to_file")
     def to_file(self, path):
         """ Saves an image to a file. 
 
@@ -120,3 +247,63 @@ class _SentechFrame(object):
         
     def __del__(self):
         self._release_buffer()
+
+
+class _FramePool(object):
+    """
+    A fixed set of preallocated frames that are filled in turn.  A frame is
+        acquired before a transfer and released by the consumer once it is done
+        with it, so several frames can be held at once without copying and
+        nothing is allocated per frame.
+
+    args:
+        count (int): number of frame buffers
+        **frame_kwargs: passed to each _SentechFrame
+    """
+    def __init__(self, count, **frame_kwargs):
+        if count < 1:
+            raise ValueError("Buffer count must be at least 1.")
+        self.frames = [_SentechFrame(pool=self, **frame_kwargs)
+                       for _ in range(count)]
+        self._free = deque(self.frames)
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def available(self):
+        """ Number of frames that are not currently acquired. """
+        return len(self._free)
+
+    def acquire(self, timeout=None):
+        """ Takes the next free frame out of the pool.
+
+        args:
+            timeout (Optional[float]): seconds to wait for a frame to be
+                released.  None waits forever, 0 doesn't wait at all.
+
+        returns:
+            _SentechFrame: a frame that belongs to the caller until released
+        """
+        with self._cond:
+            if not self._free:
+                if timeout == 0 or not self._cond.wait_for(lambda: self._free,
+                                                           timeout):
+                    raise SentechBufferError("No free frame buffers.  Release "
+                                             "frames when you are done with them.")
+            frame = self._free.popleft()
+            frame._acquired = True
+            return frame
+
+    def release(self, frame):
+        """ Puts a frame back into the pool.  Releasing a frame twice is
+                harmless.
+        """
+        if frame.pool is not self:
+            raise ValueError("Frame doesn't belong to this pool.")
+        with self._cond:
+            if frame._acquired:
+                frame._acquired = False
+                self._free.append(frame)
+                self._cond.notify()
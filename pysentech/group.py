@@ -0,0 +1,148 @@
+"""
+group.py
+
+Synchronized acquisition from several Sentech cameras.  Each grab runs the
+    snapshot transfers for all cameras in parallel worker threads and returns
+    a FrameSet matched by frame counter and host timestamp.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FrameSet(object):
+    """
+    One frame from each camera in a group, grabbed together.
+
+    args:
+        frames (list): _SentechFrame for each camera
+        frame_numbers (list): frame counter reported by each camera
+        timestamps (list): host time.perf_counter() at the end of each
+            transfer
+        matched (bool): whether the frame counters line up across cameras
+    """
+    def __init__(self, frames, frame_numbers, timestamps, matched):
+        self.frames = frames
+        self.frame_numbers = frame_numbers
+        self.timestamps = timestamps
+        self.matched = matched
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    @property
+    def skew(self):
+        """ Seconds between the first and last transfer to complete. """
+        return max(self.timestamps) - min(self.timestamps)
+
+    def release(self):
+        """ Returns every frame to its camera's buffer pool. """
+        for frame in self.frames:
+            frame.release()
+
+
+class SentechCameraGroup(object):
+    """
+    A set of cameras that are grabbed from together.
+
+    Frame counters are matched relative to the first frameset (or the last call
+        to resync), so cameras that share a hardware trigger should report the
+        same relative frame number in every frameset.
+
+    args:
+        cameras (list): SentechCamera objects
+        max_skew (Optional[float]): seconds of timestamp skew above which a
+            frameset is not considered matched.  None only matches on frame
+            counters.
+        history (Optional[int]): number of framesets kept for skew statistics
+    """
+    def __init__(self, cameras, max_skew=None, history=1000):
+        self.cameras = list(cameras)
+        if not self.cameras:
+            raise ValueError("A camera group needs at least one camera.")
+        self.max_skew = max_skew
+        self._executor = ThreadPoolExecutor(max_workers=len(self.cameras))
+        self._base = None
+        self._skews = deque(maxlen=history)
+        self.framesets = 0
+        self.unmatched = 0
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def __getitem__(self, index):
+        return self.cameras[index]
+
+    def __iter__(self):
+        return iter(self.cameras)
+
+    def grab(self, timeout_ms=1000):
+        """ Grabs a frame from every camera in parallel.
+
+        args:
+            timeout_ms (Optional[int]): timeout for each buffer transfer in
+                milliseconds
+
+        returns:
+            FrameSet: the frames, in camera order
+
+        raises:
+            Exception: the first camera's error, if any grab failed.  The
+                frames the other cameras grabbed are released first.
+        """
+        futures = [self._executor.submit(cam.grab_frame, timeout_ms)
+                   for cam in self.cameras]
+        frames, errors = [], []
+        for future in futures:
+            try:
+                frames.append(future.result())
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            for frame in frames:
+                frame.release()
+            raise errors[0]
+        numbers = [frame.frame_number for frame in frames]
+        stamps = [frame.timestamp for frame in frames]
+
+        if self._base is None:
+            self._base = numbers
+        relative = set(n - b for n, b in zip(numbers, self._base))
+        frameset = FrameSet(frames, numbers, stamps, len(relative) == 1)
+        if self.max_skew is not None and frameset.skew > self.max_skew:
+            frameset.matched = False
+
+        self.framesets += 1
+        if not frameset.matched:
+            self.unmatched += 1
+        self._skews.append(frameset.skew)
+        return frameset
+
+    def resync(self):
+        """ Uses the next frameset as the reference for frame counters. """
+        self._base = None
+
+    @property
+    def skew_stats(self):
+        """ Timestamp skew statistics (seconds) over recent framesets. """
+        if not self._skews:
+            return {}
+        skews = sorted(self._skews)
+        return {"count": len(skews),
+                "mean": sum(skews) / len(skews),
+                "min": skews[0],
+                "max": skews[-1],
+                "p99": skews[min(len(skews) - 1, int(0.99 * len(skews)))],
+                "framesets": self.framesets,
+                "unmatched": self.unmatched}
+
+    def release(self):
+        """ Stops the worker threads and releases every camera. """
+        self._executor.shutdown()
+        for cam in self.cameras:
+            cam.release()
@@ -0,0 +1,133 @@
+"""
+profile.py
+
+Settings profiles: a camera's settings as a plain dict that can be saved as
+    JSON and applied to a camera again.
+
+    >>> profile = cam.get_profile()
+    >>> profile
+    {'scan_mode': 'roi', 'image_offsets': (0, 0), 'image_shape': (640, 480),
+     'pixel_format': 'Mono8', 'exposure_clock': 1203, 'gain': 20,
+     'gamma_mode': 'off', 'gamma': 100, 'trigger_mode': 0}
+    >>> cam.save_profile("cam0.json")
+    >>> cam.load_profile("cam0.json")  # later
+    {'gain': 20}
+
+A profile is read in one pass, one driver call per setting.  Applying one
+    diffs it against the live camera and writes only what changed, through
+    cam.configure(), so buffers are rebuilt at most once.
+
+Exposure is kept as the raw exposure clock, so it is restored exactly.
+    gamma_mode is a name from GAMMA_MODES, and trigger_mode holds the raw
+    StCam_SetTriggerMode flags.
+"""
+import json
+from ctypes import c_ulong, c_ushort
+
+from .camera import SCAN_MODES
+from .error import SentechError
+
+PROFILE_VERSION = 1
+
+# settings in a profile, in configure() names
+PROFILE_SETTINGS = ("scan_mode", "image_offsets", "image_shape",
+                    "pixel_format", "exposure_clock", "gain", "gamma_mode",
+                    "gamma", "trigger_mode")
+
+
+def read_profile(camera):
+    """ Reads a camera's settings.  Settings the camera doesn't support are
+            left out.
+
+    args:
+        camera (SentechCamera): camera to read
+
+    returns:
+        dict: the profile
+    """
+    # read the geometry and format fresh, and refresh the cache with them
+    geometry = camera._query_geometry()
+    pixel_format = camera._query_pixel_format()
+    camera._settings["geometry"] = geometry
+    camera._settings["pixel_format"] = pixel_format
+    mode, offsetx, offsety, width, height = geometry
+    names = dict((v, k) for k, v in SCAN_MODES.items())
+    profile = {"scan_mode": names.get(mode, mode),
+               "image_offsets": (offsetx, offsety),
+               "image_shape": (width, height),
+               "pixel_format": pixel_format}
+    optional = (("exposure_clock", "StCam_GetExposureClock", c_ulong),
+                ("gain", "StCam_GetGain", c_ushort),
+                ("gamma", "StCam_GetCameraGammaValue", c_ushort),
+                ("trigger_mode", "StCam_GetTriggerMode", c_ulong))
+    for key, function, ctype in optional:
+        value = ctype()
+        try:
+            getattr(camera, function)(value)
+        except (SentechError, AttributeError):
+            continue  # not supported by this camera or driver
+        profile[key] = value.value
+    try:
+        profile["gamma_mode"] = camera.gamma_mode
+    except (SentechError, AttributeError):
+        pass
+    return profile
+
+
+def diff_profile(profile, live):
+    """ Gets the settings in profile that differ from live.
+
+    returns:
+        dict: the differing settings, with profile's values
+    """
+    changes = {}
+    for key in PROFILE_SETTINGS:
+        if key not in profile:
+            continue
+        value = profile[key]
+        if isinstance(value, list):
+            value = tuple(value)  # from JSON
+        if live.get(key) != value:
+            changes[key] = value
+    return changes
+
+
+def apply_profile(camera, profile):
+    """ Writes the settings in profile that differ from the camera's.
+
+    returns:
+        dict: the settings that were changed
+    """
+    changes = diff_profile(profile, read_profile(camera))
+    camera.configure(**changes).apply()
+    return changes
+
+
+def save_profile(profile, path, **extra):
+    """ Saves a profile as JSON.
+
+    args:
+        profile (dict): the profile
+        path (str): file path
+        **extra: other things to store with it, like the camera model
+    """
+    data = dict(extra, version=PROFILE_VERSION, settings=profile)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load_profile(path):
+    """ Loads a profile saved with save_profile.
+
+    returns:
+        dict: the profile
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != PROFILE_VERSION:
+        raise IOError("Unsupported profile version: {}".format(
+            data.get("version")))
+    profile = {}
+    for key, value in data["settings"].items():
+        profile[key] = tuple(value) if isinstance(value, list) else value
+    return profile
@@ -0,0 +1,205 @@
+"""
+recorder.py
+
+Streaming recording for Sentech cameras.  The camera's capture thread grabs
+    frames into a bounded queue and a writer thread drains it to disk, so
+    capture never waits on disk I/O: if the writer falls behind, new frames
+    are dropped and counted instead.
+
+Every written frame gets a row in a CSV sidecar index with its frame number,
+    host timestamp, bytes transferred and the frames skipped before it.
+"""
+import csv
+import os
+import threading
+
+from .archive import ArchiveWriter
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Columns of the sidecar index
+INDEX_COLUMNS = ["index", "frame_number", "timestamp", "bytes_transferred",
+                 "skipped", "file", "offset"]
+
+
+class _RawChunkWriter(object):
+    """
+    Appends raw frame buffers to a series of raw archives (see
+        pysentech.archive), starting a new one whenever the current one would
+        grow past chunk_bytes.
+
+    args:
+        path (str): path of the recording.  Chunks are written next to it as
+            <name>.<chunk number>.raw
+        chunk_bytes (int): maximum size of a chunk file
+    """
+    def __init__(self, path, chunk_bytes):
+        self.base = os.path.splitext(path)[0]
+        self.chunk_bytes = chunk_bytes
+        self.chunk = -1
+        self._archive = None
+
+    def _next_chunk(self, frame):
+        self.close()
+        self.chunk += 1
+        path = "{}.{:04d}.raw".format(self.base, self.chunk)
+        self._archive = ArchiveWriter.for_frame(path, frame)
+
+    def write(self, frame):
+        """ Writes a frame's buffer.
+
+        returns:
+            tuple: (file name, byte offset) of the frame
+        """
+        archive = self._archive
+        if (archive is None or archive.bpi != frame.bpi or
+                archive.offset(archive.frame_count + 1) > self.chunk_bytes):
+            self._next_chunk(frame)
+            archive = self._archive
+        index = archive.write(frame)
+        return os.path.basename(archive.path), archive.offset(index)
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+
+class _VideoWriter(object):
+    """
+    Encodes frames into a video container with OpenCV.
+
+    args:
+        path (str): video file path
+        fps (float): frame rate stored in the container
+        fourcc (str): four character codec code
+    """
+    def __init__(self, path, fps, fourcc):
+        if cv2 is None:
+            raise ImportError("OpenCV is required to record video.  Use "
+                              "format='raw' instead.")
+        self.path = path
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self._writer = None
+        self._index = 0
+
+    def write(self, frame):
+        img = frame.as_numpy()
+        if frame.bpp == 4:
+            img = img[..., :3]
+        if self._writer is None:
+            self._writer = cv2.VideoWriter(self.path, self.fourcc, self.fps,
+                                           (frame.width, frame.height),
+                                           frame.bpp != 1)
+        self._writer.write(img)
+        self._index += 1
+        return os.path.basename(self.path), self._index - 1
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+
+class Recorder(object):
+    """
+    Records frames from a camera on a writer thread.  Use camera.record to
+        create one.
+
+    args:
+        camera (SentechCamera): camera to record from
+        path (str): output path.  The sidecar index is written next to it with
+            a .csv extension.
+        format (Optional[str]): "raw" for chunked raw frame archives (read
+            them with pysentech.archive.ArchiveReader) or "video" to encode
+            with OpenCV
+        queue_size (Optional[int]): frames that can wait for the writer
+            before new ones are dropped
+        chunk_bytes (Optional[int]): maximum size of each raw chunk file
+        fps (Optional[float]): frame rate stored in video files
+        fourcc (Optional[str]): video codec
+        timeout_ms (Optional[int]): timeout for each buffer transfer in
+            milliseconds
+    """
+    def __init__(self, camera, path, format="raw", queue_size=64,
+                 chunk_bytes=2**30, fps=30.0, fourcc="MJPG", timeout_ms=1000):
+        if format == "raw":
+            self._writer = _RawChunkWriter(path, chunk_bytes)
+        elif format == "video":
+            self._writer = _VideoWriter(path, fps, fourcc)
+        else:
+            raise ValueError("Invalid format, try: 'raw' or 'video'")
+        self.camera = camera
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".csv"
+        self.queue_size = queue_size
+        self.timeout_ms = timeout_ms
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.errors = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Starts capturing and writing. """
+        self.camera.start_capture(queue_size=self.queue_size,
+                                  policy="drop_newest",
+                                  timeout_ms=self.timeout_ms)
+        self._thread = threading.Thread(target=self._run,
+                                        name="SentechRecorder")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def _run(self):
+        with open(self.index_path, "w") as f:
+            index = csv.writer(f, lineterminator="\n")
+            index.writerow(INDEX_COLUMNS)
+            try:
+                while True:
+                    frame = self.camera.get_frame(timeout=0.1)
+                    if frame is None:
+                        if self._stop_event.is_set():
+                            break
+                        continue
+                    try:
+                        name, offset = self._writer.write(frame)
+                        index.writerow([self.frames_written,
+                                        frame.frame_number,
+                                        repr(frame.timestamp),
+                                        frame.bytes_transferred,
+                                        frame.skipped,
+                                        name,
+                                        offset])
+                        self.frames_written += 1
+                        self.bytes_written += frame.bpi
+                    except Exception:
+                        self.errors += 1
+                    finally:
+                        frame.release()
+            finally:
+                self._writer.close()
+
+    def stop(self):
+        """ Stops capturing, writes the frames that are still queued and
+                closes the files.
+        """
+        self.camera.stop_capture()
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def frames_dropped(self):
+        """ Frames the capture thread dropped because the writer was behind. """
+        return self.camera.capture_stats.get("dropped", 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,236 @@
+"""
+replay.py
+
+Replays recorded raw frame archives as a virtual camera.  ReplayDLL is a
+    SimulatedDLL whose one camera serves the recorded frames, so
+    SentechSystem(backend="replay", path=...) gives back a regular
+    SentechCamera with the recording's image shape and pixel format.
+
+Frames are paced by the timestamps in the recording's .csv index (see
+    pysentech.recorder), scaled by a speed factor, or served as fast as
+    possible.
+"""
+import csv
+import glob
+import os
+import time
+from ctypes import memmove
+
+from .archive import ArchiveReader
+from .camera import PIXEL_FORMATS
+from .error import ERROR_HANDLE_EOF
+from .simulator import SimulatedDLL, _SimulatedCamera
+from .simulator import ERROR_INVALID_PARAMETER
+
+
+def find_recording(path):
+    """ Gets the archives and index of a recording.
+
+    args:
+        path (str): a single archive, or the path a recording was made to, in
+            which case its chunks (<name>.<chunk number>.raw) are found
+
+    returns:
+        tuple: (archive paths, index path or None)
+    """
+    base = os.path.splitext(path)[0]
+    chunks = sorted(glob.glob(glob.escape(base) + ".[0-9][0-9][0-9][0-9].raw"))
+    if chunks:
+        archives = chunks
+    elif os.path.isfile(path):
+        archives = [path]
+        # a single chunk of a recording still has the recording's index
+        base = os.path.splitext(base)[0] if base[-5:-4] == "." else base
+    else:
+        raise IOError("No recording found at: {}".format(path))
+    index = base + ".csv"
+    return archives, index if os.path.isfile(index) else None
+
+
+def read_index(path):
+    """ Reads frame numbers and timestamps from a recording's .csv index. """
+    frame_numbers, timestamps = [], []
+    with open(path, "r") as f:
+        for row in csv.DictReader(f):
+            frame_numbers.append(int(row["frame_number"]))
+            timestamps.append(float(row["timestamp"]))
+    return frame_numbers, timestamps
+
+
+def check_layout(readers):
+    """ Checks that every chunk of a recording has the same frame layout.
+            The recorder starts a new chunk when the frame size changes, and
+            a replayed camera can only serve one layout.
+
+    raises:
+        IOError: a chunk differs from the first one
+    """
+    def layout(reader):
+        return (reader.width, reader.height, reader.pixel_format, reader.bpi,
+                reader.stride)
+
+    first = layout(readers[0])
+    for reader in readers[1:]:
+        if layout(reader) != first:
+            raise IOError("Can't replay {}: its frames are {}x{} {} ({} "
+                          "bytes, stride {}), the recording started with "
+                          "{}x{} {} ({} bytes, stride {}).".format(
+                              reader.path, *(layout(reader) + first)))
+
+
+class _ReplayCamera(_SimulatedCamera):
+    """
+    A simulated camera that serves recorded frames instead of a synthetic
+        pattern.
+    """
+    def __init__(self, readers, frame_numbers, timestamps, speed, fps, loop,
+                 drop):
+        first = readers[0]
+        codes = dict((v, k) for k, v in PIXEL_FORMATS.items())
+        padding = first.stride - first.width * first.bpp
+        super(_ReplayCamera, self).__init__(0, first.width, first.height,
+                                            codes[first.pixel_format], None,
+                                            0.0, padding, "STC-REPLAY", None)
+        self.readers = readers
+        self.frames = [(r, i) for r in readers for i in range(len(r))]
+        self.frame_numbers = frame_numbers
+        self.timestamps = timestamps
+        self.speed = speed
+        self.replay_fps = fps
+        self.loop = loop
+        self.drop = drop
+        self.position = 0
+        self._start = None
+        self._numbers_offset = 0
+
+    @property
+    def raw_size(self):
+        return self.readers[0].bpi
+
+    @property
+    def output_fps(self):
+        """ Recorded frame rate, scaled by the replay speed. """
+        if not self.speed:
+            return 0.0
+        stamps = self.timestamps
+        if len(stamps) > 1 and stamps[-1] > stamps[0]:
+            return (len(stamps) - 1) / (stamps[-1] - stamps[0]) * self.speed
+        return self.replay_fps * self.speed
+
+    def _due(self, position):
+        """ Seconds after the start of replay that a frame is due. """
+        if not self.speed:
+            return 0.0
+        if self.timestamps:
+            elapsed = self.timestamps[position] - self.timestamps[0]
+        else:
+            elapsed = position / float(self.replay_fps)
+        return elapsed / self.speed
+
+    def wait_for_frame(self, timeout):
+        if self.position >= len(self.frames):
+            if not self.loop or not self.frames:
+                time.sleep(timeout)  # nothing more will arrive
+                return False
+            if self.frame_numbers:
+                # keep frame numbers increasing across loops
+                self._numbers_offset = (self.frame_no + 1 -
+                                        self.frame_numbers[0])
+            self.position = 0
+            self._start = None
+        now = time.perf_counter()
+        if self._start is None:
+            self._start = now - self._due(self.position)
+        if self.drop:
+            # skip frames that a live camera would have overwritten already
+            while (self.position + 1 < len(self.frames) and
+                   self._start + self._due(self.position + 1) <= now):
+                self.position += 1
+        wait = self._start + self._due(self.position) - now
+        if wait > timeout:
+            time.sleep(timeout)
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        if self.frame_numbers:
+            self.frame_no = (self._numbers_offset +
+                             self.frame_numbers[self.position])
+        else:
+            self.frame_no += 1
+        self.position += 1
+        return True
+
+    def fill(self, dest, limit):
+        reader, index = self.frames[self.position - 1]
+        frame = reader.frames[index]
+        size = min(reader.bpi, limit)
+        memmove(dest, frame.ctypes.data, size)
+        return size
+
+
+class ReplayDLL(SimulatedDLL):
+    """
+    Simulated DLL with one camera that replays a recording.  The image shape
+        and pixel format are fixed to the recording's.
+
+    args:
+        path (str): an archive, or the path a recording was made to
+        speed (Optional[float]): replay speed relative to the recording.  1
+            keeps the original pacing, 2 replays twice as fast, and 0 serves
+            frames as fast as they are asked for.
+        fps (Optional[float]): frame rate to assume when the recording has
+            no .csv index
+        loop (Optional[bool]): start over at the end of the recording.  By
+            default grabs past the end raise
+            pysentech.error.SentechEndOfRecording.
+        drop (Optional[bool]): skip frames that are late, like a live camera
+            would.  By default every frame is served, in order.
+
+    raises:
+        IOError: no recording at path, or its pixel format or shape changed
+            partway through
+    """
+    def __init__(self, path, speed=1.0, fps=30.0, loop=False, drop=False):
+        self._setup_functions()
+        archives, index = find_recording(path)
+        readers = [ArchiveReader(p) for p in archives]
+        check_layout(readers)
+        frame_numbers, timestamps = [], []
+        if index is not None:
+            frame_numbers, timestamps = read_index(index)
+        total = sum(len(r) for r in readers)
+        if len(frame_numbers) != total:
+            frame_numbers, timestamps = [], []  # index doesn't match
+        self.path = path
+        self.cameras = [_ReplayCamera(readers, frame_numbers, timestamps,
+                                      speed, fps, loop, drop)]
+
+    def StCam_SetImageSize(self, hCamera, dwReserved, wScanMode, dwOffsetX,
+                           dwOffsetY, dwWidth, dwHeight):
+        if (dwWidth, dwHeight) != (hCamera.width, hCamera.height):
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        return True
+
+    def StCam_SetPreviewPixelFormat(self, hCamera, dwPreviewPixelFormat):
+        if dwPreviewPixelFormat != hCamera.pixel_format:
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        return True
+
+    def StCam_SetTriggerMode(self, hCamera, dwTriggerMode):
+        if dwTriggerMode & self.STCAM_TRIGGER_MODE_TYPE_MASK:
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)  # free run only
+        return True
+
+    def StCam_ResetSetting(self, hCamera):
+        return True
+
+    def StCam_TakeRawSnapShot(self, hCamera, pbyteBuffer, dwBufferSize,
+                              pdwNumberOfByteTrans, pdwFrameNo,
+                              dwMilliseconds):
+        at_end = (hCamera.position >= len(hCamera.frames) and
+                  not hCamera.loop)
+        if at_end:
+            return self._fail(hCamera, ERROR_HANDLE_EOF)
+        return super(ReplayDLL, self).StCam_TakeRawSnapShot(
+            hCamera, pbyteBuffer, dwBufferSize, pdwNumberOfByteTrans,
+            pdwFrameNo, dwMilliseconds)
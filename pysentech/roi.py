@@ -0,0 +1,70 @@
+"""
+roi.py
+
+Named readout windows.  Reading out only the region of the sensor you need,
+    or binning it, is the largest frame rate lever a camera has.  A
+    RegionOfInterest keeps its own preallocated buffers, so that switching
+    between regions with cam.use_roi costs one driver call and no allocation:
+
+    >>> cam.add_roi("full", 1280, 1024)
+    >>> cam.add_roi("spot", 256, 256, 512, 384)
+    >>> cam.rois["spot"].max_fps
+    143.2
+    >>> cam.use_roi("spot")
+    >>> frame = cam.grab_frame()
+"""
+
+
+class RegionOfInterest(object):
+    """
+    A named readout window and the buffers preallocated for it.
+
+    args:
+        name (str): name to switch to it by
+        scan_mode (str): one of camera.SCAN_MODES
+        offset_x (int): window offset in pixels
+        offset_y (int): window offset in pixels
+        width (int): window width in pixels
+        height (int): window height in pixels
+
+    Measured by the camera when the region is added:
+
+        geometry (tuple): (scan mode, offset x, offset y, width, height) as
+            the driver applied it
+        image_size (int): bytes per frame
+        pixel_format (str): pixel format the buffers were allocated for
+        max_fps (float): frame rate the camera reported for the region at
+            the exposure of the time
+        frame (_SentechFrame): frame buffer for grab_frame
+        pool (_FramePool): buffer pool, if the camera had one
+        exposure_table (ExposureTable): kept from the last time the region
+            was in use, if it was built then
+    """
+    def __init__(self, name, scan_mode, offset_x, offset_y, width, height):
+        self.name = name
+        self.scan_mode = scan_mode
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        self.width = width
+        self.height = height
+        self.geometry = None
+        self.image_size = None
+        self.pixel_format = None
+        self.max_fps = None
+        self.frame = None
+        self.pool = None
+        self.exposure_table = None
+
+    @property
+    def shape(self):
+        """ (width, height) as applied by the driver. """
+        return self.geometry[3:]
+
+    @property
+    def buffer_count(self):
+        return len(self.pool) if self.pool is not None else 0
+
+    def __repr__(self):
+        return "RegionOfInterest({!r}, {}, {}x{}+{}+{})".format(
+            self.name, self.scan_mode, self.width, self.height,
+            self.offset_x, self.offset_y)
@@ -6,6 +6,8 @@ Python wrapper for Sentech C DLL.
 import re
 import os
 import sys
+import json
+import hashlib
 from ctypes import *
 from ctypes.wintypes import *
 
@@ -69,20 +71,151 @@ types = {
     'SHORT': c_short,
     'PSHORT': POINTER(c_short),
     'LPVOID': c_void_p,
+    'PVOID': c_void_p,
     'VOID': c_void_p,
 }
 
+try:
+    _FUNCTYPE = WINFUNCTYPE
+except NameError:
+    _FUNCTYPE = CFUNCTYPE  # not on Windows, only the simulator calls it
+
+# fStCamRawCallbackFunc: called by the SDK for every frame of a continuous
+#   transfer with (pvRawData, dwBufferSize, dwWidth, dwHeight, dwFrameNo,
+#   wPreviewPixelFormat, lpContext, lpReserved)
+RawCallback = _FUNCTYPE(None, c_void_p, c_ulong, c_ulong, c_ulong, c_ulong,
+                        c_ushort, c_void_p, c_void_p)
+types['fStCamRawCallbackFunc'] = RawCallback
+
+
+def parse_constants(lines):
+    """
+    Gets all #define constants from the lines of a header file.  Constants that
+        aren't plain python literals are skipped.
+
+    args:
+        lines (iterable): lines of a header file
+
+    returns:
+        dict: constant values by name
+    """
+    constants = {}
+    define = re.compile(r'\#define\s+(\S+)\s+(".*"|\S+)')
+    for line in lines:
+        m = define.match(line)
+        if m:
+            name = m.group(1)
+            value = m.group(2)
+            try:
+                constants[name] = eval(value, {})
+            except NameError:
+                pass
+            except SyntaxError:
+                pass
+    return constants
+
+
+def parse_functions(lines):
+    """
+    Gets all WINAPI function prototypes from the lines of a header file.
+
+    args:
+        lines (iterable): lines of a header file
+
+    returns:
+        dict: {'arg_types', 'arg_names', 'ret_type'} by function name
+    """
+    functions = {}
+    for line in lines:
+        if " WINAPI " in line:
+            ret_type, func = line.split(" WINAPI ")
+            func_name, func_args = func.split("(")
+            
+            func_args = func_args.split(")")[0]
+            func_args = [f.strip(" ") for f in func_args.split(",")]
+            func_arg_types = [f.split(" ")[0] for f in func_args]
+            try:
+                func_arg_names = [f.split(" ")[1] for f in func_args]
+            except IndexError:
+                func_arg_names = []
+                pass
+            functions[func_name] = {'arg_types': func_arg_types,
+                                    'arg_names': func_arg_names,
+                                    'ret_type': ret_type,}
+    return functions
+
+
+def _cache_path(header_file, cache_folder=None):
+    """
+    Gets the cache file for a header file.  Cache files live in cache_folder,
+        the PYSENTECH_CACHE env variable or ~/.pysentech, in that order.
+    """
+    if not cache_folder:
+        cache_folder = os.environ.get('PYSENTECH_CACHE',
+                                      os.path.join(os.path.expanduser("~"),
+                                                   ".pysentech"))
+    key = hashlib.sha1(os.path.abspath(header_file).encode()).hexdigest()
+    return os.path.join(cache_folder, "header_{}.json".format(key))
+
+
+def load_header(header_file, cache_folder=None):
+    """
+    Parses a header file, using a cached copy of the result when the header's
+        path, modification time and contents haven't changed.
+
+    args:
+        header_file (str): path to header file
+        cache_folder (Optional[str]): folder for the cache file
+
+    returns:
+        tuple: (constants, functions), see parse_constants and
+            parse_functions
+    """
+    with open(header_file, "rb") as hfile:
+        contents = hfile.read()
+    key = {"header": os.path.abspath(header_file),
+           "mtime": os.path.getmtime(header_file),
+           "sha1": hashlib.sha1(contents).hexdigest()}
+
+    cache_file = _cache_path(header_file, cache_folder)
+    try:
+        with open(cache_file, "r") as f:
+            cached = json.load(f)
+        if all(cached.get(k) == v for k, v in key.items()):
+            return cached["constants"], cached["functions"]
+    except (IOError, OSError, ValueError):
+        pass
+
+    lines = contents.decode("latin-1").splitlines()
+    constants = parse_constants(lines)
+    functions = parse_functions(lines)
+
+    cached = dict(key, constants=constants, functions=functions)
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        with open(cache_file, "w") as f:
+            json.dump(cached, f)
+    except (IOError, OSError, TypeError):
+        pass  # caching is only an optimization
+    return constants, functions
+
 
 class SentechDLL(object):
     """
     Auto-generated python library using the C DLL.
 
+    The parsed header is cached (see load_header), and functions are looked up
+        in the DLL and given their arg and return types the first time they're
+        used.
+
     args:
         sdk_folder (Optional[str]): Sentech SDK folder
             (probably something like: '/blah/blah/StandardSDK(v3.08)')
             If nothing is provided, then SENTECHPATH env variable is used.
+        cache_folder (Optional[str]): folder for the parsed header cache
     """
-    def __init__(self, sdk_folder=""):
+    def __init__(self, sdk_folder="", cache_folder=None):
         if not sdk_folder:
             try:
                 sdk_folder = os.environ['SENTECHPATH']
@@ -94,70 +227,54 @@ class SentechDLL(object):
             raise SentechSystemError("No header file located @ {}".format(self.header_file))
         self.path = find_dll(self.header_file)
 
+        if 'nt' not in os.name:
+            raise SentechSystemError("StCamD.dll can only be loaded on Windows. "
+                                     "Use SentechSystem(backend='sim') to run "
+                                     "without cameras.")
         self.dll = windll.LoadLibrary(self.path)  #WINDOWS
         
-        self._load_constants()
-        self._load_functions()
-        
-    def _load_constants(self):
-        with open(self.header_file, "r") as hfile:
-    
-            # Get all constants and their values
-            define = re.compile(r'\#define\s+(\S+)\s+(".*"|\S+)')            
-            for line in hfile:
-                m = define.match(line)
-                if m:
-                    name = m.group(1)
-                    value = m.group(2)
-                    try:
-                        exec("self.{}={}".format(name, value))
-                    except NameError:
-                        pass
-                    except SyntaxError:
-                        pass
-                    
-    def _load_functions(self):
-        # Get all function names
-        with open(self.header_file, "r") as hfile:
-            functions = {}
-            
-            for line in hfile:
-                if " WINAPI " in line:
-                    ret_type, func = line.split(" WINAPI ")
-                    func_name, func_args = func.split("(")
-                    
-                    func_args = func_args.split(")")[0]
-                    func_args = [f.strip(" ") for f in func_args.split(",")]
-                    func_arg_types = [f.split(" ")[0] for f in func_args]
-                    try:
-                        func_arg_names = [f.split(" ")[1] for f in func_args]
-                    except IndexError:
-                        func_arg_names = []
-                        pass
-                    functions[func_name] = {'arg_types': func_arg_types,
-                                            'arg_names': func_arg_names,
-                                            'ret_type': ret_type,}
-        # Set up their return and arg types
-        for k, v in functions.items():
-            cfunc = getattr(self.dll, k)
-            cfunc.__name__ = k
-            cfunc.__doc__ = "{}\n arg_types:{}\n arg_names:{}\n returns:{}\n".format(k,
-                v['arg_types'], v['arg_names'], v['ret_type'])
-            try:
-                cfunc.argtypes = [types[t] for t in v['arg_types']]
-                pass
-            except KeyError:
-                # Can't parse types appropriately        
-                #print v['arg_types']
-                pass
-            try:
-                cfunc.restype = types[v['ret_type']]
-                #print(cfunc.restype)
-            except KeyError:
-                print("Couldn't parse return type for: {}".format(k))
-            functions[k]['function'] = cfunc
-            setattr(self, k, cfunc)
-        self.functions = functions
+        constants, self.functions = load_header(self.header_file, cache_folder)
+        for name, value in constants.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        # only called for attributes that haven't been set yet
+        functions = self.__dict__.get("functions", {})
+        if name in functions:
+            return self.get_function(name)
+        raise AttributeError(name)
+
+    def get_function(self, name):
+        """
+        Gets a DLL function with its arg and return types set up.
+
+        args:
+            name (str): function name from the header
+
+        returns:
+            function: ctypes function
+        """
+        v = self.functions[name]
+        try:
+            return v['function']
+        except KeyError:
+            pass
+        cfunc = getattr(self.dll, name)
+        cfunc.__name__ = name
+        cfunc.__doc__ = "{}\n arg_types:{}\n arg_names:{}\n returns:{}\n".format(name,
+            v['arg_types'], v['arg_names'], v['ret_type'])
+        try:
+            cfunc.argtypes = [types[t] for t in v['arg_types']]
+        except KeyError:
+            # Can't parse types appropriately        
+            pass
+        try:
+            cfunc.restype = types[v['ret_type']]
+        except KeyError:
+            print("Couldn't parse return type for: {}".format(name))
+        v['function'] = cfunc
+        setattr(self, name, cfunc)
+        return cfunc
         
     
 
@@ -0,0 +1,379 @@
+"""
+shm.py
+
+A shared-memory frame bus for handing frames from one capture process to any
+    number of consumer processes without copying them (python 3.8+).
+
+FramePublisher owns a ring of frame slots in a multiprocessing.shared_memory
+    block, sized from the camera's frame buffer.  The DLL transfers each frame
+    straight into the next slot.  FrameSubscribers attach to the block by name
+    and map every slot as a numpy view:
+
+    # capture process
+    >>> publisher = FramePublisher(cam, slots=16).start()
+    >>> publisher.name
+    'psm_1a2b3c'
+
+    # any number of consumer processes
+    >>> subscriber = FrameSubscriber("psm_1a2b3c")
+    >>> frame = subscriber.get(timeout=1.0)
+    >>> process(frame.array)
+    >>> frame.valid  # False if the publisher has overwritten the slot since
+
+Each frame has a sequence number.  A subscriber that falls more than a ring's
+    worth of frames behind is lapped: it skips ahead to the oldest frame still
+    in the ring and counts the frames it lost in `lapped`.
+
+Layout: a 128 byte header, then the slots.  Each slot is a 64 byte slot
+    header followed by the frame buffer, padded to a multiple of 64 bytes.
+
+    header       magic 8s, version H, header size H, slots I, slot size I,
+                 bpi I, width I, height I, pixel format 16s, stride I
+                 then at offset 64: latest published sequence number Q
+    slot header  version Q (odd while the slot is being written), sequence
+                 number Q, frame number Q, timestamp d, bytes transferred Q,
+                 skipped Q
+"""
+import struct
+import threading
+import time
+from ctypes import memmove
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .frame import BPP, _SentechFrame, image_layout
+
+MAGIC = b"PYSTSHM1"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIIIII16sI")
+HEADER_SIZE = 128
+LATEST = struct.Struct("<Q")
+LATEST_OFFSET = 64
+SLOT_HEADER = struct.Struct("<QQQdQQ")
+SLOT_HEADER_SIZE = 64
+
+# blocks published from this process, whose tracking stays with the publisher
+_published = set()
+
+
+def _round_up(n, multiple=64):
+    return (n + multiple - 1) // multiple * multiple
+
+
+class FramePublisher(object):
+    """
+    Publishes a camera's frames into a ring of shared memory slots.
+
+    The camera's image shape and pixel format must not change while
+        publishing.
+
+    args:
+        camera (SentechCamera): camera to publish from
+        slots (Optional[int]): number of frames in the ring.  Subscribers can
+            fall this many frames behind before they are lapped.
+        name (Optional[str]): shared memory block name.  A unique name is
+            chosen if None.
+    """
+    def __init__(self, camera, slots=8, name=None):
+        if slots < 2:
+            raise ValueError("The ring needs at least 2 slots.")
+        frame = camera.frame
+        self.camera = camera
+        self.slots = slots
+        self.bpi = frame.bpi
+        self.slot_size = SLOT_HEADER_SIZE + _round_up(self.bpi)
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=HEADER_SIZE + slots * self.slot_size)
+        _published.add(self.shm._name)
+        buf = self.shm.buf
+        HEADER.pack_into(buf, 0, MAGIC, VERSION, HEADER_SIZE, slots,
+                         self.slot_size, self.bpi, frame.width, frame.height,
+                         frame.pixel_format.encode(), frame.stride)
+        LATEST.pack_into(buf, LATEST_OFFSET, 0)
+        self.seq = 0
+        self._versions = [0] * slots
+        # one frame per slot, wrapping its part of the block
+        layout = camera._frame_layout()
+        self._frames = []
+        for i in range(slots):
+            start = self._offset(i) + SLOT_HEADER_SIZE
+            self._frames.append(_SentechFrame(
+                buffer=buf[start:start + self.bpi], **layout))
+        self.errors = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def name(self):
+        """ Name subscribers attach to. """
+        return self.shm.name
+
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * self.slot_size
+
+    def _begin(self, slot):
+        """ Marks a slot as being written. """
+        self._versions[slot] += 1
+        SLOT_HEADER.pack_into(self.shm.buf, self._offset(slot),
+                              self._versions[slot], 0, 0, 0.0, 0, 0)
+
+    def _commit(self, slot, seq, frame):
+        """ Writes a slot's metadata, marks it complete and announces it. """
+        self._versions[slot] += 1
+        buf = self.shm.buf
+        SLOT_HEADER.pack_into(buf, self._offset(slot), self._versions[slot],
+                              seq, frame.frame_number or 0,
+                              frame.timestamp or 0.0,
+                              frame.bytes_transferred or 0,
+                              frame.skipped or 0)
+        LATEST.pack_into(buf, LATEST_OFFSET, seq)
+        self.seq = seq
+
+    def publish(self, timeout_ms=1000):
+        """ Grabs a frame from the camera straight into the next slot.
+
+        args:
+            timeout_ms (Optional[int]): timeout for buffer transfer in
+                milliseconds
+
+        returns:
+            int: the frame's sequence number, or None if the transfer failed
+        """
+        if self.camera.image_size != self.bpi:
+            raise ValueError("Camera frame size changed since the publisher "
+                             "was created.")
+        seq = self.seq + 1
+        slot = (seq - 1) % self.slots
+        frame = self._frames[slot]
+        self._begin(slot)
+        if not self.camera._snapshot(timeout_ms, frame):
+            self._commit(slot, self.seq, frame)  # leave the slot unannounced
+            return None
+        self.camera._hand_out(frame)
+        self._commit(slot, seq, frame)
+        return seq
+
+    def publish_frame(self, frame):
+        """ Copies an already acquired frame, e.g. from cam.get_frame(), into
+                the next slot.
+
+        returns:
+            int: the frame's sequence number
+        """
+        if frame.bpi != self.bpi:
+            raise ValueError("Frame is {} bytes, slots hold {}".format(
+                frame.bpi, self.bpi))
+        seq = self.seq + 1
+        slot = (seq - 1) % self.slots
+        self._begin(slot)
+        memmove(self._frames[slot].buffer, frame.buffer, self.bpi)
+        self._commit(slot, seq, frame)
+        return seq
+
+    def start(self, timeout_ms=1000):
+        """ Publishes continuously from a background thread. """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(timeout_ms,),
+                                        name="SentechPublisher")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def _run(self, timeout_ms):
+        while not self._stop_event.is_set():
+            try:
+                self.publish(timeout_ms)
+            except Exception:
+                self.errors += 1
+
+    def stop(self):
+        """ Stops the background thread. """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """ Stops publishing and removes the shared memory block.
+                Subscribers that are still attached keep their mapping.
+        """
+        self.stop()
+        self._frames = []  # release their exports of the block
+        self.shm.close()
+        _published.discard(self.shm._name)
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SharedFrame(object):
+    """
+    A frame read from the shared memory ring.  `array` is a view of the slot,
+        so it is only good until the publisher writes the slot again; check
+        `valid` after using it, or copy() it.
+    """
+    def __init__(self, subscriber, slot, version, seq, frame_number,
+                 timestamp, bytes_transferred, skipped):
+        self.subscriber = subscriber
+        self.slot = slot
+        self.seq = seq
+        self.frame_number = frame_number
+        self.timestamp = timestamp
+        self.bytes_transferred = bytes_transferred
+        self.skipped = skipped
+        self.array = subscriber._views[slot]
+        self._version = version
+
+    @property
+    def valid(self):
+        """ Whether the slot still holds this frame. """
+        return self.subscriber._version(self.slot) == self._version
+
+    def copy(self):
+        """ Copies the image out of the ring.
+
+        returns:
+            ndarray: the copy, or None if the slot was overwritten during the
+                copy
+        """
+        image = self.array.copy()
+        return image if self.valid else None
+
+
+class FrameSubscriber(object):
+    """
+    Reads frames published by a FramePublisher, possibly in another process.
+
+    args:
+        name (str): the publisher's shared memory name
+        poll_interval (Optional[float]): seconds between checks for a new
+            frame while waiting
+    """
+    def __init__(self, name, poll_interval=0.0005):
+        self.shm = _attach(name)
+        buf = self.shm.buf
+        (magic, _, self.header_size, self.slots, self.slot_size, self.bpi,
+         self.width, self.height, pixel_format, self.stride) = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            self.shm.close()
+            raise IOError("Not a pysentech frame bus: {}".format(name))
+        self.pixel_format = pixel_format.rstrip(b"\0").decode()
+        self.poll_interval = poll_interval
+        self.lapped = 0
+        self.next_seq = max(self.latest, 1)
+        self._views = None
+        if np is not None:
+            shape, strides = image_layout(self.width, self.height,
+                                          BPP[self.pixel_format], self.stride)
+            self._views = [np.ndarray(buffer=buf,
+                                      dtype=np.uint8,
+                                      offset=(self.header_size +
+                                              i * self.slot_size +
+                                              SLOT_HEADER_SIZE),
+                                      shape=shape,
+                                      strides=strides)
+                           for i in range(self.slots)]
+            for view in self._views:
+                view.flags.writeable = False
+
+    @property
+    def latest(self):
+        """ Sequence number of the most recently published frame, 0 if none
+                has been published yet.
+        """
+        return LATEST.unpack_from(self.shm.buf, LATEST_OFFSET)[0]
+
+    def _version(self, slot):
+        offset = self.header_size + slot * self.slot_size
+        return LATEST.unpack_from(self.shm.buf, offset)[0]
+
+    def _read(self, seq):
+        """ Reads the metadata of frame seq, or None if its slot is being
+                written or holds another frame.
+        """
+        slot = (seq - 1) % self.slots
+        offset = self.header_size + slot * self.slot_size
+        fields = SLOT_HEADER.unpack_from(self.shm.buf, offset)
+        version, slot_seq = fields[:2]
+        if version % 2 or slot_seq != seq:
+            return None
+        return SharedFrame(self, slot, *fields)
+
+    def get(self, timeout=None, newest=False):
+        """ Gets the next frame.
+
+        args:
+            timeout (Optional[float]): seconds to wait for a new frame.  None
+                waits forever.
+            newest (Optional[bool]): skip to the most recent frame instead of
+                reading the ring in order.  Frames skipped this way don't
+                count as lapped.
+
+        returns:
+            SharedFrame: the frame, or None if the wait timed out
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            latest = self.latest
+            if latest < self.next_seq:
+                if deadline is not None and time.time() >= deadline:
+                    return None
+                time.sleep(self.poll_interval)
+                continue
+            if newest:
+                self.next_seq = latest
+            oldest = latest - self.slots + 2  # the publisher may be writing
+            if self.next_seq < oldest:      # the slot after latest
+                self.lapped += oldest - self.next_seq
+                self.next_seq = oldest
+            frame = self._read(self.next_seq)
+            if frame is None:
+                continue  # overwritten while we looked, catch up
+            self.next_seq += 1
+            return frame
+
+    def close(self):
+        """ Unmaps the shared memory.  Arrays returned earlier must not be
+                used afterwards.
+        """
+        self._views = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # views are still alive, the map is closed when they go
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _attach(name):
+    """ Attaches to an existing shared memory block without letting this
+            process's resource tracker remove it at exit.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # 3.13+
+    except TypeError:
+        pass
+    shm = shared_memory.SharedMemory(name=name)
+    if shm._name in _published:
+        return shm
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except (ImportError, AttributeError):
+        pass
+    return shm
@@ -0,0 +1,728 @@
+"""
+simulator.py
+
+Pure-python stand-in for StCamD.dll.  SimulatedDLL has the same function
+    names, calling conventions and function table as SentechDLL, and generates
+    synthetic frames at a configurable resolution, pixel format, frame rate and
+    jitter.  Use it through SentechSystem(backend="sim") to run the high-level
+    API on machines without cameras or without Windows.
+"""
+import json
+import random
+import threading
+import time
+from ctypes import *
+
+from .sentechdll import parse_constants, parse_functions
+from .camera import PIXEL_FORMATS, COLOR_ARRAYS
+from .frame import BPP
+
+# The part of StCamD.h that the simulator implements
+HEADER = """
+#define STCAM_PIXEL_FORMAT_08_MONO_OR_RAW 0x0001
+#define STCAM_PIXEL_FORMAT_24_BGR 0x0004
+#define STCAM_PIXEL_FORMAT_32_BGR 0x0008
+#define STCAM_COLOR_ARRAY_MONO 0x0001
+#define STCAM_COLOR_ARRAY_RGGB 0x0002
+#define STCAM_COLOR_ARRAY_GRBG 0x0003
+#define STCAM_COLOR_ARRAY_GBRG 0x0004
+#define STCAM_COLOR_ARRAY_BGGR 0x0005
+#define STCAM_SCAN_MODE_NORMAL 0x0000
+#define STCAM_SCAN_MODE_PARTIAL_2 0x0001
+#define STCAM_SCAN_MODE_PARTIAL_4 0x0002
+#define STCAM_SCAN_MODE_PARTIAL_1 0x0004
+#define STCAM_SCAN_MODE_ROI 0x0008
+#define STCAM_SCAN_MODE_BINNING 0x0010
+#define STCAM_SCAN_MODE_BINNING_PARTIAL_1 0x0020
+#define STCAM_SCAN_MODE_BINNING_PARTIAL_2 0x0040
+#define STCAM_SCAN_MODE_BINNING_PARTIAL_4 0x0080
+#define STCAM_SCAN_MODE_BINNING_ROI 0x0100
+#define STCAM_TRIGGER_MODE_TYPE_MASK 0x00000001
+#define STCAM_TRIGGER_MODE_TYPE_FREE_RUN 0x00000000
+#define STCAM_TRIGGER_MODE_TYPE_TRIGGER 0x00000001
+#define STCAM_TRIGGER_MODE_SOURCE_MASK 0x00000002
+#define STCAM_TRIGGER_MODE_SOURCE_NONE 0x00000000
+#define STCAM_TRIGGER_MODE_SOURCE_HARDWARE 0x00000002
+#define STCAM_TRIGGER_MODE_EXPTIME_MASK 0x00000004
+#define STCAM_TRIGGER_MODE_EXPTIME_EDGE 0x00000000
+#define STCAM_TRIGGER_MODE_EXPTIME_PULSE 0x00000004
+#define STCAM_CLOCK_MODE_NORMAL 0x0000
+#define STCAM_CLOCK_MODE_DIV_2 0x0001
+#define STCAM_CLOCK_MODE_DIV_4 0x0002
+#define STCAM_GAMMA_OFF 0
+#define STCAM_GAMMA_ON 1
+#define STCAM_GAMMA_REVERSE 2
+#define STCAM_GAMMA_TABLE 3
+#define STCAM_GAMMA_TARGET_Y 0
+#define STCAM_GAMMA_TARGET_R 1
+#define STCAM_GAMMA_TARGET_GR 2
+#define STCAM_GAMMA_TARGET_GB 3
+#define STCAM_GAMMA_TARGET_B 4
+HANDLE WINAPI StCam_Open(DWORD dwInstance);
+VOID WINAPI StCam_Close(HANDLE hCamera);
+DWORD WINAPI StCam_CameraCount(LPVOID pvReserved);
+DWORD WINAPI StCam_GetLastError(HANDLE hCamera);
+BOOL WINAPI StCam_GetProductNameA(HANDLE hCamera, PSTR pszProductName, DWORD dwBufferSize);
+BOOL WINAPI StCam_GetCameraVersion(HANDLE hCamera, PWORD pwUSBVendorID, PWORD pwUSBProductID, PWORD pwFPGAVersion, PWORD pwFirmVersion);
+BOOL WINAPI StCam_GetDriverVersion(HANDLE hCamera, PDWORD pdwFileVersionMS, PDWORD pdwFileVersionLS, PDWORD pdwProductVersionMS, PDWORD pdwProductVersionLS);
+BOOL WINAPI StCam_ResetSetting(HANDLE hCamera);
+BOOL WINAPI StCam_GetMaximumImageSize(HANDLE hCamera, PDWORD pdwMaxWidth, PDWORD pdwMaxHeight);
+BOOL WINAPI StCam_GetImageSize(HANDLE hCamera, PDWORD pdwReserved, PWORD pwScanMode, PDWORD pdwOffsetX, PDWORD pdwOffsetY, PDWORD pdwWidth, PDWORD pdwHeight);
+BOOL WINAPI StCam_SetImageSize(HANDLE hCamera, DWORD dwReserved, WORD wScanMode, DWORD dwOffsetX, DWORD dwOffsetY, DWORD dwWidth, DWORD dwHeight);
+BOOL WINAPI StCam_GetAvailableScanMode(HANDLE hCamera, PWORD pwAvailableScanMode);
+BOOL WINAPI StCam_GetOutputFPS(HANDLE hCamera, PFLOAT pfFPS);
+BOOL WINAPI StCam_GetPreviewPixelFormat(HANDLE hCamera, PDWORD pdwPreviewPixelFormat);
+BOOL WINAPI StCam_SetPreviewPixelFormat(HANDLE hCamera, DWORD dwPreviewPixelFormat);
+BOOL WINAPI StCam_GetColorArray(HANDLE hCamera, PWORD pwColorArray);
+BOOL WINAPI StCam_GetTransferBitsPerPixel(HANDLE hCamera, PDWORD pdwTransferBitsPerPixel);
+BOOL WINAPI StCam_GetRawDataSize(HANDLE hCamera, PDWORD pdwSize);
+BOOL WINAPI StCam_GetGain(HANDLE hCamera, PWORD pwGain);
+BOOL WINAPI StCam_SetGain(HANDLE hCamera, WORD wGain);
+BOOL WINAPI StCam_GetMaxGain(HANDLE hCamera, PWORD pwMaxGain);
+BOOL WINAPI StCam_GetExposureClock(HANDLE hCamera, PDWORD pdwExposureClock);
+BOOL WINAPI StCam_SetExposureClock(HANDLE hCamera, DWORD dwExposureClock);
+BOOL WINAPI StCam_GetMaxLongExposureClock(HANDLE hCamera, PDWORD pdwMaxExposureClock);
+BOOL WINAPI StCam_GetExposureTimeFromClock(HANDLE hCamera, DWORD dwExposureClock, PFLOAT pfExpTime);
+BOOL WINAPI StCam_GetExposureClockFromTime(HANDLE hCamera, FLOAT fExpTime, PDWORD pdwExposureClock);
+BOOL WINAPI StCam_GetClock(HANDLE hCamera, PDWORD pdwClockMode, PDWORD pdwClock);
+BOOL WINAPI StCam_SetClock(HANDLE hCamera, DWORD dwClockMode, DWORD dwClock);
+BOOL WINAPI StCam_GetCameraGammaValue(HANDLE hCamera, PWORD pwValue);
+BOOL WINAPI StCam_SetCameraGammaValue(HANDLE hCamera, WORD wValue);
+BOOL WINAPI StCam_GetGammaModeEx(HANDLE hCamera, BYTE byteGammaTarget, PBYTE pbyteGammaMode, PWORD pwGamma, PSHORT pshtBrightness, PBYTE pbyteContrast, PBYTE pbyteGammaTable);
+BOOL WINAPI StCam_SetGammaModeEx(HANDLE hCamera, BYTE byteGammaTarget, BYTE byteGammaMode, WORD wGamma, SHORT shtBrightness, BYTE byteContrast, PBYTE pbyteGammaTable);
+BOOL WINAPI StCam_TakeRawSnapShot(HANDLE hCamera, PBYTE pbyteBuffer, DWORD dwBufferSize, PDWORD pdwNumberOfByteTrans, PDWORD pdwFrameNo, DWORD dwMilliseconds);
+BOOL WINAPI StCam_StartTransfer(HANDLE hCamera);
+BOOL WINAPI StCam_StopTransfer(HANDLE hCamera);
+BOOL WINAPI StCam_AddRawCallback(HANDLE hCamera, fStCamRawCallbackFunc func, PVOID pvContext, PDWORD pdwCallbackNo);
+BOOL WINAPI StCam_RemoveRawCallback(HANDLE hCamera, DWORD dwCallbackNo);
+BOOL WINAPI StCam_SetTriggerMode(HANDLE hCamera, DWORD dwTriggerMode);
+BOOL WINAPI StCam_GetTriggerMode(HANDLE hCamera, PDWORD pdwTriggerMode);
+BOOL WINAPI StCam_SoftTrigger(HANDLE hCamera);
+BOOL WINAPI StCam_SaveSettingFileA(HANDLE hCamera, PCSTR pszFileName);
+BOOL WINAPI StCam_LoadSettingFileA(HANDLE hCamera, PCSTR pszFileName);
+BOOL WINAPI StCam_SaveImageA(HANDLE hCamera, DWORD dwWidth, DWORD dwHeight, DWORD dwPreviewPixelFormat, PBYTE pbyteData, PCSTR pszFileName, DWORD dwParam);
+"""
+
+# Windows error codes reported through StCam_GetLastError
+ERROR_FILE_NOT_FOUND = 2
+ERROR_INVALID_PARAMETER = 87
+ERROR_INSUFFICIENT_BUFFER = 122
+ERROR_SEM_TIMEOUT = 121
+
+# Simulated sensor timing
+PIXEL_CLOCK = 48000000.0  # pixels per second
+CLOCK_DIVIDERS = (1, 2, 4)  # by clock mode
+H_BLANK = 256  # pixels per line
+V_BLANK = 40  # lines per frame
+MAX_GAIN = 255
+MAX_EXPOSURE_CLOCK = 65535
+REFERENCE_EXPOSURE = 0.01  # seconds of exposure for a full scale ramp
+
+# Scan modes the simulated sensor supports besides normal.  Binning modes
+#   halve the sensor size.
+SCAN_MODE_ROI = 0x0008
+SCAN_MODE_BINNING = 0x0010
+SCAN_MODE_BINNING_ROI = 0x0100
+AVAILABLE_SCAN_MODES = SCAN_MODE_ROI | SCAN_MODE_BINNING | SCAN_MODE_BINNING_ROI
+
+# Gamma correction targets (Y, R, Gr, Gb, B) and modes
+GAMMA_TARGETS = 5
+GAMMA_MODES = 4
+GAMMA_TABLE_SIZE = 256
+
+# Rows the synthetic pattern moves by each frame
+SCROLL = 4
+
+
+def _deref(arg):
+    """ Gets the ctypes object behind a byref() or pointer() argument. """
+    try:
+        return arg._obj
+    except AttributeError:
+        return arg.contents
+
+
+def _value(arg):
+    """ Gets a plain python value from an argument that may be a ctypes
+            object.
+    """
+    return getattr(arg, "value", arg)
+
+
+class _SimulatedCamera(object):
+    """
+    State of one simulated camera.  Its handle is the object itself.
+    """
+    def __init__(self, index, width, height, pixel_format, fps, jitter,
+                 row_padding, model, rng):
+        self.index = index
+        self.max_width = width
+        self.max_height = height
+        self.default_pixel_format = pixel_format
+        self.fps = fps
+        self.jitter = jitter
+        self.row_padding = row_padding
+        self.model = model
+        self.rng = rng
+        self.color_array = 1
+        self.last_error = 0
+        self.frame_no = 0
+        self._last_due = time.perf_counter()
+        self._pattern = None
+        self._pattern_key = None
+        self.callbacks = {}
+        self._next_callback = 1
+        self._triggers = threading.Semaphore(0)
+        self._transfer = None
+        self._transfer_stop = threading.Event()
+        self.reset()
+
+    def reset(self):
+        self.width = self.max_width
+        self.height = self.max_height
+        self.offset_x = 0
+        self.offset_y = 0
+        self.scan_mode = 0
+        self.pixel_format = self.default_pixel_format
+        self.clock_mode = 0
+        self.gain = 0
+        self.gamma = 100
+        # per target: mode, gamma, brightness, contrast, table
+        self.gamma_settings = [(0, 100, 0, 0, bytes(bytearray(range(256))))
+                               for _ in range(GAMMA_TARGETS)]
+        self.exposure_clock = self.time_to_clock(REFERENCE_EXPOSURE / 2)
+        self.trigger_mode = 0
+
+    @property
+    def bpp(self):
+        return BPP[PIXEL_FORMATS[self.pixel_format]]
+
+    @property
+    def stride(self):
+        return self.width * self.bpp + self.row_padding
+
+    @property
+    def raw_size(self):
+        return self.stride * self.height
+
+    @property
+    def line_time(self):
+        """ Seconds to read out one line at the current width and clock. """
+        return ((self.width + H_BLANK) * CLOCK_DIVIDERS[self.clock_mode] /
+                PIXEL_CLOCK)
+
+    def clock_to_time(self, clock):
+        return clock * self.line_time
+
+    def time_to_clock(self, seconds):
+        return int(round(seconds / self.line_time))
+
+    @property
+    def frame_period(self):
+        """ Seconds between frames.  0 means frames are never waited for. """
+        if self.fps == 0:
+            return 0.0
+        return 1.0 / self.output_fps
+
+    @property
+    def output_fps(self):
+        """ Frame rate the sensor delivers at the current settings. """
+        readout = self.line_time * (self.height + V_BLANK)
+        period = max(readout, self.clock_to_time(self.exposure_clock))
+        if self.fps:
+            period = max(period, 1.0 / self.fps)
+        return 1.0 / period
+
+    def wait_for_frame(self, timeout):
+        """ Waits for the sensor to finish its next frame.
+
+        returns:
+            bool: False if the frame didn't arrive within the timeout
+        """
+        period = self.frame_period
+        if not period:
+            self.frame_no += 1
+            return True
+        now = time.perf_counter()
+        skipped = max(int((now - self._last_due) / period), 0)
+        due = self._last_due + (skipped + 1) * period
+        wait = due - now
+        if self.jitter:
+            wait += self.rng.gauss(0.0, self.jitter)
+        if wait > timeout:
+            time.sleep(timeout)
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        self._last_due = due
+        self.frame_no += skipped + 1
+        return True
+
+    @property
+    def triggered(self):
+        return bool(self.trigger_mode & 0x1)
+
+    def next_frame(self, timeout):
+        """ Waits for the next frame: the next software trigger in trigger
+                mode, otherwise the next frame of the free-running sensor.
+                The simulator has no trigger input, so software triggers fire
+                whatever the trigger source.
+
+        returns:
+            bool: False if the frame didn't arrive within the timeout
+        """
+        if not self.triggered:
+            return self.wait_for_frame(timeout)
+        if not self._triggers.acquire(timeout=timeout):
+            return False
+        self.frame_no += 1
+        return True
+
+    def start_transfer(self):
+        if self._transfer is not None:
+            return
+        self._transfer_stop.clear()
+        self._transfer = threading.Thread(target=self._run_transfer,
+                                          name="SimulatedTransfer")
+        self._transfer.daemon = True
+        self._transfer.start()
+
+    def stop_transfer(self):
+        if self._transfer is None:
+            return
+        self._transfer_stop.set()
+        if self._transfer is not threading.current_thread():
+            self._transfer.join()
+        self._transfer = None
+
+    def _run_transfer(self):
+        """ Continuous transfer: fills an internal buffer with every frame and
+                hands it to the raw callbacks, like the driver's own thread.
+        """
+        buffer = None
+        while not self._transfer_stop.is_set():
+            if not self.next_frame(0.1):
+                continue
+            size = self.raw_size
+            if buffer is None or sizeof(buffer) < size:
+                buffer = (c_ubyte * size)()
+            self.fill(buffer, sizeof(buffer))
+            for func, context in list(self.callbacks.values()):
+                func(addressof(buffer), size, self.width, self.height,
+                     self.frame_no, self.pixel_format, context, None)
+
+    def _render(self):
+        """ Builds the synthetic image: a diagonal sawtooth ramp whose
+                brightness follows exposure and gain, stored twice over so
+                that a window into it that moves down by whole rows can be
+                copied out with one memmove.
+        """
+        scale = (self.clock_to_time(self.exposure_clock) / REFERENCE_EXPOSURE *
+                 10 ** (self.gain / 200.0))
+        key = (self.width, self.height, self.pixel_format, self.row_padding,
+               self.color_array, scale)
+        if key == self._pattern_key:
+            return
+        bpp = self.bpp
+        pattern = COLOR_ARRAYS[self.color_array] if bpp == 1 else "Mono"
+        if pattern == "Mono":
+            tile_rows = [None]
+        else:
+            # raw Bayer data: each row samples one color per pixel
+            tile_rows = [pattern[:2], pattern[2:]]
+        ramps = []
+        for tile_row in tile_rows:
+            ramp = bytearray()
+            for x in range(self.width):
+                v = min(255, int(255.0 * x / max(self.width - 1, 1) * scale))
+                bgrx = (v // 4, v // 2, v, 255)
+                if tile_row:
+                    ramp.append(bgrx["BGR".index(tile_row[x % 2])])
+                elif bpp == 1:
+                    ramp.append(v)
+                else:
+                    ramp.extend(bgrx[:bpp])
+            ramps.append(bytes(ramp) * 2)
+        padding = bytes(self.row_padding)
+        row_bytes = self.width * bpp
+        rows = []
+        for y in range(self.height):
+            # shift by whole tiles so that the color filter stays in place
+            start = (y - y % len(ramps)) % self.width * bpp
+            rows.append(ramps[y % len(ramps)][start:start + row_bytes])
+            rows.append(padding)
+        image = b"".join(rows)
+        self._pattern = create_string_buffer(image + image)
+        self._pattern_key = key
+
+    def fill(self, dest, limit):
+        """ Copies the current frame into a destination buffer of limit
+                bytes.  Returns the number of bytes copied.
+        """
+        self._render()
+        size = min(self.raw_size, limit)
+        offset = (self.frame_no * SCROLL) % self.height * self.stride
+        memmove(dest, addressof(self._pattern) + offset, size)
+        return size
+
+
+class SimulatedDLL(object):
+    """
+    Simulated replacement for SentechDLL.
+
+    Frames are paced like a free-running sensor: the rate is limited by
+        readout time, exposure time and `fps`, and frame numbers skip when the
+        caller doesn't keep up.
+
+    args:
+        camera_count (Optional[int]): number of simulated cameras
+        width (Optional[int]): sensor width
+        height (Optional[int]): sensor height
+        pixel_format (Optional[str]): initial pixel format, one of
+            PIXEL_FORMATS
+        fps (Optional[float]): frame rate limit.  None runs at the rate the
+            simulated sensor allows, 0 returns frames as fast as possible.
+        jitter (Optional[float]): standard deviation of frame arrival times,
+            in seconds
+        row_padding (Optional[int]): extra bytes at the end of every row
+        model (Optional[str]): product name the cameras report
+        seed (Optional[int]): seed for the jitter random generator
+        color_array (Optional[str]): color filter array the cameras report,
+            one of COLOR_ARRAYS.  With a Bayer pattern, Mono8 frames are raw
+            Bayer data.
+    """
+    def __init__(self,
+                 camera_count=1,
+                 width=1280,
+                 height=1024,
+                 pixel_format="Mono8",
+                 fps=None,
+                 jitter=0.0,
+                 row_padding=0,
+                 model="STC-SIMUSB",
+                 seed=None,
+                 color_array="Mono",
+                 ):
+        self._setup_functions()
+        codes = dict((v, k) for k, v in PIXEL_FORMATS.items())
+        rng = random.Random(seed)
+        self.cameras = [_SimulatedCamera(i, width, height, codes[pixel_format],
+                                         fps, jitter, row_padding, model, rng)
+                        for i in range(camera_count)]
+        array_codes = dict((v, k) for k, v in COLOR_ARRAYS.items())
+        for cam in self.cameras:
+            cam.color_array = array_codes[color_array]
+
+    def _setup_functions(self):
+        """ Sets up constants and the function table from HEADER. """
+        lines = HEADER.splitlines()
+        for name, value in parse_constants(lines).items():
+            setattr(self, name, value)
+        self.functions = parse_functions(lines)
+        for name, v in self.functions.items():
+            v['function'] = getattr(self, name)
+
+    def get_function(self, name):
+        """ Gets a simulated DLL function, see SentechDLL.get_function. """
+        return self.functions[name]['function']
+
+    def _fail(self, hCamera, code):
+        hCamera.last_error = code
+        return False
+
+    def StCam_Open(self, dwInstance):
+        try:
+            return self.cameras[dwInstance]
+        except IndexError:
+            return None
+
+    def StCam_Close(self, hCamera):
+        hCamera.stop_transfer()
+
+    def StCam_CameraCount(self, pvReserved):
+        return len(self.cameras)
+
+    def StCam_GetLastError(self, hCamera):
+        return hCamera.last_error
+
+    def StCam_GetProductNameA(self, hCamera, pszProductName, dwBufferSize):
+        name = hCamera.model.encode()[:dwBufferSize - 1] + b"\0"
+        memmove(pszProductName, name, len(name))
+        return True
+
+    def StCam_GetCameraVersion(self, hCamera, pwUSBVendorID, pwUSBProductID,
+                               pwFPGAVersion, pwFirmVersion):
+        _deref(pwUSBVendorID).value = 0x134e
+        _deref(pwUSBProductID).value = 0x0100 + hCamera.index
+        _deref(pwFPGAVersion).value = 1
+        _deref(pwFirmVersion).value = 1
+        return True
+
+    def StCam_GetDriverVersion(self, hCamera, pdwFileVersionMS,
+                               pdwFileVersionLS, pdwProductVersionMS,
+                               pdwProductVersionLS):
+        _deref(pdwFileVersionMS).value = 3
+        _deref(pdwFileVersionLS).value = 8
+        _deref(pdwProductVersionMS).value = 3
+        _deref(pdwProductVersionLS).value = 8
+        return True
+
+    def StCam_ResetSetting(self, hCamera):
+        hCamera.reset()
+        return True
+
+    def StCam_GetMaximumImageSize(self, hCamera, pdwMaxWidth, pdwMaxHeight):
+        _deref(pdwMaxWidth).value = hCamera.max_width
+        _deref(pdwMaxHeight).value = hCamera.max_height
+        return True
+
+    def StCam_GetImageSize(self, hCamera, pdwReserved, pwScanMode, pdwOffsetX,
+                           pdwOffsetY, pdwWidth, pdwHeight):
+        _deref(pdwReserved).value = 0
+        _deref(pwScanMode).value = hCamera.scan_mode
+        _deref(pdwOffsetX).value = hCamera.offset_x
+        _deref(pdwOffsetY).value = hCamera.offset_y
+        _deref(pdwWidth).value = hCamera.width
+        _deref(pdwHeight).value = hCamera.height
+        return True
+
+    def StCam_SetImageSize(self, hCamera, dwReserved, wScanMode, dwOffsetX,
+                           dwOffsetY, dwWidth, dwHeight):
+        if wScanMode not in (0, SCAN_MODE_ROI, SCAN_MODE_BINNING,
+                             SCAN_MODE_BINNING_ROI):
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        binning = 2 if wScanMode & (SCAN_MODE_BINNING |
+                                    SCAN_MODE_BINNING_ROI) else 1
+        max_width = hCamera.max_width // binning
+        max_height = hCamera.max_height // binning
+        if not wScanMode & (SCAN_MODE_ROI | SCAN_MODE_BINNING_ROI):
+            # fixed size modes read out the whole sensor
+            dwOffsetX, dwOffsetY, dwWidth, dwHeight = 0, 0, max_width, max_height
+        if (dwWidth < 1 or dwHeight < 1 or
+                dwOffsetX + dwWidth > max_width or
+                dwOffsetY + dwHeight > max_height):
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        hCamera.scan_mode = wScanMode
+        hCamera.offset_x, hCamera.offset_y = dwOffsetX, dwOffsetY
+        hCamera.width, hCamera.height = dwWidth, dwHeight
+        return True
+
+    def StCam_GetAvailableScanMode(self, hCamera, pwAvailableScanMode):
+        _deref(pwAvailableScanMode).value = AVAILABLE_SCAN_MODES
+        return True
+
+    def StCam_GetOutputFPS(self, hCamera, pfFPS):
+        _deref(pfFPS).value = hCamera.output_fps
+        return True
+
+    def StCam_GetPreviewPixelFormat(self, hCamera, pdwPreviewPixelFormat):
+        _deref(pdwPreviewPixelFormat).value = hCamera.pixel_format
+        return True
+
+    def StCam_SetPreviewPixelFormat(self, hCamera, dwPreviewPixelFormat):
+        if dwPreviewPixelFormat not in PIXEL_FORMATS:
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        hCamera.pixel_format = dwPreviewPixelFormat
+        return True
+
+    def StCam_GetColorArray(self, hCamera, pwColorArray):
+        _deref(pwColorArray).value = hCamera.color_array
+        return True
+
+    def StCam_GetTransferBitsPerPixel(self, hCamera, pdwTransferBitsPerPixel):
+        _deref(pdwTransferBitsPerPixel).value = 8 * hCamera.bpp
+        return True
+
+    def StCam_GetRawDataSize(self, hCamera, pdwSize):
+        _deref(pdwSize).value = hCamera.raw_size
+        return True
+
+    def StCam_GetGain(self, hCamera, pwGain):
+        _deref(pwGain).value = hCamera.gain
+        return True
+
+    def StCam_SetGain(self, hCamera, wGain):
+        if wGain > MAX_GAIN:
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        hCamera.gain = wGain
+        return True
+
+    def StCam_GetMaxGain(self, hCamera, pwMaxGain):
+        _deref(pwMaxGain).value = MAX_GAIN
+        return True
+
+    def StCam_GetExposureClock(self, hCamera, pdwExposureClock):
+        _deref(pdwExposureClock).value = hCamera.exposure_clock
+        return True
+
+    def StCam_SetExposureClock(self, hCamera, dwExposureClock):
+        if dwExposureClock > MAX_EXPOSURE_CLOCK:
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        hCamera.exposure_clock = dwExposureClock
+        return True
+
+    def StCam_GetMaxLongExposureClock(self, hCamera, pdwMaxExposureClock):
+        _deref(pdwMaxExposureClock).value = MAX_EXPOSURE_CLOCK
+        return True
+
+    def StCam_GetExposureTimeFromClock(self, hCamera, dwExposureClock,
+                                       pfExpTime):
+        _deref(pfExpTime).value = hCamera.clock_to_time(dwExposureClock)
+        return True
+
+    def StCam_GetExposureClockFromTime(self, hCamera, fExpTime,
+                                       pdwExposureClock):
+        clock = min(hCamera.time_to_clock(_value(fExpTime)), MAX_EXPOSURE_CLOCK)
+        _deref(pdwExposureClock).value = max(clock, 0)
+        return True
+
+    def StCam_GetClock(self, hCamera, pdwClockMode, pdwClock):
+        _deref(pdwClockMode).value = hCamera.clock_mode
+        _deref(pdwClock).value = int(PIXEL_CLOCK /
+                                     CLOCK_DIVIDERS[hCamera.clock_mode])
+        return True
+
+    def StCam_SetClock(self, hCamera, dwClockMode, dwClock):
+        mode = _value(dwClockMode)
+        if not 0 <= mode < len(CLOCK_DIVIDERS):
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        hCamera.clock_mode = mode
+        return True
+
+    def StCam_GetCameraGammaValue(self, hCamera, pwValue):
+        _deref(pwValue).value = hCamera.gamma
+        return True
+
+    def StCam_SetCameraGammaValue(self, hCamera, wValue):
+        hCamera.gamma = wValue
+        return True
+
+    def StCam_GetGammaModeEx(self, hCamera, byteGammaTarget, pbyteGammaMode,
+                             pwGamma, pshtBrightness, pbyteContrast,
+                             pbyteGammaTable):
+        target = _value(byteGammaTarget)
+        if not 0 <= target < GAMMA_TARGETS:
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        mode, gamma, brightness, contrast, table = \
+            hCamera.gamma_settings[target]
+        _deref(pbyteGammaMode).value = mode
+        _deref(pwGamma).value = gamma
+        _deref(pshtBrightness).value = brightness
+        _deref(pbyteContrast).value = contrast
+        memmove(addressof(_deref(pbyteGammaTable)), table, GAMMA_TABLE_SIZE)
+        return True
+
+    def StCam_SetGammaModeEx(self, hCamera, byteGammaTarget, byteGammaMode,
+                             wGamma, shtBrightness, byteContrast,
+                             pbyteGammaTable):
+        target = _value(byteGammaTarget)
+        mode = _value(byteGammaMode)
+        if not (0 <= target < GAMMA_TARGETS and 0 <= mode < GAMMA_MODES):
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        table = string_at(addressof(_deref(pbyteGammaTable)),
+                          GAMMA_TABLE_SIZE)
+        hCamera.gamma_settings[target] = (mode, _value(wGamma),
+                                          _value(shtBrightness),
+                                          _value(byteContrast), table)
+        return True
+
+    def StCam_TakeRawSnapShot(self, hCamera, pbyteBuffer, dwBufferSize,
+                              pdwNumberOfByteTrans, pdwFrameNo,
+                              dwMilliseconds):
+        if _value(dwBufferSize) < hCamera.raw_size:
+            return self._fail(hCamera, ERROR_INSUFFICIENT_BUFFER)
+        if not hCamera.next_frame(_value(dwMilliseconds) / 1000.0):
+            return self._fail(hCamera, ERROR_SEM_TIMEOUT)
+        _deref(pdwNumberOfByteTrans).value = hCamera.fill(
+            pbyteBuffer, _value(dwBufferSize))
+        _deref(pdwFrameNo).value = hCamera.frame_no
+        return True
+
+    def StCam_StartTransfer(self, hCamera):
+        hCamera.start_transfer()
+        return True
+
+    def StCam_StopTransfer(self, hCamera):
+        hCamera.stop_transfer()
+        return True
+
+    def StCam_AddRawCallback(self, hCamera, func, pvContext, pdwCallbackNo):
+        number = hCamera._next_callback
+        hCamera._next_callback += 1
+        hCamera.callbacks[number] = (func, pvContext)
+        _deref(pdwCallbackNo).value = number
+        return True
+
+    def StCam_RemoveRawCallback(self, hCamera, dwCallbackNo):
+        if hCamera.callbacks.pop(_value(dwCallbackNo), None) is None:
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        return True
+
+    def StCam_SetTriggerMode(self, hCamera, dwTriggerMode):
+        hCamera.trigger_mode = _value(dwTriggerMode)
+        return True
+
+    def StCam_GetTriggerMode(self, hCamera, pdwTriggerMode):
+        _deref(pdwTriggerMode).value = hCamera.trigger_mode
+        return True
+
+    # camera state kept in setting files
+    SETTINGS = ("scan_mode", "offset_x", "offset_y", "width", "height",
+                "pixel_format", "clock_mode", "gain", "gamma",
+                "exposure_clock", "trigger_mode")
+
+    def StCam_SaveSettingFileA(self, hCamera, pszFileName):
+        settings = dict((k, getattr(hCamera, k)) for k in self.SETTINGS)
+        try:
+            with open(_value(pszFileName), "w") as f:
+                json.dump(settings, f)
+        except IOError:
+            return self._fail(hCamera, ERROR_FILE_NOT_FOUND)
+        return True
+
+    def StCam_LoadSettingFileA(self, hCamera, pszFileName):
+        try:
+            with open(_value(pszFileName)) as f:
+                settings = json.load(f)
+        except (IOError, ValueError):
+            return self._fail(hCamera, ERROR_FILE_NOT_FOUND)
+        if set(settings) != set(self.SETTINGS):
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        for k, v in settings.items():
+            setattr(hCamera, k, v)
+        return True
+
+    def StCam_SoftTrigger(self, hCamera):
+        if not hCamera.triggered:
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        hCamera._triggers.release()
+        return True
+
+    def StCam_SaveImageA(self, hCamera, dwWidth, dwHeight,
+                         dwPreviewPixelFormat, pbyteData, pszFileName,
+                         dwParam):
+        """ Writes a binary PGM (mono) or PPM (color) file, whatever the file
+                extension.
+        """
+        bpp = BPP[PIXEL_FORMATS[_value(dwPreviewPixelFormat)]]
+        stride = dwWidth * bpp + hCamera.row_padding
+        data = string_at(pbyteData, stride * dwHeight)
+        rows = [data[y * stride:y * stride + dwWidth * bpp]
+                for y in range(dwHeight)]
+        pixels = b"".join(rows)
+        if bpp == 1:
+            magic = b"P5"
+        else:
+            magic = b"P6"
+            rgb = bytearray(dwWidth * dwHeight * 3)
+            for c in range(3):
+                rgb[c::3] = pixels[2 - c::bpp]
+            pixels = bytes(rgb)
+        try:
+            with open(pszFileName, "wb") as f:
+                f.write(magic + "\n{} {}\n255\n".format(dwWidth,
+                                                        dwHeight).encode())
+                f.write(pixels)
+        except (IOError, OSError):
+            return self._fail(hCamera, ERROR_INVALID_PARAMETER)
+        return True
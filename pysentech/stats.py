@@ -0,0 +1,258 @@
+"""
+stats.py
+
+Opt-in acquisition telemetry for Sentech cameras.  Enable it with
+    cam.enable_stats(); the camera then times each stage of acquisition:
+
+    snapshot         time inside StCam_TakeRawSnapShot
+    callback         copying a streamed frame out of the driver's buffer
+    method_overhead  python time in low-level StCam_* methods, outside the DLL
+    as_numpy, as_pil, demosaic, to_file
+                     frame conversions and saving
+
+Stage times go into fixed-bucket latency histograms.  Transfers, timeouts and
+    errors are counted and a rolling FPS is kept.  Read it all with
+    snapshot(), or as Prometheus text with to_prometheus().
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2,
+           2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histogram(object):
+    """
+    Latency histogram with fixed buckets.
+
+    args:
+        buckets (Optional[tuple]): sorted bucket upper bounds.  Larger values
+            go into an overflow bucket.
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """ Gets an upper bound for the q-th quantile (0-1): the bound of the
+                bucket it falls in, or max if that is lower.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        """ Gets (upper bound, count of values <= bound) pairs, ending with
+                float("inf").
+        """
+        pairs = []
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            pairs.append((bound, seen))
+        return pairs
+
+
+class AcquisitionStats(object):
+    """
+    Stage timings and counters for one camera.  Safe to update from the
+        capture thread and the consumer at once.
+
+    args:
+        buckets (Optional[tuple]): histogram bucket upper bounds in seconds
+        fps_frames (Optional[int]): number of recent transfers the rolling
+            FPS is measured over
+        labels (Optional[dict]): Prometheus labels for this camera
+    """
+    def __init__(self, buckets=BUCKETS, fps_frames=100, labels=None):
+        self.buckets = tuple(buckets)
+        self.fps_frames = fps_frames
+        self.labels = dict(labels or {})
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """ Clears every histogram and counter. """
+        with self._lock:
+            self.stages = {}
+            self.frames = 0
+            self.timeouts = 0
+            self.errors = 0
+            self._stamps = deque(maxlen=self.fps_frames)
+            self.started = time.perf_counter()
+
+    def observe(self, stage, seconds):
+        """ Records the time taken by a stage. """
+        with self._lock:
+            try:
+                hist = self.stages[stage]
+            except KeyError:
+                hist = self.stages[stage] = Histogram(self.buckets)
+            hist.observe(seconds)
+
+    def frame(self, timestamp):
+        """ Counts a completed transfer at host time timestamp. """
+        with self._lock:
+            self.frames += 1
+            self._stamps.append(timestamp)
+
+    def timeout(self):
+        """ Counts a transfer that failed or timed out. """
+        with self._lock:
+            self.timeouts += 1
+
+    def error(self):
+        """ Counts a call that raised. """
+        with self._lock:
+            self.errors += 1
+
+    def instrument(self, function, bind):
+        """ Builds a method that records its python overhead.
+
+        args:
+            function (function): the DLL function
+            bind (function): makes the method out of a function, see
+                camera.make_method
+
+        returns:
+            function: bind(function), timed.  The time spent outside function
+                is recorded as "method_overhead", and calls that raise are
+                counted as errors.
+        """
+        local = self._local
+        clock = time.perf_counter
+
+        def timed_function(*args):
+            t0 = clock()
+            try:
+                return function(*args)
+            finally:
+                local.inner = clock() - t0
+
+        inner = bind(timed_function)
+
+        def method(*args):
+            local.inner = 0.0
+            t0 = clock()
+            try:
+                return inner(*args)
+            except Exception:
+                self.error()
+                raise
+            finally:
+                self.observe("method_overhead", clock() - t0 - local.inner)
+        return method
+
+    @property
+    def fps(self):
+        """ Transfers per second over the last fps_frames transfers. """
+        stamps = self._stamps
+        if len(stamps) < 2 or stamps[-1] == stamps[0]:
+            return 0.0
+        return (len(stamps) - 1) / (stamps[-1] - stamps[0])
+
+    def snapshot(self):
+        """ Gets a copy of the current statistics.
+
+        returns:
+            dict: counters, fps and a summary of each stage in seconds:
+                {"count", "total", "mean", "p50", "p99", "max"}.  p50 and p99
+                are bucket upper bounds.
+        """
+        with self._lock:
+            stages = {}
+            for name, hist in self.stages.items():
+                stages[name] = {"count": hist.count,
+                                "total": hist.sum,
+                                "mean": hist.sum / hist.count,
+                                "p50": hist.quantile(0.5),
+                                "p99": hist.quantile(0.99),
+                                "max": hist.max}
+            return {"frames": self.frames,
+                    "timeouts": self.timeouts,
+                    "errors": self.errors,
+                    "fps": self.fps,
+                    "uptime": time.perf_counter() - self.started,
+                    "stages": stages}
+
+    def to_prometheus(self, prefix="pysentech"):
+        """ Gets the statistics in the Prometheus text exposition format.
+                See prometheus_text to export several cameras together.
+        """
+        return prometheus_text([self], prefix)
+
+
+def _labels(labels, **extra):
+    items = sorted(dict(labels, **extra).items())
+    if not items:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"'))
+                          for k, v in items) + "}"
+
+
+def prometheus_text(collectors, prefix="pysentech"):
+    """ Exports several AcquisitionStats (one per camera, with distinct
+            labels) in the Prometheus text exposition format.
+
+    args:
+        collectors (list): AcquisitionStats objects
+        prefix (Optional[str]): metric name prefix
+
+    returns:
+        str: metrics text
+    """
+    lines = []
+
+    def header(name, kind, text):
+        lines.append("# HELP {}_{} {}".format(prefix, name, text))
+        lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+
+    counters = [("frames_total", "frames", "Completed transfers."),
+                ("timeouts_total", "timeouts",
+                 "Transfers that failed or timed out."),
+                ("errors_total", "errors", "Calls that raised.")]
+    for name, attr, text in counters:
+        header(name, "counter", text)
+        for c in collectors:
+            lines.append("{}_{}{} {}".format(prefix, name, _labels(c.labels),
+                                             getattr(c, attr)))
+    header("fps", "gauge", "Rolling transfers per second.")
+    for c in collectors:
+        lines.append("{}_fps{} {!r}".format(prefix, _labels(c.labels), c.fps))
+
+    header("stage_seconds", "histogram", "Time spent in each acquisition "
+                                         "stage.")
+    for c in collectors:
+        with c._lock:
+            stages = sorted(c.stages.items())
+            for stage, hist in stages:
+                for bound, n in hist.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append("{}_stage_seconds_bucket{} {}".format(
+                        prefix, _labels(c.labels, stage=stage, le=le), n))
+                labels = _labels(c.labels, stage=stage)
+                lines.append("{}_stage_seconds_sum{} {!r}".format(
+                    prefix, labels, hist.sum))
+                lines.append("{}_stage_seconds_count{} {}".format(
+                    prefix, labels, hist.count))
+    return "\n".join(lines) + "\n"
@@ -7,8 +7,10 @@ Created on Mon Dec 07 21:55:57 2015
 
 from ctypes import *
 
+from .error import SentechSystemError
 from .sentechdll import SentechDLL
 from .camera import SentechCamera
+from .group import SentechCameraGroup
 
 
 class SentechSystem(object):
@@ -18,9 +20,24 @@ class SentechSystem(object):
     -------
     >>> system = SentechSystem("sentech/sdk/folder")
     >>> camera = system.get_camera(0)
+
+    args:
+        sdk_folder (Optional[str]): Sentech SDK folder, see SentechDLL
+        backend (Optional[str]): "dll" for the real StCamD.dll, "sim" for
+            simulated cameras or "replay" to replay a recording as a camera
+        **kwargs: passed to the backend, see SimulatedDLL and ReplayDLL
     """
-    def __init__(self, sdk_folder=""):
-        self.dll = SentechDLL(sdk_folder)
+    def __init__(self, sdk_folder="", backend="dll", **kwargs):
+        if backend == "dll":
+            self.dll = SentechDLL(sdk_folder, **kwargs)
+        elif backend == "sim":
+            from .simulator import SimulatedDLL
+            self.dll = SimulatedDLL(**kwargs)
+        elif backend == "replay":
+            from .replay import ReplayDLL
+            self.dll = ReplayDLL(**kwargs)
+        else:
+            raise SentechSystemError("Unknown backend: {}".format(backend))
         
     def camera_count(self):
         """ Gets the number of connected cameras.
@@ -37,6 +54,32 @@ class SentechSystem(object):
             index (int): camera index
         """
         return SentechCamera(index, self.dll)
+
+    def open_all(self, **kwargs):
+        """ Opens every connected camera as a group that grabs from all of
+                them in parallel.
+
+        args:
+            **kwargs: passed to SentechCameraGroup
+
+        returns:
+            SentechCameraGroup: group of all connected cameras
+
+        raises:
+            SentechSystemError: no cameras are connected
+        """
+        count = self.camera_count()
+        if not count:
+            raise SentechSystemError("No cameras are connected.")
+        cameras = []
+        try:
+            for i in range(count):
+                cameras.append(self.get_camera(i))
+            return SentechCameraGroup(cameras, **kwargs)
+        except Exception:
+            for cam in cameras:
+                cam.release()
+            raise
         
 if __name__ == "__main__":
     sdk_folder = r"C:\Users\derricw\Downloads\StandardSDK(v3.08)\StandardSDK(v3.08)"
@@ -15,7 +15,6 @@ setup(name="pysentech",
           'License :: OSI Approved :: MIT License',
           'Operating System :: Microsoft :: Windows',
           'Natural Language :: English',
-          'Programming Language :: Python :: 2.7',
           'Programming Language :: Python :: 3.5',
           'Programming Language :: Python :: 3.6',
           'Topic :: Multimedia :: Graphics :: Capture :: Digital Camera',
@@ -27,5 +26,6 @@ setup(name="pysentech",
       download_url="https://github.com/derricw/pysentech/tarball/0.2",
       license='MIT',
       packages=['pysentech'],
+      python_requires='>=3.5',
       zip_safe=False,
 )
\ No newline at end of file
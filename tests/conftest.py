@@ -0,0 +1,13 @@
+import pytest
+
+from pysentech import SentechSystem
+
+
+@pytest.fixture
+def camera():
+    """ A simulated camera that serves frames as fast as they are asked for.
+    """
+    system = SentechSystem(backend="sim", width=64, height=48, fps=0)
+    cam = system.get_camera(0)
+    yield cam
+    cam.release()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from pysentech.error import SentechError
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_grab_frame_async(camera):
+    async def grab():
+        frame = await camera.grab_frame_async()
+        number = frame.frame_number
+        frame.release()
+        return number
+
+    assert run(grab()) == 1
+
+
+def test_grab_frame_async_timeout(camera):
+    camera.set_trigger("software")
+
+    async def grab():
+        for _ in range(6):
+            with pytest.raises(SentechError):
+                await camera.grab_frame_async(timeout_ms=10)
+        camera.set_trigger("free_run")
+        frame = await camera.grab_frame_async()
+        frame.release()
+        return frame
+
+    frame = run(grab())
+    assert frame.frame_number is not None
+    pool = camera._aio.pool
+    assert pool.available == len(pool)
+    assert camera.buffer_count == 0  # grab_frame's buffers are untouched
+
+
+def test_stream(camera):
+    async def take(n):
+        numbers = []
+        async for frame in camera.stream():
+            numbers.append(frame.frame_number)
+            if len(numbers) == n:
+                break
+        return numbers
+
+    numbers = run(take(3))
+    assert numbers == sorted(numbers)
+    assert len(set(numbers)) == 3
+
+
+def test_grab_frame_async_in_new_loop(camera):
+    async def grab_several():
+        # more requests than max_pending, so some wait on the semaphore
+        frames = await asyncio.gather(
+            *[camera.grab_frame_async() for _ in range(4)])
+        for frame in frames:
+            frame.release()
+        return max(frame.frame_number for frame in frames)
+
+    first = run(grab_several())
+    assert run(grab_several()) > first
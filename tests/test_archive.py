@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+from pysentech import SentechSystem
+from pysentech.archive import ArchiveReader, ArchiveWriter
+
+
+@pytest.mark.parametrize("pixel_format", ["Mono8", "BGR24"])
+def test_round_trip(tmpdir, pixel_format):
+    system = SentechSystem(backend="sim", width=64, height=48, fps=0,
+                           row_padding=8, pixel_format=pixel_format)
+    cam = system.get_camera(0)
+    cam.allocate_buffers(3)
+    frames = [cam.grab_frame() for _ in range(3)]
+    path = os.path.join(str(tmpdir), "frames.raw")
+    with ArchiveWriter.for_frame(path, frames[0]) as writer:
+        for frame in frames:
+            writer.write(frame)
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 3
+        assert (reader.width, reader.height) == (64, 48)
+        assert reader.pixel_format == pixel_format
+        assert reader.stride == frames[0].stride
+        assert reader[1].shape == frames[1].as_numpy().shape
+        for i, frame in enumerate(frames):
+            assert np.array_equal(reader[i], frame.as_numpy())
+            assert bytes(reader.raw(i)) == bytes(frame.as_array())
+        assert reader[0:2].shape == (2,) + frames[0].as_numpy().shape
+        with pytest.raises(IndexError):
+            reader.raw(3)
+    cam.release()
+
+
+def test_wrong_frame_size(tmpdir):
+    path = os.path.join(str(tmpdir), "frames.raw")
+    with ArchiveWriter(path, 4, 2, "Mono8", 8) as writer:
+        with pytest.raises(ValueError):
+            writer.write_buffer(bytearray(9))
+
+
+def test_not_an_archive(tmpdir):
+    path = os.path.join(str(tmpdir), "frames.raw")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 100)
+    with pytest.raises(IOError):
+        ArchiveReader(path)
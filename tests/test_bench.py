@@ -0,0 +1,15 @@
+import tracemalloc
+
+from pysentech.bench import measure_allocations
+
+
+def test_measure_allocations():
+    peak, _ = measure_allocations(lambda: bytearray(10000), 20)
+    assert peak >= 10000
+
+
+def test_measure_allocations_without_reset_peak(monkeypatch):
+    # python < 3.9
+    monkeypatch.delattr(tracemalloc, "reset_peak", raising=False)
+    peak, _ = measure_allocations(lambda: bytearray(10000), 20)
+    assert peak >= 0
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from pysentech.capture import FrameQueue
+
+
+@pytest.fixture
+def frames(camera):
+    camera.allocate_buffers(4)
+    return [camera.grab_frame() for _ in range(4)]
+
+
+def test_invalid_queue():
+    with pytest.raises(ValueError):
+        FrameQueue(0)
+    with pytest.raises(ValueError):
+        FrameQueue(2, policy="newest")
+
+
+def test_fifo(frames):
+    queue = FrameQueue(4)
+    for frame in frames:
+        assert queue.put(frame)
+    assert [queue.get(timeout=0) for _ in frames] == frames
+    assert queue.get(timeout=0) is None
+
+
+def test_drop_oldest(camera, frames):
+    queue = FrameQueue(2, policy="drop_oldest")
+    for frame in frames[:3]:
+        assert queue.put(frame)
+    assert queue.dropped == 1
+    assert camera._pool.available == 1  # the oldest went back to the pool
+    assert queue.get(timeout=0) is frames[1]
+    assert queue.get(timeout=0) is frames[2]
+
+
+def test_drop_newest(camera, frames):
+    queue = FrameQueue(2, policy="drop_newest")
+    assert queue.put(frames[0])
+    assert queue.put(frames[1])
+    assert not queue.put(frames[2])
+    assert queue.dropped == 1
+    assert camera._pool.available == 1  # the new frame went back
+    assert queue.get(timeout=0) is frames[0]
+    assert queue.get(timeout=0) is frames[1]
+
+
+def test_block_times_out(camera, frames):
+    queue = FrameQueue(1, policy="block")
+    assert queue.put(frames[0])
+    assert not queue.put(frames[1], timeout=0.01)
+    assert queue.dropped == 0
+    assert camera._pool.available == 0  # still belongs to the caller
+
+
+def test_block_waits_for_space(frames):
+    queue = FrameQueue(1, policy="block")
+    queue.put(frames[0])
+    timer = threading.Timer(0.05, queue.get)
+    timer.start()
+    assert queue.put(frames[1], timeout=5.0)
+    timer.join()
+    assert queue.get(timeout=0) is frames[1]
+
+
+def test_clear_releases(camera, frames):
+    queue = FrameQueue(4)
+    for frame in frames:
+        queue.put(frame)
+    queue.clear()
+    assert len(queue) == 0
+    assert camera._pool.available == 4
+
+
+def test_capture_thread(camera):
+    camera.start_capture(queue_size=2, policy="drop_oldest")
+    try:
+        frame = camera.get_frame(timeout=5.0)
+        assert frame is not None
+        frame.release()
+    finally:
+        camera.stop_capture()
+    assert camera.capture_stats["captured"] >= 1
+
+
+def test_capture_leaves_grab_frame_buffers_alone(camera):
+    camera.start_capture(queue_size=2)
+    with pytest.raises(RuntimeError):
+        camera.grab_frame()
+    with pytest.raises(RuntimeError):
+        camera.grab_frames(2)
+    camera.stop_capture()
+    assert camera.buffer_count == 0
+    for _ in range(6):
+        assert camera.grab_frame() is camera.frame
+
+
+def test_streaming(camera):
+    camera.start_streaming(queue_size=2)
+    try:
+        frame = camera.get_frame(timeout=5.0)
+        assert frame is not None
+        assert frame.pool is not None
+        frame.release()
+    finally:
+        camera.stop_streaming()
+    assert camera.buffer_count == 0
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from pysentech import SentechSystem
+from pysentech.color import (BAYER_PATTERNS, DEMOSAIC_METHODS, bgr_to_rgb,
+                             demosaic)
+
+
+def mosaic(bgr, pattern):
+    """ Samples a BGR image through a Bayer color filter array. """
+    channel = {"B": 0, "G": 1, "R": 2}
+    raw = np.empty(bgr.shape[:-1], dtype=np.uint8)
+    for i, c in enumerate(pattern):
+        raw[..., i // 2::2, i % 2::2] = bgr[..., i // 2::2, i % 2::2,
+                                            channel[c]]
+    return raw
+
+
+@pytest.mark.parametrize("pattern", BAYER_PATTERNS)
+@pytest.mark.parametrize("method", DEMOSAIC_METHODS)
+def test_flat_color(pattern, method):
+    bgr = np.empty((16, 20, 3), dtype=np.uint8)
+    bgr[...] = (30, 120, 210)
+    result = demosaic(mosaic(bgr, pattern), pattern, method)
+    assert result.shape == (16, 20, 3)
+    assert np.array_equal(result, bgr)
+
+
+@pytest.mark.parametrize("method", DEMOSAIC_METHODS)
+def test_stack_matches_single_frames(method):
+    rng = np.random.RandomState(0)
+    raw = rng.randint(0, 256, size=(3, 8, 12)).astype(np.uint8)
+    stack = demosaic(raw, "GRBG", method)
+    for i in range(3):
+        assert np.array_equal(stack[i], demosaic(raw[i], "GRBG", method))
+
+
+def test_order_and_out():
+    bgr = np.empty((4, 4, 3), dtype=np.uint8)
+    bgr[...] = (1, 2, 3)
+    raw = mosaic(bgr, "RGGB")
+    out = np.empty((4, 4, 3), dtype=np.uint8)
+    assert demosaic(raw, "RGGB", order="RGB", out=out) is out
+    assert (out == (3, 2, 1)).all()
+    assert np.array_equal(bgr_to_rgb(bgr), out)
+
+
+def test_invalid_arguments():
+    raw = np.zeros((4, 4), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        demosaic(raw, "RGBG")
+    with pytest.raises(ValueError):
+        demosaic(raw, "RGGB", method="nearest")
+    with pytest.raises(ValueError):
+        demosaic(raw, "RGGB", order="GBR")
+
+
+def test_frame_demosaic():
+    system = SentechSystem(backend="sim", width=64, height=48, fps=0,
+                           color_array="RGGB")
+    cam = system.get_camera(0)
+    assert cam.color_array == "RGGB"
+    frame = cam.grab_frame()
+    bgr = frame.demosaic()
+    assert bgr.shape == (48, 64, 3)
+    assert np.array_equal(bgr, demosaic(frame.as_numpy(), "RGGB"))
+    cam.pixel_format = "BGR24"
+    with pytest.raises(ValueError):
+        cam.grab_frame().demosaic()
+    cam.release()
+
+
+def test_mono_frame_demosaic(camera):
+    with pytest.raises(ValueError):
+        camera.grab_frame().demosaic()
+
+
+def test_pil_is_rgb(camera):
+    camera.pixel_format = "BGR24"
+    frame = camera.grab_frame()
+    image = frame.as_pil()
+    assert image.mode == "RGB"
+    assert np.array_equal(np.asarray(image), bgr_to_rgb(frame.as_numpy()))
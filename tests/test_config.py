@@ -0,0 +1,91 @@
+import pytest
+
+from pysentech.error import SentechError
+
+
+def spy(camera):
+    """ Records the names of the DLL functions the camera calls. """
+    calls = []
+    get_function = camera.dll.get_function
+
+    def recording(name):
+        function = get_function(name)
+
+        def call(*args):
+            calls.append(name)
+            return function(*args)
+        return call
+
+    camera.dll.get_function = recording
+    camera._unbind_methods()
+    return calls
+
+
+def test_configure(camera):
+    with camera.configure() as cfg:
+        cfg.pixel_format = "BGR24"
+        cfg.image_shape = (32, 16)
+        cfg.image_offsets = (8, 4)
+        cfg.gain = 20
+        assert cfg.gain == 20
+        assert cfg.pixel_format == "BGR24"
+    assert camera.pixel_format == "BGR24"
+    assert camera.image_shape == (32, 16)
+    assert camera.scan_mode == "roi"
+    assert camera.gain == 20
+    frame = camera.grab_frame()
+    assert frame.as_numpy().shape == (16, 32, 3)
+
+
+def test_configure_order(camera):
+    calls = spy(camera)
+    camera.configure(trigger_mode="free_run", gamma=120, gain=5,
+                     exposure=0.002, image_shape=(32, 16),
+                     pixel_format="BGR32").apply()
+    sets = [c for c in calls if c.startswith("StCam_Set")]
+    assert sets == ["StCam_SetPreviewPixelFormat", "StCam_SetImageSize",
+                    "StCam_SetExposureClock", "StCam_SetGain",
+                    "StCam_SetCameraGammaValue", "StCam_SetTriggerMode"]
+
+
+def test_unchanged_window_is_not_sent(camera):
+    calls = spy(camera)
+    camera.configure(pixel_format=camera.pixel_format,
+                     image_shape=camera.image_shape).apply()
+    assert "StCam_SetImageSize" not in calls
+    assert "StCam_SetPreviewPixelFormat" not in calls
+
+
+def test_rollback(camera):
+    frame = camera.frame
+    with pytest.raises(SentechError):
+        camera.configure(pixel_format="BGR24", image_shape=(32, 16),
+                         gain=100000).apply()
+    assert camera.pixel_format == "Mono8"
+    assert camera.image_shape == (64, 48)
+    assert camera._query_geometry()[3:] == (64, 48)
+    assert camera.frame.bpi == frame.bpi
+    assert camera.grab_frame().as_numpy().shape == (48, 64)
+
+
+def test_validation(camera):
+    calls = spy(camera)
+    for settings in ({"pixel_format": "RGB"}, {"scan_mode": "zoom"},
+                     {"trigger_mode": "sometimes"},
+                     {"gamma_mode": "maybe"}):
+        with pytest.raises(KeyError):
+            camera.configure(**settings).apply()
+    with pytest.raises(ValueError):
+        camera.configure(exposure=0.01, exposure_clock=100).apply()
+    with pytest.raises(AttributeError):
+        camera.configure(brightness=3)
+    assert not [c for c in calls if c.startswith("StCam_Set")]
+
+
+def test_configure_while_capturing(camera):
+    camera.start_capture()
+    try:
+        with pytest.raises(RuntimeError):
+            camera.configure(gain=1).apply()
+    finally:
+        camera.stop_capture()
@@ -0,0 +1,55 @@
+import pytest
+
+from pysentech.exposure import ExposureTable
+
+
+def test_table_interpolates():
+    table = ExposureTable([0, 10, 20], [0.0, 1.0, 3.0])
+    assert table.to_seconds(5) == pytest.approx(0.5)
+    assert table.to_seconds(15) == pytest.approx(2.0)
+    assert table.to_clock(2.0) == 15
+    # clamped to the sampled range
+    assert table.to_seconds(-1) == 0.0
+    assert table.to_seconds(100) == 3.0
+    assert table.to_clock(10.0) == 20
+    assert (table.max_clock, table.max_seconds) == (20, 3.0)
+
+
+def test_invalid_table():
+    with pytest.raises(ValueError):
+        ExposureTable([], [])
+    with pytest.raises(ValueError):
+        ExposureTable([0, 1], [0.0])
+
+
+def test_table_matches_driver(camera):
+    table = camera.exposure_table
+    for clock in (0, 1, 7, 100, 1000, 12345, table.max_clock):
+        seconds = camera.handle.clock_to_time(clock)
+        assert table.to_seconds(clock) == pytest.approx(seconds, rel=1e-6)
+        assert table.to_clock(seconds) == clock
+
+
+def test_exposure_uses_table(camera):
+    table = camera.exposure_table
+    camera.exposure = 0.002
+    assert camera.exposure == pytest.approx(0.002, rel=1e-2)
+    assert camera.exposure_table is table  # not rebuilt
+    assert camera.max_exposure == table.max_seconds
+
+
+def test_table_is_rebuilt(camera):
+    table = camera.exposure_table
+    camera.image_shape = (32, 16)
+    assert camera.exposure_table is not table
+    table = camera.exposure_table
+    camera.clock_mode = "div_2"
+    assert camera.clock_mode == "div_2"
+    assert camera.exposure_table is not table
+    assert camera.max_exposure == pytest.approx(2 * table.max_seconds,
+                                                rel=1e-6)
+
+
+def test_invalid_clock_mode(camera):
+    with pytest.raises(KeyError):
+        camera.clock_mode = "fast"
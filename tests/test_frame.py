@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from pysentech import SentechSystem
+from pysentech.frame import _SentechFrame
+
+
+@pytest.mark.parametrize("pixel_format,channels", [("Mono8", None),
+                                                   ("BGR24", 3),
+                                                   ("BGR32", 4)])
+def test_as_numpy_shape(camera, pixel_format, channels):
+    camera.pixel_format = pixel_format
+    image = camera.grab_frame().as_numpy()
+    shape = (48, 64) if channels is None else (48, 64, channels)
+    assert image.shape == shape
+    assert image.dtype == np.uint8
+
+
+def test_as_numpy_is_cached_view(camera):
+    frame = camera.grab_frame()
+    assert frame.as_numpy() is frame.as_numpy()
+    assert np.shares_memory(frame.as_numpy(), np.frombuffer(frame._array,
+                                                            np.uint8))
+
+
+def test_row_padding():
+    system = SentechSystem(backend="sim", width=64, height=48, fps=0,
+                           row_padding=16)
+    cam = system.get_camera(0)
+    frame = cam.grab_frame()
+    assert frame.stride == 80
+    image = frame.as_numpy()
+    assert image.shape == (48, 64)
+    assert image.strides == (80, 1)
+    raw = np.frombuffer(frame._array, np.uint8).reshape(48, 80)
+    assert (image == raw[:, :64]).all()
+    cam.release()
+
+
+def test_trailing_padding_is_not_row_padding(camera):
+    frame = _SentechFrame(64, 48, 64 * 48 + 100, camera)
+    assert frame.stride == 64
+    assert frame.as_numpy().shape == (48, 64)
+    assert frame.as_numpy().strides == (64, 1)
+
+
+def test_rows_padding_that_divides_evenly(camera):
+    frame = _SentechFrame(64, 48, 66 * 48, camera)
+    assert frame.stride == 66
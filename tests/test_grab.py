@@ -0,0 +1,79 @@
+import pytest
+
+from pysentech.error import SentechError, SentechBufferError
+
+
+def test_grab_frame(camera):
+    frame = camera.grab_frame()
+    assert frame.frame_number == 1
+    assert frame.bytes_transferred == camera.image_size
+    assert frame.skipped == 0
+
+
+def test_grab_frame_timeout_raises(camera):
+    camera.set_trigger("software")  # no trigger, so nothing arrives
+    with pytest.raises(SentechError):
+        camera.grab_frame(timeout_ms=10)
+
+
+def test_grab_frame_timeout_releases_pooled_frame(camera):
+    camera.allocate_buffers(2)
+    camera.set_trigger("software")
+    for _ in range(4):
+        with pytest.raises(SentechError):
+            camera.grab_frame(timeout_ms=10)
+    assert camera._pool.available == 2
+    camera.set_trigger("free_run")
+    frame = camera.grab_frame()
+    assert frame.frame_number is not None
+    frame.release()
+
+
+def test_grab_frame_error_in_hand_out_releases_pooled_frame(camera):
+    class Failing(object):
+        def update(self, frame):
+            raise RuntimeError("update failed")
+
+    camera.allocate_buffers(2)
+    camera.auto_exposure = Failing()
+    with pytest.raises(RuntimeError):
+        camera.grab_frame()
+    assert camera._pool.available == 2
+
+
+def test_pool_accounting(camera):
+    camera.allocate_buffers(3)
+    pool = camera._pool
+    frames = [camera.grab_frame() for _ in range(3)]
+    assert pool.available == 0
+    assert len(set(id(f) for f in frames)) == 3
+    with pytest.raises(SentechBufferError):
+        camera.grab_frame()
+    frames[0].release()
+    frames[0].release()  # releasing twice is harmless
+    assert pool.available == 1
+    frame = camera.grab_frame()
+    assert frame is frames[0]
+    for f in frames:
+        f.release()
+    assert pool.available == 3
+
+
+def test_pool_rejects_foreign_frames(camera):
+    camera.allocate_buffers(1)
+    pool = camera._pool
+    camera.allocate_buffers(1)
+    with pytest.raises(ValueError):
+        pool.release(camera._pool.frames[0])
+
+
+def test_frame_gap(camera):
+    camera.allocate_buffers(2)
+    first = camera.grab_frame()
+    first.release()
+    camera.handle.frame_no += 3  # three frames go by unseen
+    second = camera.grab_frame()
+    assert second.skipped == 3
+    assert camera.frames_skipped == 3
+    assert camera._frame_gap(None) == 0
+    second.release()
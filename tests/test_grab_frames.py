@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from pysentech.error import SentechError
+
+
+def test_grab_frames(camera):
+    images, numbers = camera.grab_frames(5)
+    assert images.shape == (5, 48, 64)
+    assert list(numbers) == [1, 2, 3, 4, 5]
+    # the synthetic pattern scrolls, so consecutive frames differ
+    assert not np.array_equal(images[0], images[1])
+
+
+def test_grab_frames_into_out(camera):
+    camera.pixel_format = "BGR24"
+    images, _ = camera.grab_frames(3)
+    again, numbers = camera.grab_frames(3, out=images)
+    assert again is images
+    assert list(numbers) == [4, 5, 6]
+
+
+def test_grab_frames_rejects_bad_out(camera):
+    with pytest.raises(ValueError):
+        camera.grab_frames(2, out=np.empty((2, 48, 63), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        camera.grab_frames(2, out=np.empty((3, 48, 64), dtype=np.uint8))
+
+
+def test_grab_frames_matches_grab_frame(camera):
+    images, numbers = camera.grab_frames(2)
+    camera.handle.frame_no = int(numbers[0]) - 1  # serve the same frame again
+    frame = camera.grab_frame()
+    assert np.array_equal(frame.as_numpy(), images[0])
+
+
+def test_grab_frames_timeout(camera):
+    camera.set_trigger("software")
+    with pytest.raises(SentechError):
+        camera.grab_frames(2, timeout_ms=10)
@@ -0,0 +1,40 @@
+import mmap
+
+import numpy as np
+import pytest
+
+
+def test_grab_into_numpy(camera):
+    out = np.zeros((48, 64), dtype=np.uint8)
+    frame = camera.grab_frame(out=out)
+    assert frame.pool is None
+    assert np.shares_memory(frame.as_numpy(), out)
+    assert np.array_equal(frame.as_numpy(), out)
+    assert out.any()
+
+
+def test_grab_into_bytearray(camera):
+    out = bytearray(camera.image_size + 10)
+    frame = camera.grab_frame(out=out)
+    assert frame.bytes_transferred == camera.image_size
+    assert bytes(out[:camera.image_size]) == bytes(frame.as_array())
+
+
+def test_grab_into_mmap(camera):
+    out = mmap.mmap(-1, camera.image_size)
+    frame = camera.grab_frame(out=out)
+    assert out[:] == bytes(frame.as_array())
+    del frame
+
+
+def test_grab_into_small_buffer(camera):
+    with pytest.raises(ValueError):
+        camera.grab_frame(out=bytearray(camera.image_size - 1))
+
+
+def test_grab_into_buffer_leaves_pool_alone(camera):
+    camera.allocate_buffers(1)
+    out = bytearray(camera.image_size)
+    frames = [camera.grab_frame(out=out) for _ in range(3)]
+    assert camera._pool.available == 1
+    assert frames[-1].frame_number == 3
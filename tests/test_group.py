@@ -0,0 +1,60 @@
+import pytest
+
+from pysentech import SentechSystem, SentechCameraGroup
+from pysentech.error import SentechError, SentechSystemError
+
+
+@pytest.fixture
+def group():
+    system = SentechSystem(backend="sim", camera_count=3, width=64, height=48,
+                           fps=0)
+    group = system.open_all()
+    for cam in group:
+        cam.allocate_buffers(2)
+    yield group
+    group.release()
+
+
+def test_grab(group):
+    frameset = group.grab()
+    assert len(frameset) == 3
+    assert frameset.matched
+    frameset.release()
+
+
+def test_failed_grab_releases_other_frames(group):
+    group[1].set_trigger("software")
+    for _ in range(3):
+        with pytest.raises(SentechError):
+            group.grab(timeout_ms=10)
+    assert [cam._pool.available for cam in group] == [2, 2, 2]
+
+
+def test_open_all_without_cameras():
+    system = SentechSystem(backend="sim", camera_count=0)
+    with pytest.raises(SentechSystemError):
+        system.open_all()
+
+
+def test_empty_group():
+    with pytest.raises(ValueError):
+        SentechCameraGroup([])
+
+
+def test_open_all_releases_cameras_on_failure(monkeypatch):
+    system = SentechSystem(backend="sim", camera_count=3, width=64, height=48)
+    opened = []
+    get_camera = system.get_camera
+
+    def failing_get_camera(index):
+        if index == 2:
+            raise SentechSystemError("camera 2 is gone")
+        cam = get_camera(index)
+        opened.append(cam)
+        return cam
+
+    monkeypatch.setattr(system, "get_camera", failing_get_camera)
+    with pytest.raises(SentechSystemError):
+        system.open_all()
+    assert len(opened) == 2
+    assert all(not hasattr(cam, "frame") for cam in opened)
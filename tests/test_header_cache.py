@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from pysentech import sentechdll
+from pysentech.sentechdll import load_header, parse_constants, parse_functions
+from pysentech.simulator import HEADER
+
+
+@pytest.fixture
+def header(tmpdir):
+    path = os.path.join(str(tmpdir), "StCamD.h")
+    with open(path, "w") as f:
+        f.write(HEADER)
+    return path
+
+
+def test_load_header(tmpdir, header):
+    constants, functions = load_header(header, str(tmpdir.join("cache")))
+    lines = HEADER.splitlines()
+    assert constants == parse_constants(lines)
+    assert functions == parse_functions(lines)
+    assert functions["StCam_SetGain"] == {"arg_types": ["HANDLE", "WORD"],
+                                          "arg_names": ["hCamera", "wGain"],
+                                          "ret_type": "BOOL"}
+
+
+def test_cached_header_is_not_parsed(tmpdir, header, monkeypatch):
+    cache = str(tmpdir.join("cache"))
+    expected = load_header(header, cache)
+
+    def fail(lines):
+        raise AssertionError("parsed again")
+
+    monkeypatch.setattr(sentechdll, "parse_functions", fail)
+    assert load_header(header, cache) == expected
+
+
+def test_changed_header_is_parsed_again(tmpdir, header):
+    cache = str(tmpdir.join("cache"))
+    load_header(header, cache)
+    with open(header, "a") as f:
+        f.write("#define PYSENTECH_TEST 0x0042\n")
+    os.utime(header, (0, 0))
+    constants, _ = load_header(header, cache)
+    assert constants["PYSENTECH_TEST"] == 0x42
+
+
+def test_unwritable_cache(tmpdir, header):
+    blocker = str(tmpdir.join("blocker"))
+    with open(blocker, "w") as f:
+        f.write("not a folder")
+    constants, functions = load_header(header, os.path.join(blocker, "cache"))
+    assert "StCam_Open" in functions
+
+
+def test_methods_are_bound_on_first_use(camera):
+    assert "StCam_GetGain" not in camera.__dict__
+    assert "StCam_GetGain" in dir(camera)
+    method = camera.StCam_GetGain
+    assert camera.__dict__["StCam_GetGain"] is method
+    with pytest.raises(AttributeError):
+        camera.StCam_NotAFunction
@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from pysentech.error import SentechError
+from pysentech.profile import diff_profile, load_profile
+
+
+def test_profile_round_trip(tmpdir, camera):
+    path = os.path.join(str(tmpdir), "cam.json")
+    camera.configure(pixel_format="BGR24", image_shape=(32, 16), gain=20,
+                     gamma_mode="on", gamma=120).apply()
+    saved = camera.get_profile()
+    camera.save_profile(path)
+    with open(path) as f:
+        assert json.load(f)["settings"]["gain"] == 20
+
+    camera.StCam_ResetSetting()
+    camera.refresh_settings()
+    changes = camera.load_profile(path)
+    assert set(changes) >= {"pixel_format", "image_shape", "gain",
+                            "gamma_mode", "gamma"}
+    assert camera.get_profile() == saved
+    assert camera.grab_frame().as_numpy().shape == (16, 32, 3)
+    assert camera.load_profile(path) == {}
+
+
+def test_apply_profile_writes_only_changes(camera):
+    profile = camera.get_profile()
+    profile["gain"] = 7
+    assert camera.apply_profile(profile) == {"gain": 7}
+    assert camera.gain == 7
+
+
+def test_diff_profile():
+    live = {"gain": 1, "image_shape": (64, 48)}
+    assert diff_profile({"gain": 1, "image_shape": [64, 48]}, live) == {}
+    assert diff_profile({"gain": 2}, live) == {"gain": 2}
+
+
+def test_unsupported_version(tmpdir):
+    path = os.path.join(str(tmpdir), "cam.json")
+    with open(path, "w") as f:
+        json.dump({"version": 99, "settings": {}}, f)
+    with pytest.raises(IOError):
+        load_profile(path)
+
+
+def test_setting_files(tmpdir, camera):
+    path = os.path.join(str(tmpdir), "cam.cfg")
+    camera.configure(pixel_format="BGR32", image_shape=(32, 16),
+                     gain=30).apply()
+    camera.save_settings(path)
+    camera.StCam_ResetSetting()
+    camera.refresh_settings()
+    camera.load_settings(path)
+    assert camera.pixel_format == "BGR32"
+    assert camera.image_shape == (32, 16)
+    assert camera.gain == 30
+    assert camera.frame.bpi == camera.image_size
+    with pytest.raises(SentechError):
+        camera.load_settings(os.path.join(str(tmpdir), "missing.cfg"))
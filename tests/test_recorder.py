@@ -0,0 +1,50 @@
+import csv
+import os
+import time
+
+import numpy as np
+
+from pysentech import SentechSystem
+from pysentech.archive import ArchiveReader
+
+
+def test_record_round_trip(tmpdir, camera):
+    path = os.path.join(str(tmpdir), "session.raw")
+    with camera.record(path, chunk_bytes=64 + 4 * camera.image_size) as rec:
+        while rec.frames_written < 10:
+            time.sleep(0.01)
+    assert rec.errors == 0
+    assert not camera.capturing
+    assert camera.buffer_count == 0
+
+    with open(os.path.join(str(tmpdir), "session.csv")) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == rec.frames_written
+    numbers = [int(row["frame_number"]) for row in rows]
+    assert numbers == sorted(numbers)
+
+    chunks = sorted(name for name in os.listdir(str(tmpdir))
+                    if name.endswith(".raw"))
+    assert len(chunks) == (rec.frames_written + 3) // 4  # 4 frames a chunk
+    readers = [ArchiveReader(os.path.join(str(tmpdir), name))
+               for name in chunks]
+    assert sum(len(r) for r in readers) == rec.frames_written
+    for row in rows:
+        reader = readers[chunks.index(row["file"])]
+        index = (int(row["offset"]) - reader.header_size) // reader.bpi
+        assert reader[index].shape == (48, 64)
+    for reader in readers:
+        reader.close()
+
+
+def test_replay_matches_recording(tmpdir, camera):
+    path = os.path.join(str(tmpdir), "session.raw")
+    with camera.record(path) as rec:
+        while rec.frames_written < 5:
+            time.sleep(0.01)
+    reader = ArchiveReader(os.path.join(str(tmpdir), "session.0000.raw"))
+    replay = SentechSystem(backend="replay", path=path, speed=0).get_camera(0)
+    for i in range(len(reader)):
+        assert np.array_equal(replay.grab_frame().as_numpy(), reader[i])
+    replay.release()
+    reader.close()
@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+
+from pysentech import SentechSystem
+from pysentech.error import SentechEndOfRecording, SentechError
+from pysentech.recorder import _RawChunkWriter
+
+
+@pytest.fixture
+def recording(tmpdir):
+    system = SentechSystem(backend="sim", width=64, height=48, fps=200)
+    cam = system.get_camera(0)
+    path = os.path.join(str(tmpdir), "rec.raw")
+    with cam.record(path) as recorder:
+        while recorder.frames_written < 5:
+            time.sleep(0.01)
+    cam.release()
+    return path, recorder.frames_written
+
+
+def test_end_of_recording(recording):
+    path, count = recording
+    cam = SentechSystem(backend="replay", path=path, speed=0).get_camera(0)
+    frames = [cam.grab_frame().frame_number for _ in range(count)]
+    assert len(frames) == count
+    with pytest.raises(SentechEndOfRecording) as info:
+        cam.grab_frame()
+    assert isinstance(info.value, SentechError)
+    assert isinstance(info.value, EOFError)
+    cam.release()
+
+
+def test_loop(recording):
+    path, count = recording
+    cam = SentechSystem(backend="replay", path=path, speed=0,
+                        loop=True).get_camera(0)
+    for _ in range(count + 2):
+        cam.grab_frame()
+    cam.release()
+
+
+def test_layout_change_is_rejected(tmpdir):
+    system = SentechSystem(backend="sim", width=64, height=48, fps=0)
+    cam = system.get_camera(0)
+    path = os.path.join(str(tmpdir), "rec.raw")
+    writer = _RawChunkWriter(path, 1 << 30)
+    for _ in range(2):
+        writer.write(cam.grab_frame())
+    cam.pixel_format = "BGR32"  # the writer starts a new chunk
+    for _ in range(2):
+        writer.write(cam.grab_frame())
+    writer.close()
+    cam.release()
+    with pytest.raises(IOError):
+        SentechSystem(backend="replay", path=path, speed=0)
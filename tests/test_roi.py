@@ -0,0 +1,105 @@
+import pytest
+
+from pysentech import SentechSystem
+from pysentech.error import SentechError
+
+
+@pytest.fixture
+def paced_camera():
+    """ A simulated camera paced by its readout time, so the frame rate
+            depends on the window.
+    """
+    system = SentechSystem(backend="sim", width=640, height=480, fps=None)
+    cam = system.get_camera(0)
+    cam.exposure = 0.0001
+    yield cam
+    cam.release()
+
+
+def test_available_scan_modes(camera):
+    assert camera.available_scan_modes == ["normal", "roi", "binning",
+                                           "binning_roi"]
+
+
+def test_set_roi(camera):
+    camera.set_roi(32, 16, 8, 4)
+    assert camera.scan_mode == "roi"
+    assert camera.image_shape == (32, 16)
+    assert camera.image_offsets == (8, 4)
+    assert camera.grab_frame().as_numpy().shape == (16, 32)
+
+
+def test_binning(camera):
+    camera.scan_mode = "binning"
+    assert camera.image_shape == (32, 24)
+    camera.set_roi(16, 8, scan_mode="binning_roi")
+    assert camera.grab_frame().as_numpy().shape == (8, 16)
+
+
+def test_invalid_roi(camera):
+    with pytest.raises(KeyError):
+        camera.set_roi(32, 16, scan_mode="zoom")
+    with pytest.raises(SentechError):
+        camera.set_roi(128, 16)
+
+
+def test_output_fps(paced_camera):
+    full = paced_camera.output_fps
+    paced_camera.set_roi(64, 48)
+    assert paced_camera.output_fps > full
+
+
+def test_named_rois(camera):
+    camera.allocate_buffers(2)
+    full = camera.add_roi("full", 64, 48)
+    spot = camera.add_roi("spot", 16, 8, 4, 4)
+    assert list(camera.rois) == ["full", "spot"]
+    assert camera.roi is None
+    assert camera.image_shape == (64, 48)  # adding doesn't switch
+    assert spot.image_size == 16 * 8
+    assert spot.buffer_count == 2
+
+    camera.use_roi("spot")
+    assert camera.roi == "spot"
+    spot_frame = camera.grab_frame()
+    assert spot_frame.pool is spot.pool
+    camera.use_roi("full")
+    full_frame = camera.grab_frame()
+    assert full_frame.pool is full.pool
+    # frames from the other region stay valid
+    assert spot_frame.as_numpy().shape == (8, 16)
+    assert full_frame.as_numpy().shape == (48, 64)
+    spot_frame.release()
+    full_frame.release()
+
+    camera.set_roi(32, 32)
+    assert camera.roi is None
+    camera.remove_roi("spot")
+    assert list(camera.rois) == ["full"]
+
+
+def test_roi_max_fps(paced_camera):
+    full = paced_camera.add_roi("full", 640, 480)
+    spot = paced_camera.add_roi("spot", 64, 48)
+    assert spot.max_fps > full.max_fps
+
+
+def test_grab_rois(camera):
+    camera.add_roi("a", 16, 16)
+    camera.add_roi("b", 32, 8, 8, 8)
+    frames = camera.grab_rois()
+    assert list(frames) == ["a", "b"]
+    assert frames["b"].as_numpy().shape == (8, 32)
+    assert camera.roi == "b"
+
+
+def test_use_roi_while_capturing(camera):
+    camera.add_roi("a", 16, 16)
+    camera.start_capture()
+    try:
+        with pytest.raises(RuntimeError):
+            camera.use_roi("a")
+        with pytest.raises(RuntimeError):
+            camera.add_roi("b", 16, 16)
+    finally:
+        camera.stop_capture()